@@ -11,6 +11,8 @@ from api.thresholds import Thresholds
 from api.alertMail import AlertEmail
 from api.sendAlertMail import SendAlertMail
 from api.confirm_mail import ConfirmEmail
+from api import compression, metrics
+from api.encoding import output_json
 
 def create_app():
     app = Flask(__name__)
@@ -23,9 +25,17 @@ def create_app():
             "http://hrschmllr.de:3000"
         ]}},
         supports_credentials=True,
-        allow_headers=["*"]
+        allow_headers=["*"],
+        # float32 responses are decoded with these; ETag for If-None-Match polling
+        expose_headers=["X-Series", "X-Columns", "X-Layout", "ETag"],
     )
     api = Api(app)
+    # orjson-backed encoder (Decimal/datetime native), ETag/304 and gzip/brotli
+    api.representations["application/json"] = output_json
+    # Prometheus: request latency/in-flight per route, DB op durations, pool and cache stats
+    # (registered first so its after_request runs last and includes compression)
+    metrics.init_app(app)
+    compression.init_app(app)
 
     # register routes
     api.add_resource(DeviceData, "/api/devices/<int:device_id>/data")
@@ -6,6 +6,7 @@ from psycopg2 import Error as PsycopgError
 # logging
 from common.logging_setup import setup_logger, log_event, DurationTimer
 from auth import token_required
+from api.formats import response_format, columns, float32_response
 
 # unified app exceptions (no direct psycopg2 usage here)
 from common.exceptions import (
@@ -73,6 +74,9 @@ class Comparison(Resource):
                 return {"status": "error", "message": f"Invalid time range: {error_msg}"}, 400
 
         try:
+            # rows (default), columnar, delta or float32
+            out_format = response_format()
+
             # call DB
             result = compare_devices_over_time(device_id1, device_id2, metric, start, end, num_buckets)
 
@@ -81,6 +85,30 @@ class Comparison(Resource):
             dev2_series = data_obj.get("device_2", []) if device_id2 else []
             warning_msg = (result or {}).get("message")
 
+            if out_format == "float32":
+                log_event(
+                    logger, "INFO", "comparison.ok",
+                    device_1=device_id1, device_2=device_id2, metric=metric,
+                    rows_1=len(dev1_series), rows_2=len(dev2_series),
+                    warned=bool(warning_msg), format=out_format,
+                    duration_ms=timer.stop_ms()
+                )
+                return float32_response(
+                    [
+                        (name, [p["timestamp"] for p in series], [[p["value"] for p in series]])
+                        for name, series in (("device_1", dev1_series), ("device_2", dev2_series))
+                    ],
+                    [metric],
+                )
+            formatted = {}
+            if out_format != "rows":
+                # parallel arrays per device instead of {"timestamp", "value"} objects
+                formatted = {
+                    "device_1": columns(dev1_series, "timestamp", {"values": "value"}, out_format),
+                    "device_2": columns(dev2_series, "timestamp", {"values": "value"}, out_format),
+                    "format": out_format,
+                }
+
             if not dev1_series and not dev2_series:
                 log_event(
                     logger, "INFO", "comparison.empty",
@@ -94,7 +122,8 @@ class Comparison(Resource):
                     "start": start,
                     "end": end,
                     "status": "success",
-                    "message": "No data found for the specified devices and metric."
+                    "message": "No data found for the specified devices and metric.",
+                    **formatted
                 }, 200
 
             # success
@@ -102,7 +131,7 @@ class Comparison(Resource):
                 logger, "INFO", "comparison.ok",
                 device_1=device_id1, device_2=device_id2, metric=metric,
                 rows_1=len(dev1_series), rows_2=len(dev2_series),
-                warned=bool(warning_msg),
+                warned=bool(warning_msg), format=out_format,
                 duration_ms=timer.stop_ms()
             )
             return {
@@ -112,7 +141,8 @@ class Comparison(Resource):
                 "start": start,
                 "end": end,
                 "status": "success",
-                "message": warning_msg
+                "message": warning_msg,
+                **formatted
             }, 200
 
         # ---- mapped DB failures (unified) ----
@@ -0,0 +1,72 @@
+"""
+Conditional requests and compression for API responses (after_request hook).
+
+- GET responses get a weak ETag over the uncompressed body; a matching
+  If-None-Match answers 304 without a body (unchanged dashboard polls).
+  `Cache-Control: private, no-cache` makes browsers revalidate instead of guessing.
+- Bodies of at least API_COMPRESS_MIN_BYTES are compressed with brotli (if the
+  module is installed and the client accepts `br`) or gzip.
+- Streamed responses are passed through untouched.
+"""
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+
+COMPRESS_MIN_BYTES = int(os.getenv("API_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("API_COMPRESS_LEVEL", "6"))
+
+# mimetypes worth compressing (binary float32 buffers are included: timestamps compress well)
+COMPRESSIBLE = ("application/json", "application/vnd.altbau.", "text/")
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding, level=COMPRESS_LEVEL):
+    if encoding == "br":
+        return brotli.compress(data, quality=min(max(level, 0), 11))
+    return gzip.compress(data, compresslevel=min(max(level, 1), 9))
+
+
+def finalize_response(response):
+    if request.method not in ("GET", "HEAD") or response.status_code != 200:
+        return response
+    if response.is_streamed or response.direct_passthrough:
+        return response
+
+    if not response.get_etag()[0]:
+        response.add_etag(weak=True)
+    response.headers.setdefault("Cache-Control", "private, no-cache")
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    mimetype = response.mimetype or ""
+    if "Content-Encoding" in response.headers or not mimetype.startswith(COMPRESSIBLE):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    app.after_request(finalize_response)
@@ -1,10 +1,14 @@
-from .connection import check_db_config, get_db_connection
+from .connection import check_db_config, get_db_connection, get_pool
 from .serialization import serialize_row
 from .validation import validate_timestamps_and_range
 from .devices import device_exists
 from .time_ranges import get_all_device_time_ranges_from_db
-from .device_data import get_device_data_from_db
+from .device_data import get_device_data_from_db, stream_device_data_from_db, bucket_seconds
 from .device_latest import get_latest_device_data_from_db
+from .notifications import get_listener
+from .latest_cache import get_latest_cache, latest_cache_stats
+from .device_registry import get_device_registry, device_registry_stats
+from .worker import init_worker
 from .comparison import compare_devices_over_time
 from .thresholds import get_thresholds_from_db, update_thresholds_in_db
 from .alertMail import get_alert_email, set_alert_email
@@ -14,12 +18,21 @@ from .sendAlertMail import is_alert_active, set_alert_active, reset_alert
 __all__ = [
     "check_db_config",
     "get_db_connection",
+    "get_pool",
     "serialize_row",
     "validate_timestamps_and_range",
     "device_exists",
     "get_all_device_time_ranges_from_db",
     "get_device_data_from_db",
+    "stream_device_data_from_db",
+    "bucket_seconds",
     "get_latest_device_data_from_db",
+    "get_listener",
+    "get_latest_cache",
+    "latest_cache_stats",
+    "get_device_registry",
+    "device_registry_stats",
+    "init_worker",
     "compare_devices_over_time",
     "get_thresholds_from_db",
     "update_thresholds_in_db",
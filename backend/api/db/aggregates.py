@@ -0,0 +1,134 @@
+import os
+
+from psycopg2 import errors
+
+from common.logging_setup import setup_logger, log_event
+
+
+logger = setup_logger(service="api", module="db.aggregates")
+
+# Continuous aggregates from db/continuous_aggregates.sql: (view, grain in seconds), finest first.
+AGGREGATE_VIEWS = (
+    ("sensor_data_1m", 60),
+    ("sensor_data_15m", 15 * 60),
+    ("sensor_data_1h", 60 * 60),
+)
+
+# Set to 0 on databases without the continuous aggregates (always aggregate raw rows).
+USE_CONTINUOUS_AGGREGATES = os.getenv("API_USE_CONTINUOUS_AGGREGATES", "1") == "1"
+
+# Set when a query found a view missing (db/continuous_aggregates.sql only runs on a new
+# volume): raw rows for the rest of this process; recycled workers check again.
+_views_missing = False
+
+
+def pick_aggregate(bucket_size, start=None, end=None, origin=None):
+    """
+    Return (view, grain_seconds) of the coarsest aggregate whose grains each fall into
+    exactly one bucket, or None when raw rows are needed:
+    - `bucket_size` is a multiple of the grain;
+    - `origin` (the buckets' time_bucket origin, epoch seconds) is aligned to the grain.
+      None means the default origin, which is aligned to every grain;
+    - [start, end] spans more than one grain (see `grain_bounds`).
+    """
+    if not USE_CONTINUOUS_AGGREGATES or _views_missing or not bucket_size:
+        return None
+    chosen = None
+    for view, grain in AGGREGATE_VIEWS:
+        if bucket_size % grain or (origin is not None and origin % grain):
+            continue
+        if grain_bounds(grain, start, end) is None:
+            continue
+        chosen = (view, grain)
+    log_event(logger, "DEBUG", "db.aggregates.pick", bucket_size=bucket_size, view=chosen[0] if chosen else None)
+    return chosen
+
+
+def grain_bounds(grain, start=None, end=None):
+    """
+    Split [start, end] (epoch seconds, both inclusive like the raw filters) into
+    (whole_from, whole_to): grains starting in [whole_from, whole_to) lie inside the
+    range and are read from the aggregate; readings in [start, whole_from) and
+    [whole_to, end] belong to partial grains and are read from raw rows.
+    A missing bound stays None (no edge on that side). None if no grain boundary
+    separates the edges (range within one grain): raw rows only.
+    """
+    whole_from = -(-start // grain) * grain if start is not None else None
+    whole_to = end // grain * grain if end is not None else None
+    if whole_from is not None and whole_to is not None and whole_from > whole_to:
+        return None
+    return whole_from, whole_to
+
+
+def grain_source(view, grain, metrics, device_filter, start=None, end=None):
+    """
+    FROM item with one row per device and grain over [start, end], in the view's
+    column layout (bucket, row_count, <metric>_sum/_count/_min/_max/_last):
+    whole grains come from `view`, the partial grains at the edges are recomputed
+    from sensor_data, so nothing outside the range is counted and nothing inside
+    it is lost. `device_filter` is a condition on device_id with named parameters.
+    Returns (sql, params); named parameters, to be merged into the caller's.
+    """
+    whole_from, whole_to = grain_bounds(grain, start, end)
+    stats = ("sum", "count", "min", "max", "last")
+    view_columns = ", ".join(f"{m}_{s}" for m in metrics for s in stats)
+    raw_columns = ", ".join(
+        f"SUM({m}) AS {m}_sum, COUNT({m}) AS {m}_count, MIN({m}) AS {m}_min, "
+        f"MAX({m}) AS {m}_max, last({m}, timestamp) AS {m}_last"
+        for m in metrics
+    )
+
+    def raw_edge(lo, lo_op, hi, hi_op):
+        return f"""
+            SELECT device_id, time_bucket(INTERVAL '{int(grain)} seconds', timestamp) AS bucket,
+                   COUNT(*) AS row_count, {raw_columns}
+            FROM sensor_data
+            WHERE {device_filter}
+              AND timestamp {lo_op} TO_TIMESTAMP(%({lo})s) AND timestamp {hi_op} TO_TIMESTAMP(%({hi})s)
+            GROUP BY device_id, 2"""
+
+    whole = [device_filter]
+    parts = []
+    params = {}
+    if whole_from is not None:
+        whole.append("bucket >= TO_TIMESTAMP(%(grain_from)s)")
+        params.update(grain_start=start, grain_from=whole_from)
+        if whole_from > start:
+            parts.append(raw_edge("grain_start", ">=", "grain_from", "<"))
+    if whole_to is not None:
+        whole.append("bucket < TO_TIMESTAMP(%(grain_to)s)")
+        params.update(grain_to=whole_to, grain_end=end)
+        parts.append(raw_edge("grain_to", ">=", "grain_end", "<="))
+    parts.insert(0, f"""
+            SELECT device_id, bucket, row_count, {view_columns}
+            FROM {view}
+            WHERE {" AND ".join(whole)}""")
+    return "(" + "\n            UNION ALL".join(parts) + "\n        ) AS grains", params
+
+
+def missing_aggregate(error, source):
+    """
+    True if `error` says the continuous aggregate `source` does not exist; aggregates
+    are then off for this process and the caller retries on raw rows.
+    """
+    global _views_missing
+    if not isinstance(error, errors.UndefinedTable) or source not in dict(AGGREGATE_VIEWS):
+        return False
+    if not _views_missing:
+        _views_missing = True
+        log_event(logger, "WARNING", "db.aggregates.missing", view=source, error_type=error.__class__.__name__)
+    return True
+
+
+def aggregate_expr(metric, agg="avg"):
+    """Re-aggregate one metric's grain columns into a coarser bucket."""
+    if agg == "avg":
+        # sums and counts, not averages of averages
+        return f"SUM({metric}_sum) / NULLIF(SUM({metric}_count), 0)"
+    if agg == "min":
+        return f"MIN({metric}_min)"
+    if agg == "max":
+        return f"MAX({metric}_max)"
+    if agg == "last":
+        return f"last({metric}_last, bucket)"
+    raise ValueError(f"Invalid agg '{agg}'.")
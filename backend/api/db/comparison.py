@@ -10,144 +10,213 @@ from common.exceptions import (
     DatabaseOperationalError,
 )
 from .connection import get_db_connection
+from .aggregates import pick_aggregate, aggregate_expr, grain_source, missing_aggregate
+from .metrics import timed_op
 
 
 logger = setup_logger(service="api", module="db.comparison")
 
-
+VALID_METRICS = ['humidity', 'temperature', 'pollen', 'particulate_matter']
+
+
+def _edge_sql(direction):
+    """First/last timestamp of both devices via ordered index lookups (no full scan)."""
+    pick = "LEAST" if direction == "ASC" else "GREATEST"
+    probes = ", ".join(
+        f"(SELECT timestamp FROM sensor_data WHERE device_id = %({d})s ORDER BY timestamp {direction} LIMIT 1)"
+        for d in ("device_id1", "device_id2")
+    )
+    return f"{pick}({probes})"
+
+
+def _raw_query(metric, start, end):
+    """All raw rows of both devices; bounds only when given (same as before)."""
+    query = f"""
+        SELECT device_id,
+        EXTRACT(EPOCH FROM timestamp AT TIME ZONE 'UTC')::BIGINT AS unix_timestamp_seconds,
+        {metric}
+        FROM sensor_data
+        WHERE device_id IN (%(device_id1)s, %(device_id2)s)
+    """
+    if start is not None:
+        query += " AND timestamp >= TO_TIMESTAMP(%(start)s)"
+    if end is not None:
+        query += " AND timestamp <= TO_TIMESTAMP(%(end)s)"
+    return query + " ORDER BY device_id, timestamp"
+
+
+def _bucketed_query(metric, start, end):
+    """
+    One pass over the range: per-device time_bucket averages plus the raw-row count.
+    - Filters compare `timestamp` itself against TO_TIMESTAMP(...) constants, so the
+      (device_id, timestamp) index and chunk exclusion apply.
+    - A missing bound is resolved inside the statement by an ordered index probe.
+    - Buckets start at `start` (origin), like the previous FLOOR((epoch - start) / size).
+    """
+    lo = "TO_TIMESTAMP(%(start)s)" if start is not None else _edge_sql("ASC")
+    hi = "TO_TIMESTAMP(%(end)s)" if end is not None else _edge_sql("DESC")
+    return f"""
+        WITH bounds AS MATERIALIZED (
+            SELECT lo, hi,
+                   GREATEST(1, FLOOR(EXTRACT(EPOCH FROM hi - lo) / %(num_buckets)s))::BIGINT AS bucket_size
+            FROM (SELECT {lo} AS lo, {hi} AS hi) b
+        ),
+        per_bucket AS (
+            SELECT
+                device_id,
+                time_bucket(
+                    make_interval(secs => (SELECT bucket_size FROM bounds)),
+                    timestamp,
+                    (SELECT lo FROM bounds)
+                ) AS bucket,
+                MIN(timestamp) AS bucket_start,
+                AVG({metric}) AS avg_value,
+                COUNT(*) AS raw_rows
+            FROM sensor_data
+            WHERE device_id IN (%(device_id1)s, %(device_id2)s)
+              AND timestamp >= {lo if start is not None else "(SELECT lo FROM bounds)"}
+              AND timestamp <= {hi if end is not None else "(SELECT hi FROM bounds)"}
+            GROUP BY device_id, bucket
+        )
+        SELECT
+            device_id,
+            EXTRACT(EPOCH FROM bucket_start)::BIGINT AS bucket_start,
+            avg_value,
+            SUM(raw_rows) OVER () AS total_raw_entries,
+            (SELECT bucket_size FROM bounds) AS bucket_size
+        FROM per_bucket
+        ORDER BY device_id, bucket_start
+    """
+
+
+def _aggregate_query(metric, aggregate, start, end):
+    """
+    Same result shape as `_bucketed_query`, re-aggregated from a continuous aggregate
+    instead of raw rows. Needs both bounds and a grain-aligned `start` (pick_aggregate
+    checks that), so every grain falls into one bucket; the partial last grain comes
+    from raw rows. `bucket_start` is the start of the bucket's first grain.
+    Returns (query, extra named params).
+    """
+    view, grain = aggregate
+    grains, params = grain_source(
+        view, grain, [metric], "device_id IN (%(device_id1)s, %(device_id2)s)", start, end
+    )
+    return f"""
+        WITH per_bucket AS (
+            SELECT
+                device_id,
+                time_bucket(make_interval(secs => %(bucket_size)s), bucket, TO_TIMESTAMP(%(start)s)) AS b,
+                MIN(bucket) AS bucket_start,
+                {aggregate_expr(metric, "avg")} AS avg_value,
+                SUM(row_count) AS raw_rows
+            FROM {grains}
+            GROUP BY device_id, b
+        )
+        SELECT
+            device_id,
+            EXTRACT(EPOCH FROM bucket_start)::BIGINT AS bucket_start,
+            avg_value,
+            SUM(raw_rows) OVER () AS total_raw_entries,
+            %(bucket_size)s AS bucket_size
+        FROM per_bucket
+        ORDER BY device_id, bucket_start
+    """, params
+
+
+def _series(rows, device_id1, device_id2, ts_key, value_key):
+    data = {
+        f"device_{device_id1}": [],
+        f"device_{device_id2}": [],
+    }
+    for row in rows:
+        data[f"device_{row['device_id']}"].append({
+            "timestamp": int(row[ts_key]),
+            "value": float(row[value_key]) if row[value_key] is not None else None,
+        })
+    return data
+
+
+@timed_op("compare_devices_over_time")
 def compare_devices_over_time(device_id1, device_id2, metric=None, start=None, end=None, num_buckets=None):
     t = DurationTimer().start()
     log_event(logger, "DEBUG", "db.compare.start", device_id1=device_id1, device_id2=device_id2, metric=metric, start=start, end=end, num_buckets=num_buckets)
 
-    if metric not in ['humidity', 'temperature', 'pollen', 'particulate_matter']:
+    if metric not in VALID_METRICS:
         raise ValueError("Invalid metric. Must be one of: 'humidity', 'temperature', 'pollen', 'particulate_matter'.")
 
+    params = {
+        "device_id1": device_id1,
+        "device_id2": device_id2,
+        "start": start,
+        "end": end,
+        "num_buckets": num_buckets,
+    }
+
     conn = get_db_connection()
     try:
         cursor = conn.cursor(cursor_factory=extras.DictCursor)
 
-        count_query = """
-            SELECT COUNT(*) FROM sensor_data
-            WHERE (device_id = %s OR device_id = %s)
-            AND timestamp >= TO_TIMESTAMP(%s) AT TIME ZONE 'UTC'
-            AND timestamp <= TO_TIMESTAMP(%s) AT TIME ZONE 'UTC';
-            """
-        count_params = (device_id1, device_id2, start, end)
-        cursor.execute(count_query, count_params)
-        count_result = cursor.fetchone()
-        total_raw_entries = count_result[0] if count_result is not None else 0
-
-        log_event(logger, "DEBUG", "db.compare.count", total_raw_entries=total_raw_entries, num_buckets=num_buckets)
-
-        if num_buckets is None or num_buckets > total_raw_entries:
-            query = f"""
-                SELECT device_id,
-                EXTRACT(EPOCH FROM timestamp AT TIME ZONE 'UTC')::BIGINT AS unix_timestamp_seconds,
-                {metric}
-                FROM sensor_data
-                WHERE device_id IN (%s, %s)
-            """
-            params = (device_id1, device_id2)
-            if start:
-                query += " AND timestamp >= TO_TIMESTAMP(%s)::TIMESTAMPTZ"
-                params += (start,)
-            if end:
-                query += " AND timestamp <= TO_TIMESTAMP(%s)::TIMESTAMPTZ"
-                params += (end,)
-
-            cursor.execute(query, params)
+        bucket_size = None
+        if num_buckets is not None:
+            aggregate = None
+            if start is not None and end is not None:
+                params["bucket_size"] = max(1, int((end - start) / num_buckets))
+                aggregate = pick_aggregate(params["bucket_size"], start, end, origin=start)
+            if aggregate is not None:
+                # Long ranges: coarsest continuous aggregate whose grains fit the buckets, no raw chunks
+                try:
+                    query, grain_params = _aggregate_query(metric, aggregate, start, end)
+                    cursor.execute(query, {**params, **grain_params})
+                except psycopg2.Error as e:
+                    if not missing_aggregate(e, aggregate[0]):
+                        raise
+                    conn.rollback()
+                    aggregate = None
+            if aggregate is None:
+                cursor.execute(_bucketed_query(metric, start, end), params)
             rows = cursor.fetchall()
-
-            result = {
-                "data": {
-                    f"device_{device_id1}": [],
-                    f"device_{device_id2}": [],
-                },
-                "message": None,
-                "status": "success",
-            }
-            for row in rows:
-                entry = {
-                    "timestamp": int(row["unix_timestamp_seconds"]),
-                    "value": float(row[metric]) if row[metric] is not None else None,
+            total_raw_entries = int(rows[0]["total_raw_entries"]) if rows else 0
+            bucket_size = int(rows[0]["bucket_size"]) if rows else None
+            log_event(logger, "DEBUG", "db.compare.count", total_raw_entries=total_raw_entries, num_buckets=num_buckets)
+
+            if num_buckets <= total_raw_entries:
+                result = {
+                    "data": _series(rows, device_id1, device_id2, "bucket_start", "avg_value"),
+                    "message": None,
+                    "status": "success",
+                    "raw_count": total_raw_entries,
                 }
-                result["data"][f"device_{row['device_id']}"].append(entry)
-
-            if num_buckets is not None and total_raw_entries is not None and num_buckets > total_raw_entries:
-                result["message"] = f"Warning: The number of buckets ({num_buckets}) exceeds the total number of raw entries ({total_raw_entries})."
-
-            log_event(logger, "INFO", "db.compare.all_data.ok", duration_ms=t.stop_ms(), device_id1=device_id1, device_id2=device_id2, rows=len(rows), warned=bool(result["message"]))
-            cursor.close()
-            conn.close()
-            return result
-
-        if not start or not end:
-            cursor.execute(
-                """
-                SELECT MIN(EXTRACT(EPOCH FROM timestamp)), MAX(EXTRACT(EPOCH FROM timestamp))
-                FROM sensor_data
-                WHERE device_id = %s OR device_id = %s
-                """,
-                (device_id1, device_id2),
-            )
-            rng = cursor.fetchone()
-            if rng is None or rng[0] is None or rng[1] is None:
+                log_event(
+                    logger,
+                    "INFO",
+                    "db.compare.bucketed.ok",
+                    duration_ms=t.stop_ms(),
+                    device_id1=device_id1,
+                    device_id2=device_id2,
+                    bucket_size=bucket_size,
+                    buckets=num_buckets,
+                    rows=len(rows),
+                    raw_count=total_raw_entries,
+                    source=aggregate[0] if aggregate else "sensor_data",
+                    warned=False,
+                )
                 cursor.close()
-                conn.close()
-                raise ValueError("No data found for the specified devices and time range.")
-            start, end = rng
-
-        bucket_size = max(1, int((end - start) / num_buckets))
+                return result
 
-        query = f"""
-            SELECT
-                device_id,
-                FLOOR((EXTRACT(EPOCH FROM timestamp) - %s) / %s) AS bucket,
-                MIN(EXTRACT(EPOCH FROM timestamp)) AS bucket_start,
-                AVG({metric}) AS avg_value
-            FROM sensor_data
-            WHERE (device_id = %s OR device_id = %s)
-              AND EXTRACT(EPOCH FROM timestamp) >= %s
-              AND EXTRACT(EPOCH FROM timestamp) <= %s
-            GROUP BY device_id, bucket
-            ORDER BY device_id, bucket_start
-        """
-        params = [start, bucket_size, device_id1, device_id2, start, end]
-        cursor.execute(query, params)
+        # No bucketing requested, or fewer raw rows than buckets: the raw rows are the answer.
+        cursor.execute(_raw_query(metric, start, end), params)
         rows = cursor.fetchall()
-
         result = {
-            "data": {
-                f"device_{device_id1}": [],
-                f"device_{device_id2}": [],
-            },
+            "data": _series(rows, device_id1, device_id2, "unix_timestamp_seconds", metric),
             "message": None,
             "status": "success",
+            "raw_count": len(rows),
         }
-        for row in rows:
-            entry = {
-                "timestamp": int(row["bucket_start"]),
-                "value": float(row["avg_value"]) if row["avg_value"] is not None else None,
-            }
-            result["data"][f"device_{row['device_id']}"].append(entry)
-
-        if num_buckets > total_raw_entries:
-            result["message"] = f"Warning: The number of buckets ({num_buckets}) exceeds the total number of raw entries ({total_raw_entries}). Data may be averaged over larger intervals."
-
-        log_event(
-            logger,
-            "INFO",
-            "db.compare.bucketed.ok",
-            duration_ms=t.stop_ms(),
-            device_id1=device_id1,
-            device_id2=device_id2,
-            bucket_size=bucket_size,
-            buckets=num_buckets,
-            rows=len(rows),
-            warned=bool(result["message"]),
-        )
+        if num_buckets is not None and num_buckets > len(rows):
+            result["message"] = f"Warning: The number of buckets ({num_buckets}) exceeds the total number of raw entries ({len(rows)})."
+
+        log_event(logger, "INFO", "db.compare.all_data.ok", duration_ms=t.stop_ms(), device_id1=device_id1, device_id2=device_id2, rows=len(rows), warned=bool(result["message"]))
         cursor.close()
-        conn.close()
         return result
     except QueryCanceledError as e:
         log_event(logger, "ERROR", "db.compare.timeout", duration_ms=t.stop_ms(), error_type=e.__class__.__name__)
@@ -158,5 +227,5 @@ def compare_devices_over_time(device_id1, device_id2, metric=None, start=None, e
     except psycopg2.Error as e:
         log_event(logger, "ERROR", "db.compare.fail", duration_ms=t.stop_ms(), error_type=e.__class__.__name__)
         raise DatabaseError("database error", details={"op": "compare_devices_over_time"}) from e
-
-
+    finally:
+        conn.close()
@@ -1,4 +1,6 @@
 import os
+import threading
+
 import psycopg2
 from dotenv import load_dotenv
 
@@ -7,6 +9,9 @@ from common.exceptions import (
     DatabaseConnectionError,
     DatabaseOperationalError,
 )
+from common.schema import ensure_schema
+from .pool import ConnectionPool
+from .metrics import timed_op
 
 
 logger = setup_logger(service="api", module="db.connection")
@@ -21,6 +26,23 @@ DB_CONFIG = {
     "port": os.getenv("DB_PORT", "5432"),
 }
 
+# Process-wide connection pool; DB_POOL_MAX_SIZE=0 opens a fresh connection per call.
+DB_POOL_CONFIG = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    "timeout_s": float(os.getenv("DB_POOL_TIMEOUT_S", "5")),
+    "max_idle_s": float(os.getenv("DB_POOL_MAX_IDLE_S", "300")),
+    "check_after_s": float(os.getenv("DB_POOL_CHECK_AFTER_S", "30")),
+    "stats_interval_s": float(os.getenv("DB_POOL_STATS_INTERVAL_S", "60")),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# startup migration (common/schema.py): once per process, retried on the next checkout if it failed
+_schema_ready = False
+_schema_lock = threading.Lock()
+
 
 def check_db_config():
     missing = [k for k in ["host", "database", "user", "password"] if not DB_CONFIG[k]]
@@ -31,8 +53,51 @@ def check_db_config():
         )
 
 
+def get_pool():
+    """Return the process-wide pool (created on first use), or None if pooling is disabled."""
+    global _pool
+    if DB_POOL_CONFIG["max_size"] <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_connect, **DB_POOL_CONFIG)
+                log_event(logger, "INFO", "db.pool.created", **DB_POOL_CONFIG)
+    return _pool
+
+
 def get_db_connection():
+    """
+    Check out a connection. Callers keep calling `conn.close()` when done:
+    pooled connections go back to the pool instead of being closed.
+    """
     check_db_config()
+    pool = get_pool()
+    conn = _connect() if pool is None else pool.getconn()
+    if not _schema_ready:
+        _ensure_schema(conn)
+    return conn
+
+
+def _ensure_schema(conn):
+    """Best effort: on failure the caller's own query reports the problem."""
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        t = DurationTimer().start()
+        try:
+            created = ensure_schema(conn)
+        except Exception as e:
+            log_event(logger, "ERROR", "db.migration_failed", duration_ms=t.stop_ms(), error_type=e.__class__.__name__)
+            return
+        _schema_ready = True
+        if created:
+            log_event(logger, "INFO", "db.migrated", duration_ms=t.stop_ms(), table="devices")
+
+
+@timed_op("connect")
+def _connect():
     t = DurationTimer().start()
     try:
         conn = psycopg2.connect(
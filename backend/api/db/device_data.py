@@ -2,6 +2,7 @@ from psycopg2.extensions import QueryCanceledError
 from psycopg2 import OperationalError
 from psycopg2 import extras
 import psycopg2
+import uuid
 
 from common.logging_setup import setup_logger, log_event, DurationTimer
 from common.exceptions import (
@@ -10,48 +11,138 @@ from common.exceptions import (
     DatabaseOperationalError,
 )
 from .connection import get_db_connection
-from .serialization import serialize_row
+from .aggregates import pick_aggregate, aggregate_expr, grain_source, missing_aggregate
+from .metrics import timed_op
 
 
 logger = setup_logger(service="api", module="db.device_data")
 
+# Rows per round trip of the streaming (server-side) cursor
+STREAM_BATCH_SIZE = 2000
 
-def get_device_data_from_db(device_id, metric=None, start=None, end=None):
+# Aggregates for downsampled series; "last" uses TimescaleDB's last(value, time)
+AGGREGATES = {
+    "avg": "AVG({col})",
+    "min": "MIN({col})",
+    "max": "MAX({col})",
+    "last": "last({col}, timestamp)",
+}
+
+
+def bucket_seconds(start=None, end=None, buckets=None, interval=None):
+    """
+    Resolve the bucket width in seconds, or None for raw rows.
+    - `interval`: explicit width in seconds.
+    - `buckets`: number of buckets across [start, end] (both required).
+    """
+    if buckets is not None and interval is not None:
+        raise ValueError("Use either 'buckets' or 'interval', not both.")
+    if interval is not None:
+        if interval <= 0:
+            raise ValueError("Interval must be a positive number of seconds.")
+        return int(interval)
+    if buckets is not None:
+        if buckets <= 0:
+            raise ValueError("Buckets must be a positive integer.")
+        if start is None or end is None or end <= start:
+            raise ValueError("Buckets require a start and end timestamp with start < end.")
+        # ceil, so the range never yields more than `buckets` buckets
+        return max(1, -(-(end - start) // buckets))
+    return None
+
+
+def _device_data_query(device_id, metric, start, end, buckets, interval, agg):
+    """Build (query, params, bucket_size, source, agg) for raw or downsampled rows."""
     valid_metrics = ['humidity', 'temperature', 'pollen', 'particulate_matter']
     if metric and metric not in valid_metrics:
         raise ValueError(f"Invalid metric '{metric}'. Valid metrics: {', '.join(valid_metrics)}.")
 
-    base_columns = [
-        "device_id",
-        "EXTRACT(EPOCH FROM timestamp AT TIME ZONE 'UTC')::BIGINT AS unix_timestamp_seconds",
-    ]
-    select_columns = base_columns + ([metric] if metric else valid_metrics)
+    bucket_size = bucket_seconds(start, end, buckets=buckets, interval=interval)
+    metric_columns = [metric] if metric else valid_metrics
+    source, time_column = "sensor_data", "timestamp"
+    if bucket_size is None:
+        select_columns = [
+            "device_id",
+            "EXTRACT(EPOCH FROM timestamp AT TIME ZONE 'UTC')::BIGINT AS unix_timestamp_seconds",
+        ] + metric_columns
+        params = [device_id]
+    else:
+        agg = agg or "avg"
+        if agg not in AGGREGATES:
+            raise ValueError(f"Invalid agg '{agg}'. Valid aggregates: {', '.join(AGGREGATES)}.")
+        # One row per time_bucket: payload size follows the requested resolution, not the data volume
+        aggregate = pick_aggregate(bucket_size, start or None, end or None)
+        if aggregate is not None:
+            return _aggregate_query(aggregate, device_id, metric_columns, start, end, bucket_size, agg)
+        metric_exprs = [AGGREGATES[agg].format(col=col) for col in metric_columns]
+        select_columns = [
+            "device_id",
+            f"EXTRACT(EPOCH FROM time_bucket(%s * INTERVAL '1 second', {time_column}))::BIGINT AS unix_timestamp_seconds",
+        ] + [f"{expr} AS {col}" for expr, col in zip(metric_exprs, metric_columns)]
+        params = [bucket_size, device_id]
 
     query = f"""
         SELECT {', '.join(select_columns)}
-        FROM sensor_data
+        FROM {source}
         WHERE device_id = %s
     """
 
-    params = [device_id]
     conditions = []
     if start:
-        conditions.append("timestamp >= TO_TIMESTAMP(%s)::TIMESTAMPTZ")
+        conditions.append(f"{time_column} >= TO_TIMESTAMP(%s)::TIMESTAMPTZ")
         params.append(start)
     if end:
-        conditions.append("timestamp <= TO_TIMESTAMP(%s)::TIMESTAMPTZ")
+        conditions.append(f"{time_column} <= TO_TIMESTAMP(%s)::TIMESTAMPTZ")
         params.append(end)
     if conditions:
         query += " AND " + " AND ".join(conditions)
+    if bucket_size is not None:
+        query += " GROUP BY 1, 2 ORDER BY 2"
+    else:
+        # raw rows: (device_id, timestamp) primary key order, also what streaming clients expect
+        query += " ORDER BY timestamp"
+    return query, tuple(params), bucket_size, source, agg
+
+
+def _aggregate_query(aggregate, device_id, metric_columns, start, end, bucket_size, agg):
+    """Downsampled rows re-aggregated from a continuous aggregate (edge grains from raw rows)."""
+    view, grain = aggregate
+    grains, params = grain_source(view, grain, metric_columns, "device_id = %(device_id)s", start or None, end or None)
+    metric_exprs = [f"{aggregate_expr(col, agg)} AS {col}" for col in metric_columns]
+    query = f"""
+        SELECT device_id,
+               EXTRACT(EPOCH FROM time_bucket(%(bucket_size)s * INTERVAL '1 second', bucket))::BIGINT AS unix_timestamp_seconds,
+               {', '.join(metric_exprs)}
+        FROM {grains}
+        GROUP BY 1, 2 ORDER BY 2
+    """
+    params.update(bucket_size=bucket_size, device_id=device_id)
+    return query, params, bucket_size, view, agg
+
+
+@timed_op("get_device_data_from_db")
+def get_device_data_from_db(device_id, metric=None, start=None, end=None, buckets=None, interval=None, agg="avg"):
+    query, params, bucket_size, source, agg = _device_data_query(device_id, metric, start, end, buckets, interval, agg)
 
     t = DurationTimer().start()
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=extras.DictCursor) as cursor:
-            cursor.execute(query, tuple(params))
+            try:
+                cursor.execute(query, params)
+            except psycopg2.Error as e:
+                if not missing_aggregate(e, source):
+                    raise
+                conn.rollback()
+                query, params, bucket_size, source, agg = _device_data_query(device_id, metric, start, end, buckets, interval, agg)
+                cursor.execute(query, params)
             data = cursor.fetchall()
-            result = [serialize_row(dict(row)) for row in data]
-            log_event(logger, "INFO", "db.device_data.ok", duration_ms=t.stop_ms(), device_id=device_id, metric=metric or "ALL", row_count=len(result))
+            # Decimal values are encoded by api.encoding, no per-row conversion
+            result = [dict(row) for row in data]
+            log_event(
+                logger, "INFO", "db.device_data.ok", duration_ms=t.stop_ms(), device_id=device_id, metric=metric or "ALL",
+                row_count=len(result), bucket_seconds=bucket_size, agg=agg if bucket_size else None, source=source
+            )
             return result
     except QueryCanceledError as e:
         log_event(logger, "ERROR", "db.device_data.timeout", duration_ms=t.stop_ms(), device_id=device_id, metric=metric or "ALL", error_type=e.__class__.__name__)
@@ -66,3 +157,90 @@ def get_device_data_from_db(device_id, metric=None, start=None, end=None):
         conn.close()
 
 
+@timed_op("stream_device_data_from_db")
+def stream_device_data_from_db(device_id, metric=None, start=None, end=None, buckets=None, interval=None, agg="avg", batch_size=STREAM_BATCH_SIZE):
+    """
+    Same rows as get_device_data_from_db, as an iterator of row batches (lists of dicts).
+    - Server-side (named) cursor: at most `batch_size` rows are held in memory.
+    - The query runs and the first batch is fetched before this returns, so timeouts
+      and connection errors raise here (mapped like the other DB functions), not mid-response.
+    - The connection stays checked out until the iterator is exhausted or closed.
+    """
+    query, params, bucket_size, source, agg = _device_data_query(device_id, metric, start, end, buckets, interval, agg)
+
+    t = DurationTimer().start()
+    conn = get_db_connection()
+    cursor = None
+    try:
+        cursor = _stream_cursor(conn, batch_size)
+        try:
+            cursor.execute(query, params)
+        except psycopg2.Error as e:
+            if not missing_aggregate(e, source):
+                raise
+            _close_quietly(cursor)
+            conn.rollback()
+            query, params, bucket_size, source, agg = _device_data_query(device_id, metric, start, end, buckets, interval, agg)
+            cursor = _stream_cursor(conn, batch_size)
+            cursor.execute(query, params)
+        first = cursor.fetchmany(batch_size)
+    except Exception as e:
+        _close_stream(cursor, conn)
+        if isinstance(e, QueryCanceledError):
+            log_event(logger, "ERROR", "db.device_data.timeout", duration_ms=t.stop_ms(), device_id=device_id, metric=metric or "ALL", error_type=e.__class__.__name__)
+            raise DatabaseQueryTimeoutError("query timeout", details={"op": "stream_device_data_from_db"}) from e
+        if isinstance(e, OperationalError):
+            log_event(logger, "ERROR", "db.device_data.operational_error", duration_ms=t.stop_ms(), device_id=device_id, metric=metric or "ALL", error_type=e.__class__.__name__)
+            raise DatabaseOperationalError("database operational error", details={"op": "stream_device_data_from_db"}) from e
+        if isinstance(e, psycopg2.Error):
+            log_event(logger, "ERROR", "db.device_data.fail", duration_ms=t.stop_ms(), device_id=device_id, metric=metric or "ALL", error_type=e.__class__.__name__)
+            raise DatabaseError("database error", details={"op": "stream_device_data_from_db"}) from e
+        raise
+
+    def batches():
+        row_count = 0
+        completed = False
+        try:
+            batch = first
+            while batch:
+                row_count += len(batch)
+                yield [dict(row) for row in batch]
+                batch = cursor.fetchmany(batch_size)
+            completed = True
+        except psycopg2.Error as e:
+            log_event(logger, "ERROR", "db.device_data.stream_fail", duration_ms=t.stop_ms(), device_id=device_id, row_count=row_count, error_type=e.__class__.__name__)
+            raise DatabaseError("database error", details={"op": "stream_device_data_from_db"}) from e
+        finally:
+            _close_stream(cursor, conn)
+            if completed:
+                log_event(
+                    logger, "INFO", "db.device_data.stream.ok", duration_ms=t.stop_ms(), device_id=device_id, metric=metric or "ALL",
+                    row_count=row_count, bucket_seconds=bucket_size, agg=agg if bucket_size else None, source=source
+                )
+
+    return batches()
+
+
+def _stream_cursor(conn, batch_size):
+    # named cursor = DECLARE ... CURSOR inside a transaction; rows arrive batch by batch
+    cursor = conn.cursor(name=f"device_data_{uuid.uuid4().hex}", cursor_factory=extras.DictCursor)
+    cursor.itersize = batch_size
+    return cursor
+
+
+def _close_quietly(cursor):
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+
+def _close_stream(cursor, conn):
+    try:
+        if cursor is not None:
+            cursor.close()
+    except Exception:
+        pass
+    finally:
+        # pooled: rolls back the cursor's transaction and returns the connection
+        conn.close()
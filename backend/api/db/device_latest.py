@@ -10,12 +10,13 @@ from common.exceptions import (
     DatabaseOperationalError,
 )
 from .connection import get_db_connection
-from .serialization import serialize_row
+from .metrics import timed_op
 
 
 logger = setup_logger(service="api", module="db.device_latest")
 
 
+@timed_op("get_latest_device_data_from_db")
 def get_latest_device_data_from_db(device_id):
     t = DurationTimer().start()
     conn = get_db_connection()
@@ -35,7 +36,7 @@ def get_latest_device_data_from_db(device_id):
             )
             row = cursor.fetchone()
             if row:
-                row_dict = serialize_row(dict(row))
+                row_dict = dict(row)
                 payload = {
                     "device_id": row_dict["device_id"],
                     "unix_timestamp_seconds": row_dict["unix_timestamp_seconds"],
@@ -0,0 +1,188 @@
+import os
+import threading
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional
+
+from common.logging_setup import setup_logger, log_event
+from .notifications import get_listener, parse_written
+from .time_ranges import get_all_device_time_ranges_from_db
+from .metrics import CACHE_LOOKUPS
+
+
+logger = setup_logger(service="api", module="db.device_registry")
+
+# Full reload from the devices table at most this often; in between, ingester NOTIFYs keep it current.
+DEVICE_REGISTRY_RECONCILE_S = float(os.getenv("API_DEVICE_REGISTRY_RECONCILE_S", "60"))
+# Forced reloads (a failed range check) at most this often, so bad requests cannot hammer the DB.
+DEVICE_REGISTRY_MIN_RELOAD_S = float(os.getenv("API_DEVICE_REGISTRY_MIN_RELOAD_S", "5"))
+
+
+class DeviceRegistry:
+    """
+    Known devices with their first and last timestamp (epoch seconds).
+    - Loaded once with `load` (the devices summary table), then widened in place
+      by the ingester's write notifications.
+    - Reconciled with a fresh load every `reconcile_interval_s` (in the background;
+      callers keep reading the previous snapshot) to catch drift such as retention
+      deletes or notifications missed while the listener reconnected.
+    - `refresh()` forces a reload, at most every `min_reload_interval_s`.
+    - Reads are dict lookups.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], List[Dict[str, Any]]],
+        *,
+        reconcile_interval_s: float = 60.0,
+        min_reload_interval_s: float = 5.0,
+    ) -> None:
+        self._load = load
+        self.reconcile_interval_s = reconcile_interval_s
+        self.min_reload_interval_s = min_reload_interval_s
+        self._refreshed_at: Optional[float] = None  # last forced reload attempt (rate limit)
+        self._ranges: Dict[int, List[int]] = {}
+        self._loaded_at: Optional[float] = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._reconciling = False
+        self.stats = {"hits": 0, "misses": 0, "reloads": 0}
+
+    # ---------- reads ----------
+
+    def get(self, device_id: int) -> Optional[Dict[str, int]]:
+        self._ensure_loaded()
+        with self._lock:
+            r = self._ranges.get(device_id)
+        self._count(r is not None)
+        return {"device_id": device_id, "start": r[0], "end": r[1]} if r else None
+
+    def exists(self, device_id: int) -> bool:
+        self._ensure_loaded()
+        found = device_id in self._ranges
+        self._count(found)
+        return found
+
+    def _count(self, found: bool) -> None:
+        # a miss means the caller has to ask the database
+        self.stats["hits" if found else "misses"] += 1
+        CACHE_LOOKUPS.labels("device_registry", "hit" if found else "miss").inc()
+
+    def ranges(self) -> List[Dict[str, int]]:
+        """Same shape as get_all_device_time_ranges_from_db()."""
+        self._ensure_loaded()
+        with self._lock:
+            return [
+                {"device_id": d, "start": r[0], "end": r[1]}
+                for d, r in sorted(self._ranges.items())
+            ]
+
+    # ---------- updates ----------
+
+    def on_notify(self, payload: Optional[str]) -> None:
+        if payload is None:
+            # listener (re)connected: writes may have been missed
+            self.mark_stale()
+            return
+        written = parse_written(payload)
+        if written is None:
+            log_event(logger, "WARNING", "db.device_registry.bad_payload", payload=str(payload)[:50])
+            return
+        device_id, first_ts, last_ts = written
+        with self._lock:
+            self._version += 1
+            current = self._ranges.get(device_id)
+            if first_ts is None:
+                if current is None:
+                    self._loaded_at = None  # new device without range: reload on next read
+                return
+            if current is None:
+                self._ranges[device_id] = [first_ts, last_ts]
+            else:
+                current[0] = min(current[0], first_ts)
+                current[1] = max(current[1], last_ts)
+
+    def mark_stale(self) -> None:
+        with self._lock:
+            if self._loaded_at is not None:
+                self._loaded_at = monotonic() - self.reconcile_interval_s
+
+    def reload(self) -> None:
+        with self._load_lock:
+            with self._lock:
+                version = self._version
+            rows = self._load()
+            loaded = {int(r["device_id"]): [int(r["start"]), int(r["end"])] for r in rows}
+            with self._lock:
+                if version != self._version:
+                    # keep what notifications added while the load was running
+                    for device_id, r in self._ranges.items():
+                        if device_id in loaded:
+                            loaded[device_id][0] = min(loaded[device_id][0], r[0])
+                            loaded[device_id][1] = max(loaded[device_id][1], r[1])
+                        else:
+                            loaded[device_id] = list(r)
+                self._ranges = loaded
+                self._loaded_at = monotonic()
+                self.stats["reloads"] += 1
+            log_event(logger, "INFO", "db.device_registry.reloaded", devices=len(loaded))
+
+    def refresh(self) -> bool:
+        """Reload unless the last forced reload was too recent. Returns True if reloaded."""
+        with self._lock:
+            now = monotonic()
+            if self._refreshed_at is not None and now - self._refreshed_at < self.min_reload_interval_s:
+                return False
+            self._refreshed_at = now
+        self.reload()
+        return True
+
+    def _ensure_loaded(self) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is None:
+            self.reload()
+            return
+        if monotonic() - loaded_at < self.reconcile_interval_s:
+            return
+        with self._lock:
+            if self._reconciling:
+                return
+            self._reconciling = True
+        threading.Thread(target=self._reconcile, name="device-registry-reconcile", daemon=True).start()
+
+    def _reconcile(self) -> None:
+        try:
+            self.reload()
+        except Exception as e:
+            log_event(logger, "WARNING", "db.device_registry.reconcile_failed", error_type=e.__class__.__name__)
+        finally:
+            self._reconciling = False
+
+
+_registry: Optional[DeviceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_device_registry() -> DeviceRegistry:
+    """Return the process-wide registry; makes sure the write listener is running."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DeviceRegistry(
+                    get_all_device_time_ranges_from_db,
+                    reconcile_interval_s=DEVICE_REGISTRY_RECONCILE_S,
+                    min_reload_interval_s=DEVICE_REGISTRY_MIN_RELOAD_S,
+                )
+                listener = get_listener()
+                if listener is not None:
+                    listener.subscribe(_registry.on_notify)
+    listener = get_listener()
+    if listener is not None:
+        listener.start()
+    return _registry
+
+
+def device_registry_stats() -> Optional[Dict[str, int]]:
+    """Counters of the process-wide registry, or None if it was not created (yet)."""
+    return dict(_registry.stats) if _registry is not None else None
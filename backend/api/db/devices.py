@@ -9,17 +9,32 @@ from common.exceptions import (
     DatabaseOperationalError,
 )
 from .connection import get_db_connection
+from .device_registry import get_device_registry
+from .metrics import timed_op
 
 
 logger = setup_logger(service="api", module="db.devices")
 
 
 def device_exists(device_id):
+    """Registry lookup; only devices it does not know yet are looked up in the `devices` table."""
+    registry = get_device_registry()
+    if registry.exists(device_id):
+        return True
+    exists = _device_exists_in_db(device_id)
+    if exists:
+        # written after the last reload and not announced (listener down): reconcile soon
+        registry.mark_stale()
+    return exists
+
+
+@timed_op("device_exists")
+def _device_exists_in_db(device_id):
     t = DurationTimer().start()
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT EXISTS(SELECT 1 FROM sensor_data WHERE device_id = %s);", (device_id,))
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM devices WHERE device_id = %s);", (device_id,))
             result = cursor.fetchone()
             exists = result[0] if result is not None else False
             log_event(logger, "INFO", "db.device_exists.ok", duration_ms=t.stop_ms(), device_id=device_id, exists=bool(exists))
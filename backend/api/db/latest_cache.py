@@ -0,0 +1,98 @@
+import os
+import threading
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
+from common.logging_setup import setup_logger, log_event
+from .notifications import get_listener, parse_written
+from .metrics import CACHE_LOOKUPS
+
+
+logger = setup_logger(service="api", module="db.latest_cache")
+
+# Seconds a latest row may be served from memory; 0 disables the cache.
+LATEST_CACHE_TTL_S = float(os.getenv("API_LATEST_CACHE_TTL_S", "5"))
+
+
+class LatestCache:
+    """
+    Newest row per device, kept for `ttl_s` seconds.
+    - The ingester NOTIFYs after every write; `on_notify` drops that device's entry,
+      so the TTL only bounds staleness while the listener is disconnected.
+    - `version()` / `put(..., version)`: a row read before an invalidation is not
+      stored afterwards (it could be older than the write that invalidated it).
+    """
+
+    def __init__(self, *, ttl_s: float = 5.0, max_entries: int = 1024) -> None:
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.max_entries = max(1, int(max_entries))
+        self._entries: Dict[int, Tuple[float, Any]] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, device_id: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is not None and entry[0] > monotonic():
+                self.stats["hits"] += 1
+                CACHE_LOOKUPS.labels("latest", "hit").inc()
+                return entry[1]
+            self.stats["misses"] += 1
+            CACHE_LOOKUPS.labels("latest", "miss").inc()
+            return None
+
+    def version(self) -> int:
+        return self._version
+
+    def put(self, device_id: int, payload: Any, version: int) -> None:
+        if not self.ttl_s:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            if device_id not in self._entries and len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[device_id] = (monotonic() + self.ttl_s, payload)
+
+    def invalidate(self, device_id: Optional[int] = None) -> None:
+        """Drop one device's entry, or all entries when `device_id` is None."""
+        with self._lock:
+            self._version += 1
+            self.stats["invalidations"] += 1
+            if device_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(device_id, None)
+
+    def on_notify(self, payload: Optional[str]) -> None:
+        written = parse_written(payload)
+        if payload is not None and written is None:
+            log_event(logger, "WARNING", "db.latest_cache.bad_payload", payload=str(payload)[:50])
+        self.invalidate(written[0] if written else None)
+
+
+_cache: Optional[LatestCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_latest_cache() -> LatestCache:
+    """Return the process-wide cache; makes sure the invalidation listener is running."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LatestCache(ttl_s=LATEST_CACHE_TTL_S)
+                listener = get_listener()
+                if listener is not None:
+                    listener.subscribe(_cache.on_notify)
+                log_event(logger, "INFO", "db.latest_cache.created", ttl_s=LATEST_CACHE_TTL_S, listen=listener is not None)
+    listener = get_listener()
+    if listener is not None:
+        listener.start()
+    return _cache
+
+
+def latest_cache_stats() -> Optional[Dict[str, int]]:
+    """Counters of the process-wide cache, or None if it was not created (yet)."""
+    return dict(_cache.stats) if _cache is not None else None
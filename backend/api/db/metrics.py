@@ -0,0 +1,54 @@
+import functools
+
+from prometheus_client import Counter, Histogram
+
+from common.exceptions import DatabaseOperationalError, DatabaseQueryTimeoutError
+from common.metrics import LATENCY_BUCKETS, Stopwatch
+
+
+# `op` uses the names already carried in the error details ({"op": ...}).
+DB_OP_SECONDS = Histogram(
+    "api_db_op_duration_seconds",
+    "Duration of database operations (incl. pool checkout)",
+    ["op", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Counters are incremented where the event happens (pool, caches). In gunicorn's
+# multi-process mode, a recycled worker's counts stay in the sum, so rate() and
+# hit ratios work across worker restarts.
+POOL_EVENTS = Counter("api_db_pool_events", "Connection pool events", ["event"])
+POOL_WAIT_SECONDS = Counter("api_db_pool_wait_seconds", "Time spent waiting for a free pool connection")
+# cache: latest | device_registry | auth_token; result: hit | miss
+CACHE_LOOKUPS = Counter("api_cache_lookups", "Cache lookups", ["cache", "result"])
+
+
+def _outcome(exc: BaseException) -> str:
+    if isinstance(exc, DatabaseQueryTimeoutError):
+        return "timeout"
+    if isinstance(exc, DatabaseOperationalError):
+        return "operational_error"
+    return "error"
+
+
+def timed_op(op: str):
+    """
+    Observe the wrapped DB function in `api_db_op_duration_seconds{op, outcome}`.
+    For streaming functions this is the time until the first batch is ready.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            watch = Stopwatch()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                DB_OP_SECONDS.labels(op, _outcome(e)).observe(watch.elapsed_s())
+                raise
+            DB_OP_SECONDS.labels(op, "ok").observe(watch.elapsed_s())
+            return result
+
+        return wrapper
+
+    return decorator
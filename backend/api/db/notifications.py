@@ -0,0 +1,160 @@
+import os
+import select
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+from psycopg2 import extensions, sql
+
+from common.logging_setup import setup_logger, log_event
+from .connection import _connect
+
+
+logger = setup_logger(service="api", module="db.notifications")
+
+# Must match mqtt_client.db_writer.NOTIFY_CHANNEL (the ingester sends, the API listens).
+NOTIFY_CHANNEL = "sensor_data_written"
+
+# Set to 0 to run without LISTEN (caches then rely on their TTL alone).
+LISTEN_ENABLED = os.getenv("API_LISTEN_NOTIFY", "1") == "1"
+
+# Called with the payload string, or None when notifications may have been missed.
+Handler = Callable[[Optional[str]], Any]
+
+
+def parse_written(payload: Optional[str]) -> Optional[Tuple[int, Optional[int], Optional[int]]]:
+    """
+    Parse a payload from the ingester: "<device_id>:<first_ts>:<last_ts>" (epoch
+    seconds of the rows just written) or just "<device_id>". None if unusable.
+    """
+    if payload is None:
+        return None
+    try:
+        parts = [int(p) for p in payload.split(":")]
+    except ValueError:
+        return None
+    if len(parts) == 3:
+        return parts[0], parts[1], parts[2]
+    if len(parts) == 1:
+        return parts[0], None, None
+    return None
+
+
+class NotificationListener:
+    """
+    Background thread that LISTENs on one channel over a dedicated connection
+    (not a pooled one: a listening session must stay open and idle).
+    - Every notification payload is passed to the subscribed handlers.
+    - Handlers get None after (re)connecting, because anything sent while the
+      connection was down is lost; they should drop everything they cached.
+    - Reconnects after `reconnect_delay_s` on any error.
+    - Fork-aware: `start()` in a child process starts a fresh thread.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        channel: str = NOTIFY_CHANNEL,
+        *,
+        reconnect_delay_s: float = 5.0,
+        poll_timeout_s: float = 5.0,
+    ) -> None:
+        self._connect = connect
+        self.channel = channel
+        self.reconnect_delay_s = reconnect_delay_s
+        self.poll_timeout_s = poll_timeout_s
+        self._handlers: List[Handler] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.connected = False
+        self.stats = {"notifications": 0, "reconnects": 0}
+
+    def subscribe(self, handler: Handler) -> None:
+        with self._lock:
+            if handler not in self._handlers:
+                self._handlers.append(handler)
+
+    def start(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self.connected = False
+            self._thread = threading.Thread(target=self._run, name="db-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---------- listener thread ----------
+
+    def _dispatch(self, payload: Optional[str]) -> None:
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            try:
+                handler(payload)
+            except Exception as e:
+                log_event(logger, "ERROR", "db.listen.handler_failed", channel=self.channel, error_type=e.__class__.__name__)
+
+    def _listen(self, conn: Any) -> None:
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("LISTEN {};").format(sql.Identifier(self.channel)))
+        self.connected = True
+        log_event(logger, "INFO", "db.listen.ok", channel=self.channel)
+        self._dispatch(None)
+
+        while not self._stop.is_set():
+            if select.select([conn], [], [], self.poll_timeout_s) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                self.stats["notifications"] += 1
+                self._dispatch(notify.payload)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                self._listen(conn)
+            except Exception as e:
+                self.stats["reconnects"] += 1
+                log_event(
+                    logger, "WARNING", "db.listen.disconnected",
+                    channel=self.channel, error_type=e.__class__.__name__, retry_in_s=self.reconnect_delay_s,
+                )
+            finally:
+                was_connected, self.connected = self.connected, False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                if was_connected:
+                    self._dispatch(None)
+            self._stop.wait(self.reconnect_delay_s)
+
+
+_listener: Optional[NotificationListener] = None
+_listener_lock = threading.Lock()
+
+
+def get_listener() -> Optional[NotificationListener]:
+    """Return the process-wide listener (created, not started, on first use), or None if disabled."""
+    global _listener
+    if not LISTEN_ENABLED:
+        return None
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = NotificationListener(_connect)
+    return _listener
@@ -0,0 +1,344 @@
+import os
+import threading
+import weakref
+from collections import deque
+from time import monotonic
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+from psycopg2 import extensions
+
+from common.logging_setup import setup_logger, log_event
+from common.exceptions import DatabaseConnectionError
+from .metrics import POOL_EVENTS, POOL_WAIT_SECONDS
+
+
+logger = setup_logger(service="api", module="db.pool")
+
+# (raw connection, created_at, last_used_at)
+_IdleEntry = Tuple[Any, float, float]
+
+
+class PooledConnection:
+    """
+    Proxy handed out by the pool.
+    - Behaves like the psycopg2 connection (attribute access is delegated).
+    - `close()` returns the connection to the pool instead of closing it, so the
+      existing `finally: conn.close()` blocks keep working unchanged.
+    - A proxy that is dropped without `close()` still gives its slot back.
+    """
+
+    __slots__ = ("_raw", "_pool", "_created_at", "_finalizer", "__weakref__")
+
+    def __init__(self, raw: Any, pool: "ConnectionPool", created_at: float) -> None:
+        self._raw = raw
+        self._pool = pool
+        self._created_at = created_at
+        self._finalizer = weakref.finalize(self, pool._release, raw, created_at, leaked=True)
+
+    def close(self) -> None:
+        if self._raw is None:
+            return
+        self._finalizer.detach()
+        raw, self._raw = self._raw, None
+        self._pool._release(raw, self._created_at)
+
+    @property
+    def closed(self) -> int:
+        # psycopg2 semantics: non-zero once closed
+        return 1 if self._raw is None else self._raw.closed
+
+    def __getattr__(self, name: str) -> Any:
+        raw = object.__getattribute__(self, "_raw")
+        if raw is None:
+            raise extensions.InterfaceError("connection already returned to the pool")
+        return getattr(raw, name)
+
+    def __enter__(self) -> "PooledConnection":
+        self._raw.__enter__()
+        return self
+
+    def __exit__(self, *exc: Any) -> Any:
+        return self._raw.__exit__(*exc)
+
+
+class ConnectionPool:
+    """
+    Thread-safe, process-wide pool of psycopg2 connections.
+    - Keeps at least `min_size` and at most `max_size` connections open.
+    - Checkout: reuse the most recently returned connection; health-check it with
+      `SELECT 1` when it sat idle longer than `check_after_s` (0 = always).
+      Waits up to `timeout_s` when all connections are in use.
+    - Return: roll back an open transaction, discard broken connections.
+    - Idle connections beyond `min_size` are closed after `max_idle_s`.
+    - Fork-safe: a child process never touches its parent's connections.
+    - `stats()` reports wait time and utilization; a `db.pool.stats` log is
+      emitted at most every `stats_interval_s` seconds on checkout.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout_s: float = 5.0,
+        max_idle_s: float = 300.0,
+        check_after_s: float = 30.0,
+        wait_warn_ms: float = 100.0,
+        stats_interval_s: float = 60.0,
+    ) -> None:
+        self._connect = connect
+        self.max_size = max(1, int(max_size))
+        self.min_size = min(max(0, int(min_size)), self.max_size)
+        self.timeout_s = max(0.0, float(timeout_s))
+        self.max_idle_s = max(0.0, float(max_idle_s))
+        self.check_after_s = max(0.0, float(check_after_s))
+        self.wait_warn_ms = wait_warn_ms
+        self.stats_interval_s = stats_interval_s
+
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self._pid = os.getpid()
+        self._idle: Deque[_IdleEntry] = deque()
+        self._size = 0  # open connections, idle + in use
+        self._in_use = 0
+        self._closed = False  # set by close_all(): returned connections are closed, not re-idled
+        self._last_report = monotonic()
+        self._stats: Dict[str, float] = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "timeouts": 0,
+            "in_use_max": 0,
+            "created": 0,
+            "closed_idle": 0,
+            "closed_broken": 0,
+        }
+
+    def _count(self, event: str) -> None:
+        # lock held; the Prometheus counter outlives this worker, `_stats` feeds the logs
+        self._stats[event] += 1
+        POOL_EVENTS.labels(event).inc()
+
+    def _check_pid(self) -> None:
+        # Called with the lock held. After fork() the inherited sockets belong to
+        # the parent: forget them without closing (closing would end the parent's
+        # sessions) and start over.
+        if self._pid != os.getpid():
+            _orphaned.extend(raw for raw, _, _ in self._idle)
+            self._reset_state()
+
+    # ---------- checkout ----------
+
+    def getconn(self) -> PooledConnection:
+        start = monotonic()
+        deadline = start + self.timeout_s
+        waited = False
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                self._check_pid()
+                self._evict_idle(monotonic())
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self._count("timeouts")
+                        snapshot = self._snapshot()
+                        log_event(logger, "ERROR", "db.pool.timeout", wait_ms=round((monotonic() - start) * 1000, 2), **snapshot)
+                        raise DatabaseConnectionError(
+                            "connection pool exhausted",
+                            details={"op": "connect", "max_size": self.max_size, "timeout_s": self.timeout_s},
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    entry = self._idle.pop()  # LIFO: keeps the hot set small, the rest ages out
+                else:
+                    create = True
+                self._size += 1 if create else 0
+                self._in_use += 1
+
+            if create:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+                created_at = monotonic()
+                with self._cond:
+                    self._count("created")
+            else:
+                raw, created_at, last_used = entry
+                if not self._healthy(raw, last_used):
+                    self._discard(raw)
+                    continue
+            return self._checked_out(raw, created_at, start, waited)
+
+    def _checked_out(self, raw: Any, created_at: float, start: float, waited: bool) -> PooledConnection:
+        wait_ms = (monotonic() - start) * 1000
+        report = None
+        with self._cond:
+            s = self._stats
+            self._count("checkouts")
+            s["wait_ms_total"] += wait_ms
+            POOL_WAIT_SECONDS.inc(wait_ms / 1000)
+            if waited:
+                self._count("waits")
+            if wait_ms > s["wait_ms_max"]:
+                s["wait_ms_max"] = wait_ms
+            if self._in_use > s["in_use_max"]:
+                s["in_use_max"] = self._in_use
+            now = monotonic()
+            if self.stats_interval_s and now - self._last_report >= self.stats_interval_s:
+                self._last_report = now
+                report = self._snapshot()
+                # max values are per reporting interval
+                s["wait_ms_max"] = 0.0
+                s["in_use_max"] = self._in_use
+        if waited and wait_ms >= self.wait_warn_ms:
+            log_event(logger, "WARNING", "db.pool.wait", wait_ms=round(wait_ms, 2), in_use=self._in_use, max_size=self.max_size)
+        if report is not None:
+            log_event(logger, "INFO", "db.pool.stats", **report)
+        return PooledConnection(raw, self, created_at)
+
+    def _healthy(self, raw: Any, last_used: float) -> bool:
+        if raw.closed:
+            return False
+        if monotonic() - last_used < self.check_after_s:
+            return True
+        try:
+            with raw.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            raw.rollback()
+            return True
+        except Exception as e:
+            log_event(logger, "WARNING", "db.pool.health_check_failed", error_type=e.__class__.__name__)
+            return False
+
+    # ---------- return / discard ----------
+
+    def _release(self, raw: Any, created_at: float, *, leaked: bool = False) -> None:
+        if leaked:
+            log_event(logger, "WARNING", "db.pool.connection_leaked")
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            if self._closed:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+                closing = True
+            else:
+                closing = False
+        if closing:
+            _close_quietly(raw)
+            return
+        try:
+            if raw.closed:
+                raise extensions.InterfaceError("connection closed")
+            if raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                # close_all() ran while this one was being rolled back
+                self._size -= 1
+                self._cond.notify()
+                closing = True
+            else:
+                self._idle.append((raw, created_at, monotonic()))
+                self._cond.notify()
+                closing = False
+        if closing:
+            _close_quietly(raw)
+
+    def _discard(self, raw: Any) -> None:
+        _close_quietly(raw)
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._count("closed_broken")
+            self._cond.notify()
+
+    def _evict_idle(self, now: float) -> None:
+        # Lock held. Oldest-returned connections sit at the left end.
+        if not self.max_idle_s:
+            return
+        while self._idle and self._size > self.min_size:
+            raw, _, last_used = self._idle[0]
+            if now - last_used < self.max_idle_s:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._count("closed_idle")
+            _close_quietly(raw)
+
+    # ---------- reporting / lifecycle ----------
+
+    def _snapshot(self) -> Dict[str, Any]:
+        s = self._stats
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "utilization": round(self._in_use / self.max_size, 3),
+            "wait_ms_avg": round(s["wait_ms_total"] / s["checkouts"], 3) if s["checkouts"] else 0.0,
+            **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in s.items()},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self._check_pid()
+            return self._snapshot()
+
+    def fill(self) -> None:
+        """Open connections up to `min_size` (best effort)."""
+        while True:
+            with self._cond:
+                self._check_pid()
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                return
+            with self._cond:
+                self._count("created")
+                self._idle.append((raw, monotonic(), monotonic()))
+                self._cond.notify()
+
+    def close_all(self) -> None:
+        """Close idle connections; connections in use are closed when returned."""
+        with self._cond:
+            self._check_pid()
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for raw, _, _ in idle:
+            _close_quietly(raw)
+
+
+# Connections inherited from a parent process; kept referenced so they are never closed here.
+_orphaned: List[Any] = []
+
+
+def _close_quietly(raw: Any) -> None:
+    try:
+        raw.close()
+    except Exception:
+        pass
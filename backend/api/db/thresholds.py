@@ -11,11 +11,13 @@ from common.exceptions import (
 )
 from .connection import get_db_connection
 from .serialization import serialize_row
+from .metrics import timed_op
 
 
 logger = setup_logger(service="api", module="db.thresholds")
 
 
+@timed_op("get_thresholds_from_db")
 def get_thresholds_from_db():
     t = DurationTimer().start()
     conn = None
@@ -42,6 +44,7 @@ def get_thresholds_from_db():
             conn.close()
 
 
+@timed_op("update_thresholds_in_db")
 def update_thresholds_in_db(threshold_data):
     t = DurationTimer().start()
     conn = None
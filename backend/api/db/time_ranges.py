@@ -10,13 +10,15 @@ from common.exceptions import (
     DatabaseOperationalError,
 )
 from .connection import get_db_connection
-from .serialization import serialize_row
+from .metrics import timed_op
 
 
 logger = setup_logger(service="api", module="db.time_ranges")
 
 
+@timed_op("get_all_device_time_ranges_from_db")
 def get_all_device_time_ranges_from_db():
+    """First/last timestamp per device from the `devices` summary (kept current by the ingester)."""
     t = DurationTimer().start()
     conn = get_db_connection()
     try:
@@ -24,15 +26,14 @@ def get_all_device_time_ranges_from_db():
             cursor.execute(
                 """
                 SELECT device_id,
-                MIN(EXTRACT(EPOCH FROM timestamp AT TIME ZONE 'UTC')::BIGINT) AS start,
-                MAX(EXTRACT(EPOCH FROM timestamp AT TIME ZONE 'UTC')::BIGINT) AS end
-                FROM sensor_data
-                GROUP BY device_id
+                EXTRACT(EPOCH FROM first_seen AT TIME ZONE 'UTC')::BIGINT AS start,
+                EXTRACT(EPOCH FROM last_seen AT TIME ZONE 'UTC')::BIGINT AS end
+                FROM devices
                 ORDER BY device_id;
                 """
             )
             time_ranges = cursor.fetchall()
-            payload = [serialize_row(dict(row)) for row in time_ranges]
+            payload = [dict(row) for row in time_ranges]
             log_event(logger, "INFO", "db.time_ranges.ok", duration_ms=t.stop_ms(), device_count=len(payload))
             return payload
     except QueryCanceledError as e:
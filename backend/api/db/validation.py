@@ -1,5 +1,5 @@
 from common.logging_setup import setup_logger, log_event
-from .time_ranges import get_all_device_time_ranges_from_db
+from .device_registry import get_device_registry
 
 
 logger = setup_logger(service="api", module="db.validation")
@@ -13,9 +13,24 @@ def validate_timestamps_and_range(device_id1, device_id2, start, end):
     if start >= end:
         return False, "Start timestamp must be less than end timestamp."
 
-    time_ranges = get_all_device_time_ranges_from_db()
+    registry = get_device_registry()
+    errors = _check_ranges(registry.ranges(), device_id1, device_id2, start)
+    if errors is not None:
+        # the registry may lag behind (missed notifications): confirm against a fresh
+        # load, unless one just happened (rate limited, bad requests would hammer the DB)
+        if registry.refresh():
+            errors = _check_ranges(registry.ranges(), device_id1, device_id2, start)
+    if errors is not None:
+        return False, " ".join(errors)
+
+    log_event(logger, "DEBUG", "db.validate_range.ok", device_id1=device_id1, device_id2=device_id2)
+    return True, None
+
+
+def _check_ranges(time_ranges, device_id1, device_id2, start):
+    """Return None if at least one device has data from `start` on, else the error messages."""
     if not time_ranges:
-        return False, "No time ranges available for the devices."
+        return ["No time ranges available for the devices."]
 
     errors = []
     valid = False
@@ -32,10 +47,4 @@ def validate_timestamps_and_range(device_id1, device_id2, start, end):
         else:
             valid = True
 
-    if not valid:
-        return False, " ".join(errors)
-
-    log_event(logger, "DEBUG", "db.validate_range.ok", device_id1=device_id1, device_id2=device_id2)
-    return True, None
-
-
+    return None if valid else errors
@@ -0,0 +1,28 @@
+from common.logging_setup import setup_logger, log_event
+from .connection import get_pool, DB_POOL_CONFIG
+from .latest_cache import get_latest_cache
+from .device_registry import get_device_registry
+
+
+logger = setup_logger(service="api", module="db.worker")
+
+
+def init_worker() -> None:
+    """
+    Per-process setup for a forked server worker (gunicorn `post_fork`).
+    - The pool drops whatever it inherited from the master (those sessions belong
+      to the parent) and opens `DB_POOL_MIN_SIZE` connections of its own.
+    - The caches subscribe to and start this process's LISTEN thread; threads
+      never survive a fork, so each worker needs its own.
+    Best effort: a database that is not reachable yet is retried on first use.
+    """
+    pool = get_pool()
+    if pool is not None:
+        pool.fill()
+    get_latest_cache()
+    get_device_registry()
+    stats = pool.stats() if pool is not None else {}
+    log_event(
+        logger, "INFO", "db.worker.ready",
+        pool_size=stats.get("size", 0), pool_max_size=DB_POOL_CONFIG["max_size"],
+    )
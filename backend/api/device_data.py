@@ -1,5 +1,5 @@
 from flask_restful import Resource
-from flask import request
+from flask import request, Response
 from psycopg2 import Error as PsycopgError
 # logging
 from common.logging_setup import setup_logger, log_event, DurationTimer
@@ -13,13 +13,69 @@ from common.exceptions import (
 )
 
 # db ops
-from api.db import get_device_data_from_db, device_exists
+from api.db import get_device_data_from_db, stream_device_data_from_db, device_exists, bucket_seconds
 from auth import token_required
+from api.formats import response_format, columns, float32_response
+from api.encoding import dumps
 
 
 # each module registers its own logger
 logger = setup_logger(service="api", module="device_data")
 
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def stream_format():
+    """'ndjson', 'json' or None (buffered response) from ?stream= or the Accept header."""
+    stream = (request.args.get("stream") or "").lower()
+    if stream in ("ndjson", "json"):
+        return stream
+    if stream in ("1", "true"):
+        return "json"
+    if stream:
+        raise ValueError("Invalid stream format. Use 'json' or 'ndjson'.")
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return "ndjson"
+    return None
+
+
+def streamed_response(batches, fmt, envelope, log_fields, timer):
+    """
+    Write rows as they come from the server-side cursor.
+    - ndjson: one row per line.
+    - json: the usual response object with `data` written last, element by element.
+    A database failure after the first bytes can no longer change the status code:
+    the body then ends early (json: unterminated, ndjson: final {"status": "error"} line).
+    """
+    def generate():
+        row_count = 0
+        first = True
+        try:
+            if fmt == "json":
+                yield dumps(envelope)[:-1] + b',"data":['  # envelope without its closing brace
+            for batch in batches:
+                if fmt == "ndjson":
+                    yield b"".join(dumps(row) + b"\n" for row in batch)
+                else:
+                    chunk = b",".join(dumps(row) for row in batch)
+                    yield chunk if first else b"," + chunk
+                    first = False
+                row_count += len(batch)
+            if fmt == "json":
+                yield b"]}"
+            log_event(logger, "INFO", "device_data.stream.ok", **log_fields, format=fmt, row_count=row_count, duration_ms=timer.stop_ms())
+        except Exception as e:
+            log_event(logger, "ERROR", "device_data.stream.fail", **log_fields, format=fmt, row_count=row_count, error_type=e.__class__.__name__, duration_ms=timer.stop_ms())
+            if fmt == "ndjson":
+                yield dumps({"status": "error", "message": "stream aborted"}) + b"\n"
+        finally:
+            close = getattr(batches, "close", None)
+            if close is not None:
+                close()
+
+    mimetype = NDJSON_MIMETYPE if fmt == "ndjson" else "application/json"
+    return Response(generate(), status=200, mimetype=mimetype)
+
 
 class DeviceData(Resource):
     method_decorators = [token_required]
@@ -30,10 +86,15 @@ class DeviceData(Resource):
         start = request.args.get("start", type=int)
         end = request.args.get("end", type=int)
         metric = request.args.get("metric")  # optional; if absent behaves as before
+        # optional downsampling: `buckets` across [start, end] or a fixed `interval` (seconds)
+        buckets = request.args.get("buckets", type=int)
+        interval = request.args.get("interval", type=int)
+        agg = request.args.get("agg", "avg")
 
         log_event(
             logger, "INFO", "device_data.start",
-            device_id=device_id, start=start, end=end, metric=metric or "ALL"
+            device_id=device_id, start=start, end=end, metric=metric or "ALL",
+            buckets=buckets, interval=interval, agg=agg
         )
 
         # basic input guard (optional, keeps previous behavior)
@@ -45,6 +106,14 @@ class DeviceData(Resource):
             }, 400
 
         try:
+            # rejects bad downsampling params (ValueError → 400) before touching the DB
+            bucket_size = bucket_seconds(start, end, buckets=buckets, interval=interval)
+            # rows (default), columnar, delta or float32; streaming writes rows only
+            out_format = response_format()
+            fmt = stream_format()
+            if fmt and out_format != "rows":
+                raise ValueError("Streaming supports only the row format.")
+
             # existence check
             if not device_exists(device_id):
                 log_event(logger, "WARNING", "device_data.not_found", device_id=device_id)
@@ -53,8 +122,43 @@ class DeviceData(Resource):
                     "message": f"Device with ID {device_id} does not exist."
                 }, 404
 
+            # large exports: constant memory, first bytes right after the first batch
+            if fmt:
+                batches = stream_device_data_from_db(device_id, metric=metric, start=start, end=end, interval=bucket_size, agg=agg)
+                envelope = {
+                    "device_id": device_id,
+                    "start": start,
+                    "end": end,
+                    **({"interval": bucket_size, "agg": agg} if bucket_size else {}),
+                    "status": "success",
+                    "message": None,
+                }
+                log_fields = {"device_id": device_id, "start": start, "end": end, "metric": metric or "ALL"}
+                return streamed_response(batches, fmt, envelope, log_fields, timer)
+
             # fetch data (passes metric if provided; backward compatible)
-            data = get_device_data_from_db(device_id, metric=metric, start=start, end=end)
+            data = get_device_data_from_db(device_id, metric=metric, start=start, end=end, interval=bucket_size, agg=agg)
+            # only downsampled responses carry the bucket description
+            downsampling = {"interval": bucket_size, "agg": agg} if bucket_size else {}
+
+            if out_format != "rows":
+                value_keys = [metric] if metric else ["humidity", "temperature", "pollen", "particulate_matter"]
+                if out_format == "float32":
+                    log_event(
+                        logger, "INFO", "device_data.ok",
+                        device_id=device_id, start=start, end=end, metric=metric or "ALL",
+                        row_count=len(data), bucket_seconds=bucket_size, format=out_format, duration_ms=timer.stop_ms()
+                    )
+                    timestamps = [row["unix_timestamp_seconds"] for row in data]
+                    return float32_response(
+                        [(f"device_{device_id}", timestamps, [[row.get(k) for row in data] for k in value_keys])],
+                        value_keys,
+                    )
+                # same envelope, `data` as parallel arrays
+                downsampling["format"] = out_format
+                formatted = columns(data, "unix_timestamp_seconds", value_keys, out_format)
+            else:
+                formatted = data
 
             # If no data is found, return an empty list with a success status
             if not data:
@@ -67,22 +171,24 @@ class DeviceData(Resource):
                     "device_id": device_id,
                     "start": start,
                     "end": end,
+                    **downsampling,
                     "status": "success",
-                    "data": [],
+                    "data": formatted,
                     "message": f"No data available for device {device_id} in the specified range."
                 }, 200
 
             log_event(
                 logger, "INFO", "device_data.ok",
                 device_id=device_id, start=start, end=end, metric=metric or "ALL",
-                row_count=len(data), duration_ms=timer.stop_ms()
+                row_count=len(data), bucket_seconds=bucket_size, format=out_format, duration_ms=timer.stop_ms()
             )
             return {
                 "device_id": device_id,
                 "start": start,
                 "end": end,
+                **downsampling,
                 "status": "success",
-                "data": data,
+                "data": formatted,
                 "message": None
             }, 200
 
@@ -13,7 +13,7 @@ from common.exceptions import (
 )
 
 # db ops
-from api.db import get_latest_device_data_from_db, device_exists
+from api.db import get_latest_device_data_from_db, device_exists, get_latest_cache
 from auth import token_required
 
 # each module registers its own logger
@@ -35,38 +35,53 @@ class DeviceLatest(Resource):
             }, 400
 
         try:
-            # existence check
-            if not device_exists(device_id):
-                log_event(logger, "WARNING", "device_latest.not_found", device_id=device_id)
+            # served from memory until the ingester writes this device again (or the TTL ends)
+            cache = get_latest_cache()
+            data = cache.get(device_id)
+            if data is not None:
+                log_event(
+                    logger, "INFO", "device_latest.ok",
+                    device_id=device_id, cache="hit", duration_ms=timer.stop_ms()
+                )
                 return {
-                    "status": "error",
-                    "message": f"Device with ID {device_id} does not exist."
-                }, 404
+                    "status": "success",
+                    "data": data,
+                    "message": None
+                }, 200
 
-            # fetch latest
+            # fetch latest first: a row also proves the device exists
+            version = cache.version()
             data = get_latest_device_data_from_db(device_id)
 
-            # no data found is a valid success with empty payload
-            if not data:
+            if data:
+                cache.put(device_id, data, version)
                 log_event(
-                    logger, "INFO", "device_latest.empty",
-                    device_id=device_id, duration_ms=timer.stop_ms()
+                    logger, "INFO", "device_latest.ok",
+                    device_id=device_id, cache="miss", duration_ms=timer.stop_ms()
                 )
                 return {
                     "status": "success",
-                    "data": [],
-                    "message": f"No data available for device {device_id}."
+                    "data": data,
+                    "message": None
                 }, 200
 
-            # success
+            # existence check
+            if not device_exists(device_id):
+                log_event(logger, "WARNING", "device_latest.not_found", device_id=device_id)
+                return {
+                    "status": "error",
+                    "message": f"Device with ID {device_id} does not exist."
+                }, 404
+
+            # no data found is a valid success with empty payload
             log_event(
-                logger, "INFO", "device_latest.ok",
+                logger, "INFO", "device_latest.empty",
                 device_id=device_id, duration_ms=timer.stop_ms()
             )
             return {
                 "status": "success",
-                "data": data,
-                "message": None
+                "data": [],
+                "message": f"No data available for device {device_id}."
             }, 200
 
         # --- mapped DB failures (unified, no psycopg2 leak) ---
@@ -0,0 +1,62 @@
+"""
+JSON encoding for API responses.
+
+- `dumps(obj) -> bytes` serialises Decimal (as float) and datetime/date (ISO 8601)
+  natively, so DB rows can be returned without a per-row conversion pass.
+- Backend is pluggable: orjson when installed (default), else the stdlib `json`.
+  API_JSON_ENCODER=json forces the stdlib encoder.
+- `output_json` replaces flask-restful's representation for application/json.
+"""
+import datetime
+import json
+import os
+from decimal import Decimal
+
+from flask import make_response
+
+from common.logging_setup import setup_logger, log_event
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+logger = setup_logger(service="api", module="encoding")
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def _dumps_json(obj):
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _dumps_orjson(obj):
+    # datetime is native in orjson; Decimal goes through `default`
+    return orjson.dumps(obj, default=_default)
+
+
+ENCODERS = {"json": _dumps_json}
+if orjson is not None:
+    ENCODERS["orjson"] = _dumps_orjson
+
+_requested = os.getenv("API_JSON_ENCODER", "orjson" if orjson is not None else "json")
+ENCODER = _requested if _requested in ENCODERS else "json"
+if ENCODER != _requested:
+    log_event(logger, "WARNING", "encoding.encoder_unavailable", requested=_requested, using=ENCODER)
+
+dumps = ENCODERS[ENCODER]
+
+
+def output_json(data, code, headers=None):
+    """flask-restful representation: encoded body with the configured encoder."""
+    resp = make_response(dumps(data) + b"\n", code)
+    resp.mimetype = "application/json"
+    resp.headers.extend(headers or {})
+    return resp
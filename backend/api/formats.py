@@ -0,0 +1,87 @@
+"""
+Response formats for the time-series endpoints (`/api/devices/<id>/data`, `/api/comparison`).
+
+- rows     (default): one object per point, as before.
+- columnar: parallel arrays, e.g. {"timestamps": [...], "values": [...]}.
+- delta:    like columnar, but `timestamps` holds the first timestamp followed by
+            the differences to the previous one (small, repetitive integers).
+- float32:  binary little-endian buffer per series: uint32 timestamps, then one
+            float32 array per value column (NaN = missing). Layout in the headers.
+
+Selected by `?format=` or the Accept header (`ACCEPT_FORMATS`).
+"""
+import math
+import struct
+
+from flask import request, Response
+
+
+FORMATS = ("rows", "columnar", "delta", "float32")
+
+ACCEPT_FORMATS = {
+    "application/vnd.altbau.columnar+json": "columnar",
+    "application/vnd.altbau.delta+json": "delta",
+    "application/vnd.altbau.float32": "float32",
+}
+
+FLOAT32_MIMETYPE = "application/vnd.altbau.float32"
+
+
+def response_format():
+    """Requested format; ValueError for an unknown ?format=."""
+    fmt = (request.args.get("format") or "").lower()
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"Invalid format '{fmt}'. Valid formats: {', '.join(FORMATS)}.")
+        return fmt
+    best = request.accept_mimetypes.best_match(list(ACCEPT_FORMATS))
+    # only when explicitly asked for; */* or application/json keep the row format
+    if best and request.accept_mimetypes[best] > request.accept_mimetypes["application/json"]:
+        return ACCEPT_FORMATS[best]
+    return "rows"
+
+
+def delta_encode(timestamps):
+    """[t0, t1, t2, ...] -> [t0, t1 - t0, t2 - t1, ...]"""
+    out = []
+    previous = 0
+    for ts in timestamps:
+        out.append(ts - previous)
+        previous = ts
+    return out
+
+
+def columns(rows, time_key, value_keys, fmt):
+    """
+    Turn row dicts into {"timestamps": [...], <name>: [...]} (delta-encoded for fmt='delta').
+    `value_keys`: row keys, or a dict {output name: row key}.
+    """
+    timestamps = [row[time_key] for row in rows]
+    result = {"timestamps": delta_encode(timestamps) if fmt == "delta" else timestamps}
+    names = value_keys.items() if isinstance(value_keys, dict) else ((k, k) for k in value_keys)
+    for name, key in names:
+        result[name] = [row.get(key) for row in rows]
+    return result
+
+
+def pack_series(timestamps, value_columns):
+    """uint32 timestamps followed by one float32 array per column, little-endian."""
+    n = len(timestamps)
+    parts = [struct.pack(f"<{n}I", *timestamps)]
+    for values in value_columns:
+        parts.append(struct.pack(f"<{n}f", *[math.nan if v is None else v for v in values]))
+    return b"".join(parts)
+
+
+def float32_response(series, value_names):
+    """
+    `series`: list of (name, timestamps, [values per column]).
+    Body: the packed series one after another. Headers describe the layout:
+    X-Series "name=count,..." (in body order) and X-Columns (value columns per series).
+    """
+    body = b"".join(pack_series(ts, cols) for _, ts, cols in series)
+    response = Response(body, status=200, mimetype=FLOAT32_MIMETYPE)
+    response.headers["X-Series"] = ",".join(f"{name}={len(ts)}" for name, ts, _ in series)
+    response.headers["X-Columns"] = ",".join(value_names)
+    response.headers["X-Layout"] = "uint32-timestamps,float32-columns,little-endian"
+    return response
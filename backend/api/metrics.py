@@ -0,0 +1,109 @@
+"""
+Prometheus metrics for the API.
+
+Under gunicorn, Prometheus scrapes the master on API_METRICS_PORT (internal
+network only, see gunicorn.conf.py). The app's own GET /metrics answers local
+requests only (dev server, `curl` inside the container); the published API
+port never serves it.
+
+- api_http_request_duration_seconds{method, route, status}: `route` is the URL
+  rule (`/api/devices/<int:device_id>/data`), so ids never become labels.
+  Streamed responses are measured until the response starts.
+- api_http_requests_in_flight{route}
+- api_db_op_duration_seconds{op, outcome}, api_db_pool_events_total{event},
+  api_db_pool_wait_seconds_total, api_cache_lookups_total{cache, result}:
+  counters kept by the pool and the caches themselves (see api/db/metrics.py);
+  hit ratio = rate(hit) / (rate(hit) + rate(miss)).
+- api_db_pool_connections{state}, api_db_pool_max_size: current pool state
+  (per worker, summed over workers), copied from `pool.stats()` at most once
+  per REFRESH_INTERVAL_S while serving requests (and on in-app scrapes).
+"""
+import ipaddress
+from time import monotonic
+
+from flask import Response, abort, g, request
+from prometheus_client import Gauge, Histogram
+
+from common.metrics import LATENCY_BUCKETS, Stopwatch, render
+from api.db import get_pool
+
+
+REFRESH_INTERVAL_S = 1.0
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "api_http_request_duration_seconds",
+    "API request duration until the response is returned",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "api_http_requests_in_flight", "Requests being handled", ["route"], multiprocess_mode="livesum"
+)
+POOL_CONNECTIONS = Gauge(
+    "api_db_pool_connections", "Open pool connections by state", ["state"], multiprocess_mode="livesum"
+)
+POOL_MAX_SIZE = Gauge("api_db_pool_max_size", "Pool size limit", multiprocess_mode="livesum")
+
+_last_refresh = 0.0
+
+
+def refresh_gauges():
+    global _last_refresh
+    _last_refresh = monotonic()
+
+    pool = get_pool()
+    if pool is not None:
+        stats = pool.stats()
+        POOL_CONNECTIONS.labels("idle").set(stats["idle"])
+        POOL_CONNECTIONS.labels("in_use").set(stats["in_use"])
+        POOL_MAX_SIZE.set(stats["max_size"])
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+def _before_request():
+    if request.path == "/metrics":
+        return
+    g.metrics_watch = Stopwatch()
+    g.metrics_route = _route()
+    HTTP_IN_FLIGHT.labels(g.metrics_route).inc()
+
+
+def _after_request(response):
+    watch = g.pop("metrics_watch", None)
+    if watch is not None:
+        HTTP_REQUEST_SECONDS.labels(request.method, g.metrics_route, str(response.status_code)).observe(watch.elapsed_s())
+        if monotonic() - _last_refresh >= REFRESH_INTERVAL_S:
+            refresh_gauges()
+    return response
+
+
+def _teardown_request(exc):
+    route = g.pop("metrics_route", None)
+    if route is not None:
+        HTTP_IN_FLIGHT.labels(route).dec()
+
+
+def _is_local(addr):
+    try:
+        return ipaddress.ip_address(addr or "").is_loopback
+    except ValueError:
+        return False
+
+
+def metrics():
+    if not _is_local(request.remote_addr):
+        abort(404)
+    refresh_gauges()
+    body, content_type = render()
+    return Response(body, status=200, content_type=content_type)
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics, methods=["GET"])
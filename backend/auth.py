@@ -1,22 +1,189 @@
 import os
+import hashlib
+import threading
+import time
 import requests
 import jwt
 from flask import request, jsonify
 from functools import wraps
 
+from common.logging_setup import setup_logger, log_event
+
 JWKS_URL = os.getenv('JWKS_URL')
 CLIENT_ID = os.getenv('CLIENT_ID')
 
+# JWKS key cache / validated-token memo
+JWKS_REFRESH_INTERVAL_S = float(os.getenv('JWKS_REFRESH_INTERVAL_S', '300'))
+JWKS_MIN_REFRESH_INTERVAL_S = float(os.getenv('JWKS_MIN_REFRESH_INTERVAL_S', '30'))
+JWKS_TIMEOUT_S = float(os.getenv('JWKS_TIMEOUT_S', '5'))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '1000'))
+
 print(CLIENT_ID, JWKS_URL)
 
+logger = setup_logger(service="api", module="auth")
+
+
+class JWKSCache:
+    """
+    Parsed RSA public keys from the JWKS endpoint, by `kid`.
+    - Keys are fetched once and refreshed in the background every `refresh_interval_s`;
+      requests keep using the current keys meanwhile (also when Keycloak is slow or down).
+    - An unknown `kid` (key rotation) forces a synchronous refresh.
+    - Fetches happen at most every `min_refresh_interval_s`, so tokens with made-up
+      `kid`s cannot hammer Keycloak.
+    """
+
+    def __init__(self, url, *, refresh_interval_s=300.0, min_refresh_interval_s=30.0, timeout_s=5.0):
+        self.url = url
+        self.refresh_interval_s = refresh_interval_s
+        self.min_refresh_interval_s = min_refresh_interval_s
+        self.timeout_s = timeout_s
+        self._keys = {}
+        self._fetched_at = None     # last successful fetch
+        self._attempted_at = None   # last fetch attempt (rate limit)
+        self._lock = threading.Lock()        # state only, never held during the HTTP fetch
+        self._fetch_lock = threading.Lock()  # one fetch at a time; unknown-kid callers wait for it
+        self._refreshing = False
+
+    def get_key(self, kid):
+        key = self._keys.get(kid)
+        if key is not None:
+            self._maybe_refresh_in_background()
+            return key
+        self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            raise Exception("Public key not found")
+        return key
+
+    def refresh(self):
+        """Fetch and parse the JWKS unless the last attempt was too recent. Returns True if fetched."""
+        with self._fetch_lock:
+            with self._lock:
+                now = time.monotonic()
+                if self._attempted_at is not None and now - self._attempted_at < self.min_refresh_interval_s:
+                    return False
+                self._attempted_at = now
+            try:
+                jwks = requests.get(self.url, timeout=self.timeout_s).json()
+                keys = {}
+                for jwk in jwks['keys']:
+                    if jwk.get('kty') == 'RSA' and 'kid' in jwk:
+                        keys[jwk['kid']] = jwt.algorithms.RSAAlgorithm.from_jwk(jwk)
+            except Exception as e:
+                # keep serving the keys we have
+                log_event(logger, "WARNING", "auth.jwks_refresh_failed", error_type=e.__class__.__name__, keys=len(self._keys))
+                return False
+            with self._lock:
+                self._keys = keys
+                self._fetched_at = time.monotonic()
+            log_event(logger, "INFO", "auth.jwks_refreshed", keys=len(keys))
+            return True
+
+    def _maybe_refresh_in_background(self):
+        if self._fetched_at is None or time.monotonic() - self._fetched_at < self.refresh_interval_s:
+            return
+        # request path: never wait here, a refresh in progress is as good as a new one
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        finally:
+            self._lock.release()
+        threading.Thread(target=self._background_refresh, name="jwks-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+
+def _cache_lookups():
+    # imported on use: the api package imports this module while it is being loaded
+    from api.db.metrics import CACHE_LOOKUPS
+
+    return CACHE_LOOKUPS
+
+
+class TokenCache:
+    """
+    Claims of recently validated tokens until their `exp`, so the RS256 signature
+    check runs once per token. Keyed by SHA-256 of the token; bounded to `max_entries`.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max(0, int(max_entries))
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        if not self.max_entries:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            self.stats["misses" if entry is None else "hits"] += 1
+        _cache_lookups().labels("auth_token", "miss" if entry is None else "hit").inc()
+        return entry[1] if entry is not None else None
+
+    def put(self, token, claims):
+        exp = claims.get('exp')
+        if not self.max_entries or not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.time()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[self._key(token)] = (exp, claims)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+jwks_cache = JWKSCache(
+    JWKS_URL,
+    refresh_interval_s=JWKS_REFRESH_INTERVAL_S,
+    min_refresh_interval_s=JWKS_MIN_REFRESH_INTERVAL_S,
+    timeout_s=JWKS_TIMEOUT_S,
+)
+token_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE)
+
+
 def get_public_key(token):
     header = jwt.get_unverified_header(token)
     kid = header['kid']
-    jwks = requests.get(JWKS_URL).json()
-    for key in jwks['keys']:
-        if key['kid'] == kid:
-            return jwt.algorithms.RSAAlgorithm.from_jwk(key)
-    raise Exception("Public key not found")
+    return jwks_cache.get_key(kid)
+
+
+def validate_token(token):
+    """Return the token's claims; raises if the signature, expiry or azp is invalid."""
+    decoded = token_cache.get(token)
+    if decoded is not None:
+        return decoded
+
+    public_key = get_public_key(token)
+    decoded = jwt.decode(token, public_key, algorithms=['RS256'], options={"verify_aud": False})
+
+    if decoded.get('azp') != CLIENT_ID:
+        raise Exception(f"Authorized party mismatch: expected {CLIENT_ID}, got {decoded.get('azp')}")
+
+    token_cache.put(token, decoded)
+    return decoded
+
 
 def token_required(f):
     @wraps(f)
@@ -28,18 +195,12 @@ def token_required(f):
                 token = auth_header.split(" ")[1]
         if not token:
             return {"message": "Token is missing"}, 401
-        
+
         try:
-            public_key = get_public_key(token)
-            decoded = jwt.decode(token, public_key, algorithms=['RS256'], options={"verify_aud": False})
-            
-            if decoded.get('azp') != CLIENT_ID:
-                raise Exception(f"Authorized party mismatch: expected {CLIENT_ID}, got {decoded.get('azp')}")
-            
-            request.user = decoded
-            
+            request.user = validate_token(token)
+
         except Exception as e:
             return {"message": "Token is invalid", "error": str(e)}, 401
-        
+
         return f(*args, **kwargs)
     return decorated
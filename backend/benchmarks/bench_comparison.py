@@ -0,0 +1,148 @@
+"""
+Latency of /api/comparison's DB query against table size.
+
+Seeds a throw-away copy of `sensor_data` in its own schema (default `bench`, the
+real table is never touched), then times `compare_devices_over_time` next to the
+previous COUNT + EXTRACT(EPOCH ...) implementation for growing table sizes.
+
+    cd backend
+    DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \
+        python -m benchmarks.bench_comparison --sizes 10000,100000,1000000 --repeat 20
+
+Prints one markdown table row per size (p50/p95 in ms); `--json` writes the raw numbers.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+SCHEMA_DEFAULT = "bench"
+
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sizes", default="10000,100000,1000000", help="rows per device, comma separated")
+    p.add_argument("--repeat", type=int, default=20, help="timed runs per size and variant")
+    p.add_argument("--buckets", type=int, default=200, help="num_buckets passed to the comparison")
+    p.add_argument("--window", type=float, default=0.25, help="queried fraction of the seeded time span (0..1]")
+    p.add_argument("--interval-s", type=int, default=10, help="seconds between seeded readings")
+    p.add_argument("--schema", default=SCHEMA_DEFAULT, help="schema for the seeded copy (dropped afterwards)")
+    p.add_argument("--keep", action="store_true", help="keep the seeded schema")
+    p.add_argument("--json", dest="json_path", help="write results to this file")
+    return p.parse_args(argv)
+
+
+# Previous implementation, kept here as the baseline: full COUNT(*), then a
+# bucket query filtering on EXTRACT(EPOCH FROM timestamp) (not index/chunk friendly).
+LEGACY_COUNT = """
+    SELECT COUNT(*) FROM sensor_data
+    WHERE (device_id = %s OR device_id = %s)
+    AND timestamp >= TO_TIMESTAMP(%s) AT TIME ZONE 'UTC'
+    AND timestamp <= TO_TIMESTAMP(%s) AT TIME ZONE 'UTC';
+"""
+LEGACY_BUCKETS = """
+    SELECT device_id,
+           FLOOR((EXTRACT(EPOCH FROM timestamp) - %s) / %s) AS bucket,
+           MIN(EXTRACT(EPOCH FROM timestamp)) AS bucket_start,
+           AVG(temperature) AS avg_value
+    FROM sensor_data
+    WHERE (device_id = %s OR device_id = %s)
+      AND EXTRACT(EPOCH FROM timestamp) >= %s
+      AND EXTRACT(EPOCH FROM timestamp) <= %s
+    GROUP BY device_id, bucket
+    ORDER BY device_id, bucket_start
+"""
+
+
+def legacy_compare(get_db_connection, start, end, num_buckets):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(LEGACY_COUNT, (1, 2, start, end))
+            cursor.fetchone()
+            bucket_size = max(1, int((end - start) / num_buckets))
+            cursor.execute(LEGACY_BUCKETS, (start, bucket_size, 1, 2, start, end))
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def seed(conn, schema, rows_per_device, interval_s, end_epoch):
+    start_epoch = end_epoch - rows_per_device * interval_s
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+        cur.execute(f"DROP TABLE IF EXISTS {schema}.sensor_data")
+        cur.execute(f"CREATE TABLE {schema}.sensor_data (LIKE public.sensor_data INCLUDING ALL)")
+        cur.execute("SELECT create_hypertable(%s, 'timestamp')", (f"{schema}.sensor_data",))
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.sensor_data (device_id, timestamp, temperature, humidity, pollen, particulate_matter)
+            SELECT d, TO_TIMESTAMP(ts), 20 + random() * 5, 40 + random() * 20, (random() * 50)::int, (random() * 60)::int
+            FROM generate_series(1, 2) AS d,
+                 generate_series(%s::bigint, %s::bigint - 1, %s::bigint) AS ts
+            """,
+            (start_epoch, end_epoch, interval_s),
+        )
+        cur.execute(f"ANALYZE {schema}.sensor_data")
+    conn.commit()
+    return start_epoch
+
+
+def timed(fn, repeat):
+    fn()  # warm-up (plan cache, buffers)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+    }
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    # Every connection of this process (pool included) resolves sensor_data to the copy.
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema},public"
+
+    from api.db.connection import get_db_connection, _connect
+    from api.db.comparison import compare_devices_over_time
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    end_epoch = int(time.time()) // 3600 * 3600
+    results = []
+    admin = _connect()
+    try:
+        print("| rows per device | total rows | legacy p50 / p95 (ms) | time_bucket p50 / p95 (ms) |")
+        print("|---:|---:|---:|---:|")
+        for size in sizes:
+            start_epoch = seed(admin, args.schema, size, args.interval_s, end_epoch)
+            q_start = int(end_epoch - (end_epoch - start_epoch) * args.window)
+            legacy = timed(lambda: legacy_compare(get_db_connection, q_start, end_epoch, args.buckets), args.repeat)
+            current = timed(
+                lambda: compare_devices_over_time(1, 2, "temperature", q_start, end_epoch, args.buckets), args.repeat
+            )
+            results.append({"rows_per_device": size, "legacy": legacy, "time_bucket": current})
+            print(
+                f"| {size} | {2 * size} | {legacy['p50_ms']} / {legacy['p95_ms']} "
+                f"| {current['p50_ms']} / {current['p95_ms']} |"
+            )
+            sys.stdout.flush()
+    finally:
+        if not args.keep:
+            with admin.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            admin.commit()
+        admin.close()
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"buckets": args.buckets, "window": args.window, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Sustained throughput, commit latency and CPU per message of the MQTT ingester.
+
+Publishes synthetic readings (`{value, timestamp, meta.device_id}`, values inside
+VALID_RANGES) round-robin over every `metric_map` topic at a fixed rate, and
+follows the commits through the ingester's NOTIFY on `sensor_data_written`:
+
+- commit latency: publish → NOTIFY of the row (every message gets its own
+  (device_id, timestamp), so each row is one message; the coalescer has nothing to merge)
+- sustained msgs/s: messages committed between the end of the warm-up and the
+  end of publishing, per second (lower than the publish rate = the ingester falls behind)
+- CPU per message: `process_cpu_seconds_total` / `ingester_messages_total{result="ok"}`
+  from the ingester's /metrics over the same window, plus the DB write p50/p99
+
+Local broker + TimescaleDB (and optionally the ingester) from
+`benchmarks/docker-compose.ingest.yml`; same env as the ingester (MQTT_*, DB_*):
+
+    cd backend/benchmarks
+    docker compose -f docker-compose.ingest.yml up -d --build
+    cd ..
+    MQTT_BROKER=localhost MQTT_PORT=1883 DB_HOST=localhost DB_PORT=5433 DB_NAME=bench \
+    DB_USER=bench DB_PASSWORD=bench \
+        python -m benchmarks.bench_ingest --rate 2000 --duration 60 --json ingest-direct.json
+
+The ingester turns payload timestamps into naive local datetimes, so it must run with
+TZ=UTC (the compose service does) for the NOTIFY timestamps to match the published ones.
+Bench devices start at `--device-base` (900000); `--cleanup` deletes their rows afterwards.
+Prints one markdown table row; `--json` writes the numbers.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+
+SYNTHETIC_DEVICE_BASE = 900000
+
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rate", type=float, default=1000, help="messages/s to publish in total (0 = as fast as possible)")
+    p.add_argument("--duration", type=float, default=60, help="seconds of publishing, warm-up included")
+    p.add_argument("--warmup", type=float, default=10, help="seconds excluded from the results")
+    p.add_argument("--devices", type=int, default=20, help="synthetic devices")
+    p.add_argument("--device-base", type=int, default=SYNTHETIC_DEVICE_BASE, help="first synthetic device_id")
+    p.add_argument("--qos", type=int, default=1, choices=(0, 1, 2))
+    p.add_argument("--metrics-url", default="http://localhost:9101/metrics", help="ingester /metrics ('' = skip)")
+    p.add_argument("--drain-timeout", type=float, default=30, help="seconds to wait for outstanding commits")
+    p.add_argument("--label", default=os.getenv("INGEST_WRITE_MODE", "direct"), help="run name in the output")
+    p.add_argument("--cleanup", action="store_true", help="delete the synthetic devices' rows afterwards")
+    p.add_argument("--json", dest="json_path", help="write results to this file")
+    return p.parse_args(argv)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+# ---------- synthetic load ----------
+
+def topics(base_topic, metric_map):
+    """[(topic, metric)] for every mapped sensor."""
+    return [
+        (f"{base_topic}/{sensor_type}/{sensor_id}", metric)
+        for sensor_type, sensors in metric_map.items()
+        for sensor_id, metric in sensors.items()
+    ]
+
+
+def synthetic_value(metric, valid_ranges, rng):
+    low, high = valid_ranges[metric]
+    if metric in ("pollen", "particulate_matter"):
+        return rng.randint(int(low), int(high))
+    return round(rng.uniform(low, high), 2)
+
+
+class CommitTracker:
+    """Publish times per (device_id, timestamp), resolved by the ingester's NOTIFY payloads."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.latencies_ms = []   # (publish time, latency) of committed messages
+        self.commit_times = []   # arrival time of every committed message
+
+    def published(self, device_id, ts, at):
+        with self._lock:
+            self._pending[(device_id, ts)] = at
+
+    def committed(self, payload, at):
+        try:
+            device_id, first, last = (int(p) for p in payload.split(":"))
+        except ValueError:
+            return
+        with self._lock:
+            for ts in range(first, last + 1):
+                sent = self._pending.pop((device_id, ts), None)
+                if sent is not None:
+                    self.latencies_ms.append((sent, (at - sent) * 1000))
+                    self.commit_times.append(at)
+
+    def outstanding(self):
+        with self._lock:
+            return len(self._pending)
+
+
+def listen(conn, channel, tracker, stop):
+    import select
+
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {channel};")
+    while not stop.is_set():
+        if select.select([conn], [], [], 0.5) == ([], [], []):
+            continue
+        conn.poll()
+        now = time.monotonic()
+        while conn.notifies:
+            tracker.committed(conn.notifies.pop(0).payload, now)
+
+
+def publish(client, targets, args, valid_ranges, tracker, start):
+    """Publish at `args.rate` until `args.duration` is over; returns messages sent."""
+    rng = random.Random(42)
+    # every message gets its own timestamp per device: one message = one row = one NOTIFY match
+    next_ts = {args.device_base + d: int(time.time()) for d in range(args.devices)}
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    sent = 0
+    end = start + args.duration
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            return sent
+        if interval:
+            due = start + sent * interval
+            if due > now:
+                time.sleep(min(due - now, 0.01))
+                continue
+        device_id = args.device_base + sent % args.devices
+        topic, metric = targets[(sent // args.devices) % len(targets)]
+        ts = next_ts[device_id]
+        next_ts[device_id] = ts + 1
+        payload = {"value": synthetic_value(metric, valid_ranges, rng), "timestamp": str(ts), "meta": {"device_id": device_id}}
+        tracker.published(device_id, ts, time.monotonic())
+        client.publish(topic, json.dumps(payload), qos=args.qos)
+        sent += 1
+
+
+# ---------- ingester /metrics ----------
+
+def scrape(url):
+    """{(name, labels): value} of one /metrics page, or None if unreachable."""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            text = resp.read().decode("utf-8")
+    except OSError:
+        return None
+    samples = {}
+    for family in text_string_to_metric_families(text):
+        for s in family.samples:
+            samples[(s.name, tuple(sorted(s.labels.items())))] = s.value
+    return samples
+
+
+def _delta(before, after, name, **match):
+    total = 0.0
+    for (sample, labels), value in after.items():
+        if sample == name and all(dict(labels).get(k) == v for k, v in match.items()):
+            total += value - before.get((sample, labels), 0.0)
+    return total
+
+
+def _histogram_quantile(before, after, name, q, **match):
+    """histogram_quantile() over the bucket deltas of `name` (linear within a bucket)."""
+    buckets = defaultdict(float)
+    for (sample, labels), value in after.items():
+        labels_d = dict(labels)
+        if sample != f"{name}_bucket" or not all(labels_d.get(k) == v for k, v in match.items()):
+            continue
+        buckets[float(labels_d["le"])] += value - before.get((sample, labels), 0.0)
+    bounds = sorted(buckets)
+    if not bounds or not buckets[bounds[-1]]:
+        return None
+    rank = q * buckets[bounds[-1]]
+    lower, below = 0.0, 0.0
+    for le in bounds:
+        if buckets[le] >= rank:
+            if le == float("inf"):
+                return lower
+            return lower + (le - lower) * (rank - below) / max(buckets[le] - below, 1e-9)
+        lower, below = le, buckets[le]
+    return lower
+
+
+def ingester_stats(before, after, wall_s):
+    ok = _delta(before, after, "ingester_messages_total", result="ok")
+    cpu = _delta(before, after, "process_cpu_seconds_total")
+    stats = {
+        "ingester_ok_msgs_per_s": round(ok / wall_s, 1),
+        "cpu_utilisation": round(cpu / wall_s, 3),
+        "cpu_ms_per_msg": round(cpu * 1000 / ok, 4) if ok else None,
+    }
+    for q in (0.5, 0.99):
+        value = _histogram_quantile(before, after, "ingester_db_write_duration_seconds", q, outcome="ok")
+        stats[f"db_write_p{int(q * 100)}_ms"] = round(value * 1000, 2) if value is not None else None
+    return stats
+
+
+# ---------- run ----------
+
+def cleanup(conn, device_base, devices):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM sensor_data WHERE device_id BETWEEN %s AND %s", (device_base, device_base + devices - 1))
+        cur.execute("DELETE FROM devices WHERE device_id BETWEEN %s AND %s", (device_base, device_base + devices - 1))
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    import paho.mqtt.client as mqtt
+    import psycopg2
+    from mqtt_client.mqtt_config import (
+        MQTT_BROKER, MQTT_PORT, MQTT_BASE_TOPIC, DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD,
+    )
+    from mqtt_client.main_ingester import metric_map
+    from mqtt_client.handler import VALID_RANGES
+    from mqtt_client.db_writer import NOTIFY_CHANNEL
+
+    targets = topics(MQTT_BASE_TOPIC, metric_map)
+    tracker = CommitTracker()
+    stop = threading.Event()
+
+    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
+    conn.autocommit = True
+    listener = threading.Thread(target=listen, args=(conn, NOTIFY_CHANNEL, tracker, stop), daemon=True)
+    listener.start()
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"bench-ingest-{os.getpid()}")
+    client.max_inflight_messages_set(1000)
+    client.max_queued_messages_set(0)
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+
+    start = time.monotonic()
+    warm_end = start + args.warmup
+    before = after = None
+    scraper = None
+    if args.metrics_url:
+        def _scrape_at_warmup_end():
+            nonlocal before
+            time.sleep(max(0.0, warm_end - time.monotonic()))
+            before = scrape(args.metrics_url)
+
+        scraper = threading.Thread(target=_scrape_at_warmup_end, daemon=True)
+        scraper.start()
+
+    try:
+        sent = publish(client, targets, args, VALID_RANGES, tracker, start)
+        publish_end = time.monotonic()
+        if scraper is not None:
+            scraper.join()
+            after = scrape(args.metrics_url)
+        backlog = tracker.outstanding()
+        drain_deadline = publish_end + args.drain_timeout
+        while tracker.outstanding() and time.monotonic() < drain_deadline:
+            time.sleep(0.1)
+    finally:
+        stop.set()
+        client.loop_stop()
+        client.disconnect()
+        listener.join()
+        if args.cleanup:
+            cleanup(conn, args.device_base, args.devices)
+        conn.close()
+
+    window_s = max(publish_end - warm_end, 1e-9)
+    latencies = sorted(ms for sent_at, ms in tracker.latencies_ms if sent_at >= warm_end)
+    committed_in_window = sum(1 for t in tracker.commit_times if warm_end <= t <= publish_end)
+    result = {
+        "label": args.label,
+        "target_rate": args.rate,
+        "published": sent,
+        "publish_rate": round(sent / max(publish_end - start, 1e-9), 1),
+        "sustained_msgs_per_s": round(committed_in_window / window_s, 1),
+        "backlog_at_end": backlog,
+        "lost": tracker.outstanding(),
+        "commit_p50_ms": round(_percentile(latencies, 0.50), 1),
+        "commit_p95_ms": round(_percentile(latencies, 0.95), 1),
+        "commit_p99_ms": round(_percentile(latencies, 0.99), 1),
+    }
+    if before is not None and after is not None:
+        result.update(ingester_stats(before, after, window_s))
+    elif args.metrics_url:
+        print(f"ingester metrics not reachable at {args.metrics_url}", file=sys.stderr)
+
+    print("| run | target msg/s | published msg/s | sustained msg/s | commit p50 / p95 / p99 (ms) | CPU ms/msg | DB write p50 / p99 (ms) | lost |")
+    print("|---|---:|---:|---:|---:|---:|---:|---:|")
+    print(
+        f"| {result['label']} | {args.rate:g} | {result['publish_rate']} | {result['sustained_msgs_per_s']} "
+        f"| {result['commit_p50_ms']} / {result['commit_p95_ms']} / {result['commit_p99_ms']} "
+        f"| {result.get('cpu_ms_per_msg')} | {result.get('db_write_p50_ms')} / {result.get('db_write_p99_ms')} "
+        f"| {result['lost']} |"
+    )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0 if not result["lost"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
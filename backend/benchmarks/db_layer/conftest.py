@@ -0,0 +1,131 @@
+"""
+Seeded database for the db layer benchmarks (pytest-benchmark).
+
+Everything lives in its own schema (BENCH_SCHEMA, default `bench_db`; the real
+tables are never touched): copies of `sensor_data` and `devices`, plus the
+continuous aggregates of db/continuous_aggregates.sql created inside that schema.
+PGOPTIONS puts the schema first on the search_path of every connection, so the
+api.db functions run their normal queries against the seeded copy.
+
+- BENCH_DEVICES (2): devices seeded, ids 1..N
+- BENCH_HISTORY_DAYS ("1,30,365"): history lengths; each one is a reseed and a full
+  run of the suite (pytest groups the tests by history)
+- BENCH_CADENCE_S (30): seconds between readings
+- BENCH_KEEP=1: keep the schema afterwards
+"""
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+BENCH_SCHEMA = os.getenv("BENCH_SCHEMA", "bench_db")
+BENCH_DEVICES = int(os.getenv("BENCH_DEVICES", "2"))
+BENCH_HISTORY_DAYS = [int(d) for d in os.getenv("BENCH_HISTORY_DAYS", "1,30,365").split(",") if d]
+BENCH_CADENCE_S = int(os.getenv("BENCH_CADENCE_S", "30"))
+BENCH_KEEP = os.getenv("BENCH_KEEP", "0") == "1"
+
+# Before any api.db import: connections resolve sensor_data/devices/aggregates to the copy,
+# and the per-call INFO lines stay out of the measurements.
+os.environ["PGOPTIONS"] = f"-c search_path={BENCH_SCHEMA},public"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+AGGREGATES_SQL = Path(__file__).resolve().parents[3] / "db" / "continuous_aggregates.sql"
+
+
+class Seeded:
+    """What the current seed holds; the benchmarks derive their query windows from it."""
+
+    def __init__(self, history_days, devices, cadence_s, end):
+        self.history_days = history_days
+        self.devices = devices
+        self.cadence_s = cadence_s
+        self.end = end
+        self.start = end - history_days * 86400
+
+    @property
+    def rows_per_device(self):
+        return (self.end - self.start) // self.cadence_s
+
+    def window(self, seconds):
+        """(start, end) of the newest `seconds` of history, clamped to what was seeded."""
+        return max(self.start, self.end - seconds), self.end
+
+
+def _statements(path):
+    """SQL statements of a script without dollar-quoted bodies (splitting on ';' is enough)."""
+    code = "\n".join(line for line in path.read_text().splitlines() if not line.strip().startswith("--"))
+    return [statement.strip() for statement in code.split(";") if statement.strip()]
+
+
+def seed(conn, schema, devices, history_days, cadence_s, end):
+    """(Re)create the schema with `history_days` of readings every `cadence_s` s for devices 1..N."""
+    start = end - history_days * 86400
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"CREATE TABLE {schema}.sensor_data (LIKE public.sensor_data INCLUDING ALL)")
+        cur.execute("SELECT create_hypertable(%s, 'timestamp')", (f"{schema}.sensor_data",))
+        cur.execute(f"CREATE TABLE {schema}.devices (LIKE public.devices INCLUDING ALL)")
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.sensor_data (device_id, timestamp, temperature, humidity, pollen, particulate_matter)
+            SELECT d, TO_TIMESTAMP(ts), 20 + random() * 5, 40 + random() * 20, (random() * 50)::int, (random() * 60)::int
+            FROM generate_series(1, %s) AS d,
+                 generate_series(%s::bigint, %s::bigint - 1, %s::bigint) AS ts
+            """,
+            (devices, start, end, cadence_s),
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {schema}.devices (device_id, first_seen, last_seen, row_count)
+            SELECT device_id, MIN(timestamp), MAX(timestamp), COUNT(*)
+            FROM {schema}.sensor_data GROUP BY device_id
+            """
+        )
+        cur.execute(f"ANALYZE {schema}.sensor_data")
+        # Continuous aggregates (and their one-off refresh) inside the schema.
+        # CREATE ... timescaledb.continuous and CALL refresh_... refuse to run in a transaction block.
+        cur.execute(f"SET search_path = {schema}, public")
+        for statement in _statements(AGGREGATES_SQL):
+            cur.execute(statement)
+        cur.execute("RESET search_path")
+
+
+@pytest.fixture(scope="session", params=BENCH_HISTORY_DAYS, ids=lambda days: f"{days}d")
+def seeded(request):
+    from api.db.connection import _connect
+
+    try:
+        conn = _connect()
+    except Exception as e:
+        pytest.skip(f"no database for the benchmarks ({e.__class__.__name__}); set DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASSWORD")
+    conn.autocommit = True
+    end = int(time.time()) // 3600 * 3600
+    try:
+        seed(conn, BENCH_SCHEMA, BENCH_DEVICES, request.param, BENCH_CADENCE_S, end)
+        yield Seeded(request.param, BENCH_DEVICES, BENCH_CADENCE_S, end)
+    finally:
+        if not BENCH_KEEP:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        conn.close()
+
+
+@pytest.fixture
+def measure(benchmark):
+    """
+    Run `fn` under pytest-benchmark and record the result size:
+    extra_info `rows` and `rows_per_s` (rows / mean latency) end up in --benchmark-json.
+    `count` maps the return value to a row count.
+    """
+    def run(fn, *, count=len, **params):
+        result = benchmark(fn)
+        rows = count(result)
+        benchmark.extra_info.update(params)
+        benchmark.extra_info["rows"] = rows
+        if benchmark.stats is not None and benchmark.stats.stats.mean:
+            benchmark.extra_info["rows_per_s"] = round(rows / benchmark.stats.stats.mean, 1)
+        return result
+
+    return run
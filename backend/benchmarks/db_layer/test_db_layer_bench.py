@@ -0,0 +1,87 @@
+"""
+Latency and rows/s of the api.db read functions against a seeded history
+(see conftest.py for the seed settings).
+
+    cd backend
+    DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \
+        python -m pytest benchmarks/db_layer --benchmark-json=db-layer.json
+
+Test ids carry the history length and the parameters, e.g.
+`test_device_data[30d-7d-buckets]`; `extra_info` in the JSON holds rows and rows_per_s.
+Compare two runs with `pytest-benchmark compare before.json after.json`.
+"""
+import pytest
+
+from api.db import (
+    get_device_data_from_db,
+    compare_devices_over_time,
+    get_latest_device_data_from_db,
+    get_all_device_time_ranges_from_db,
+)
+
+HOUR = 3600
+DAY = 24 * HOUR
+YEAR = 365 * DAY
+
+# Chart requests ask for ~200 points; raw rows only for short windows.
+BUCKETS = 200
+WINDOWS = {"1h": HOUR, "1d": DAY, "7d": 7 * DAY, "30d": 30 * DAY, "1y": YEAR}
+
+
+def _series_rows(result):
+    return sum(len(series) for series in result["data"].values())
+
+
+@pytest.mark.parametrize("window,mode", [
+    ("1h", "raw"),
+    ("1d", "raw"),
+    ("1d", "buckets"),
+    ("7d", "buckets"),
+    ("30d", "buckets"),
+    ("1y", "buckets"),
+])
+@pytest.mark.parametrize("metric", ["temperature", None], ids=["temperature", "all"])
+def test_device_data(seeded, measure, window, mode, metric):
+    if WINDOWS[window] > seeded.history_days * DAY:
+        pytest.skip(f"window {window} exceeds the seeded history")
+    start, end = seeded.window(WINDOWS[window])
+    buckets = BUCKETS if mode == "buckets" else None
+    measure(
+        lambda: get_device_data_from_db(1, metric, start, end, buckets=buckets),
+        history_days=seeded.history_days, window=window, mode=mode, metric=metric or "ALL",
+    )
+
+
+@pytest.mark.parametrize("window,num_buckets", [
+    ("1h", None),
+    ("1d", BUCKETS),
+    ("7d", BUCKETS),
+    ("30d", BUCKETS),
+    ("1y", BUCKETS),
+])
+def test_compare_devices(seeded, measure, window, num_buckets):
+    if WINDOWS[window] > seeded.history_days * DAY:
+        pytest.skip(f"window {window} exceeds the seeded history")
+    if seeded.devices < 2:
+        pytest.skip("needs BENCH_DEVICES >= 2")
+    start, end = seeded.window(WINDOWS[window])
+    measure(
+        lambda: compare_devices_over_time(1, 2, "temperature", start, end, num_buckets),
+        count=_series_rows,
+        history_days=seeded.history_days, window=window, num_buckets=num_buckets,
+    )
+
+
+def test_latest(seeded, measure):
+    measure(
+        lambda: get_latest_device_data_from_db(1),
+        count=lambda row: 1 if row else 0,
+        history_days=seeded.history_days,
+    )
+
+
+def test_time_ranges(seeded, measure):
+    measure(
+        get_all_device_time_ranges_from_db,
+        history_days=seeded.history_days, devices=seeded.devices,
+    )
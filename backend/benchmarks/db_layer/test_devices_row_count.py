@@ -0,0 +1,49 @@
+"""
+`devices.row_count` under concurrent writers on the seeded schema (see conftest.py):
+two ingesters upserting the same new reading must count it once.
+
+    cd backend
+    DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \
+        python -m pytest benchmarks/db_layer/test_devices_row_count.py
+"""
+import threading
+from datetime import datetime, timezone
+
+from api.db.connection import _connect
+from mqtt_client.db_writer import SINGLE_ROW_UPSERT
+
+
+def _row_count(conn, device_id):
+    with conn.cursor() as cur:
+        cur.execute("SELECT row_count FROM devices WHERE device_id = %s", (device_id,))
+        return cur.fetchone()[0]
+
+
+def test_same_new_reading_from_two_writers_is_counted_once(seeded):
+    first, second = _connect(), _connect()
+    try:
+        before = _row_count(first, 1)
+        stamp = datetime.fromtimestamp(seeded.end + 3600, timezone.utc)
+
+        with first.cursor() as cur:
+            cur.execute(SINGLE_ROW_UPSERT, (1, stamp, 21.0, None, None, None))
+        # the second upsert waits on the first one's uncommitted row
+        done = threading.Event()
+
+        def write_second():
+            with second.cursor() as cur:
+                cur.execute(SINGLE_ROW_UPSERT, (1, stamp, None, 45.0, None, None))
+            second.commit()
+            done.set()
+
+        writer = threading.Thread(target=write_second)
+        writer.start()
+        assert not done.wait(0.5)
+        first.commit()
+        writer.join(10)
+        assert done.is_set()
+
+        assert _row_count(first, 1) == before + 1
+    finally:
+        first.close()
+        second.close()
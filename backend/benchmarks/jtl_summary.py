@@ -0,0 +1,100 @@
+"""
+Requests/s and latency from JMeter result files (CSV `.jtl`), to compare API
+servers under the same `frontend-loadtest/jmeter/plan.jmx` run.
+
+    # before: dev server (`flask run`), after: gunicorn (Dockerfile.api default)
+    cd frontend-loadtest
+    USERS=0 API_USERS=32 API_TOKEN=... RESULTS_DIR=results-flask ./run-jmeter.sh
+    USERS=0 API_USERS=32 API_TOKEN=... RESULTS_DIR=results-gunicorn ./run-jmeter.sh
+
+    cd ../backend
+    python -m benchmarks.jtl_summary flask=../frontend-loadtest/results-flask/results.jtl \
+        gunicorn=../frontend-loadtest/results-gunicorn/results.jtl
+
+Prints one markdown table row per run and sampler label; `--json` writes the numbers.
+"""
+import argparse
+import csv
+import json
+import sys
+from collections import defaultdict
+
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("runs", nargs="+", help="name=path/to/results.jtl")
+    p.add_argument("--label", action="append", help="only these sampler labels (repeatable)")
+    p.add_argument("--json", dest="json_path", help="write results to this file")
+    return p.parse_args(argv)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(rows, labels=None):
+    """
+    Per sampler label (and "ALL"): samples, requests/s over the wall-clock span
+    of the samples, p50/p95/p99 elapsed in ms and the error rate.
+    """
+    groups = defaultdict(list)
+    for row in rows:
+        if labels and row["label"] not in labels:
+            continue
+        groups[row["label"]].append(row)
+        groups["ALL"].append(row)
+
+    result = {}
+    for label, samples in groups.items():
+        start = min(int(s["timeStamp"]) for s in samples)
+        end = max(int(s["timeStamp"]) + int(s["elapsed"]) for s in samples)
+        span_s = max(end - start, 1) / 1000
+        elapsed = sorted(int(s["elapsed"]) for s in samples)
+        errors = sum(1 for s in samples if s["success"].lower() != "true")
+        result[label] = {
+            "samples": len(samples),
+            "rps": round(len(samples) / span_s, 2),
+            "p50_ms": round(_percentile(elapsed, 0.50), 1),
+            "p95_ms": round(_percentile(elapsed, 0.95), 1),
+            "p99_ms": round(_percentile(elapsed, 0.99), 1),
+            "error_rate": round(errors / len(samples), 4),
+        }
+    return result
+
+
+def read_jtl(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    results = {}
+    for run in args.runs:
+        name, sep, path = run.partition("=")
+        if not sep:
+            name = path = run
+        results[name] = summarize(read_jtl(path), args.label)
+
+    print("| run | label | samples | req/s | p50 ms | p95 ms | p99 ms | errors |")
+    print("|---|---|---:|---:|---:|---:|---:|---:|")
+    for name, labels in results.items():
+        for label, r in sorted(labels.items(), key=lambda item: (item[0] == "ALL", item[0])):
+            print(
+                f"| {name} | {label} | {r['samples']} | {r['rps']} | {r['p50_ms']} | "
+                f"{r['p95_ms']} | {r['p99_ms']} | {r['error_rate']:.2%} |"
+            )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
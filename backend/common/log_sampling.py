@@ -0,0 +1,155 @@
+# common/log_sampling.py
+"""
+Sampling for high-volume success events, plus periodic summaries.
+
+- `SampledEvent.record(...)` is called for every success event and says whether
+  to log this one: 1 in `every_n` events per sample key and/or while the key's
+  token bucket (`rate_per_s`, `burst`) has tokens. The caller keeps its own
+  `log_event` call, guarded by the result.
+- Every event, logged or not, is counted per summary key; every `summary_interval_s`
+  one `<event>_summary` line per key carries count, logged count and p50/p99/max
+  of `duration_ms`. Summaries are written from `record` (no extra thread) and by `flush()`.
+- Errors are not sampled: keep logging them with `log_event` unconditionally.
+
+Defaults come from LOG_SAMPLE_EVERY_N (1 = every event), LOG_SAMPLE_RATE_PER_S
+(0 = no token bucket), LOG_SAMPLE_BURST and LOG_SUMMARY_INTERVAL_S (0 = no summaries).
+"""
+import os
+import threading
+from time import monotonic
+from typing import Any, Dict, Hashable, Optional
+
+from .logging_setup import log_event
+
+LOG_SAMPLE_EVERY_N = int(os.getenv("LOG_SAMPLE_EVERY_N", "1"))
+LOG_SAMPLE_RATE_PER_S = float(os.getenv("LOG_SAMPLE_RATE_PER_S", "0"))
+LOG_SAMPLE_BURST = float(os.getenv("LOG_SAMPLE_BURST", "10"))
+LOG_SUMMARY_INTERVAL_S = float(os.getenv("LOG_SUMMARY_INTERVAL_S", "60"))
+
+
+def _percentile(counts: Dict[int, int], total: int, q: float) -> int:
+    """Nearest-rank percentile over a {duration_ms: count} histogram."""
+    rank = max(1, int(q * total + 0.999999))
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= rank:
+            return value
+    return 0
+
+
+class _Summary:
+    __slots__ = ("count", "logged", "durations")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.logged = 0
+        self.durations: Dict[int, int] = {}  # duration_ms -> count; ms resolution keeps this small
+
+
+class SampledEvent:
+    """One sampled success event (e.g. `msg_processed`) of one logger."""
+
+    def __init__(
+        self,
+        logger,
+        event: str,
+        *,
+        every_n: Optional[int] = None,
+        rate_per_s: Optional[float] = None,
+        burst: Optional[float] = None,
+        summary_interval_s: Optional[float] = None,
+        summary_key_name: str = "key",
+        max_keys: int = 10000,
+    ) -> None:
+        self.logger = logger
+        self.event = event
+        self.every_n = max(1, int(LOG_SAMPLE_EVERY_N if every_n is None else every_n))
+        self.rate_per_s = max(0.0, float(LOG_SAMPLE_RATE_PER_S if rate_per_s is None else rate_per_s))
+        self.burst = max(1.0, float(LOG_SAMPLE_BURST if burst is None else burst))
+        self.summary_interval_s = max(0.0, float(LOG_SUMMARY_INTERVAL_S if summary_interval_s is None else summary_interval_s))
+        self.summary_key_name = summary_key_name
+        self.max_keys = max(1, int(max_keys))
+
+        self._lock = threading.Lock()
+        self._seen: Dict[Hashable, int] = {}                 # sample key -> events (1-in-N)
+        self._buckets: Dict[Hashable, list] = {}             # sample key -> [tokens, last refill]
+        self._summaries: Dict[Hashable, _Summary] = {}
+        self._window_start = monotonic()
+
+    def _sampled(self, key: Hashable, now: float) -> bool:
+        # lock held
+        if len(self._seen) >= self.max_keys and key not in self._seen:
+            self._seen.clear()
+            self._buckets.clear()
+        n = self._seen.get(key, 0)
+        self._seen[key] = n + 1
+        if n % self.every_n:
+            return False
+        if not self.rate_per_s:
+            return True
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate_per_s)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+    def record(
+        self,
+        sample_key: Hashable = None,
+        summary_key: Hashable = None,
+        *,
+        duration_ms: Optional[int] = None,
+    ) -> bool:
+        """Count one event; True if its own log line should be written."""
+        now = monotonic()
+        with self._lock:
+            sampled = self._sampled(sample_key, now)
+            if self.summary_interval_s:
+                summary = self._summaries.get(summary_key)
+                if summary is None:
+                    summary = self._summaries[summary_key] = _Summary()
+                summary.count += 1
+                summary.logged += sampled
+                if duration_ms is not None:
+                    summary.durations[duration_ms] = summary.durations.get(duration_ms, 0) + 1
+            window = None
+            if self.summary_interval_s and now - self._window_start >= self.summary_interval_s:
+                window = self._close_window(now)
+
+        if window is not None:
+            self._log_summaries(*window)
+        return sampled
+
+    def flush(self) -> None:
+        """Emit the summaries of the current window and start a new one (e.g. on shutdown)."""
+        with self._lock:
+            window = self._close_window(monotonic())
+        self._log_summaries(*window)
+
+    def _close_window(self, now: float):
+        # lock held
+        summaries, self._summaries = self._summaries, {}
+        interval_s = now - self._window_start
+        self._window_start = now
+        return summaries, interval_s
+
+    def _log_summaries(self, summaries: Dict[Hashable, _Summary], interval_s: float) -> None:
+        for key, s in summaries.items():
+            total = sum(s.durations.values())
+            stats: Dict[str, Any] = {}
+            if total:
+                stats = {
+                    "p50_ms": _percentile(s.durations, total, 0.50),
+                    "p99_ms": _percentile(s.durations, total, 0.99),
+                    "max_ms": max(s.durations),
+                }
+            log_event(
+                self.logger, "INFO", f"{self.event}_summary",
+                count=s.count, logged=s.logged, interval_s=round(interval_s, 1),
+                **{self.summary_key_name: key}, **stats
+            )
@@ -1,10 +1,14 @@
 # common/logging_setup.py
+import atexit
 import os
 import sys
 import json
+import threading
+import weakref
+from collections import deque
 from datetime import datetime, timezone
 from time import perf_counter
-from typing import Any, Dict, Optional
+from typing import Any, Deque, Dict, Optional
 from loguru import logger as _logger
 
 # ---------- helpers ----------
@@ -18,11 +22,10 @@ def _utc_now_iso_ms() -> str:
 
 # ---------- JSON sink for Loguru ----------
 
-def _json_sink(message):
+def _payload(record) -> Dict[str, Any]:
     """
-    Convert each Loguru record to one JSON line (v0 style) and write to stdout.
+    Build the v0 JSON object of one Loguru record.
     """
-    record = message.record
     payload: Dict[str, Any] = {
         "timestamp": _utc_now_iso_ms(),
         "level": record["level"].name,
@@ -37,10 +40,170 @@ def _json_sink(message):
         if k in baseline or v in (None, ""):
             continue
         payload[k] = v
-    print(json.dumps(payload, ensure_ascii=False, default=str), file=sys.stdout)
+    return payload
+
+
+def _dumps(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _json_sink(message):
+    """
+    Convert each Loguru record to one JSON line (v0 style) and write to stdout.
+    """
+    print(_dumps(_payload(message.record)), file=sys.stdout)
+
+
+class QueuedJsonSink:
+    """
+    Non-blocking variant of `_json_sink` (LOG_SINK=queued).
+    - The calling thread only builds the payload dict and appends it to a bounded
+      queue; a background thread serialises and writes lines in batches (one
+      write + flush per batch instead of one print per line).
+    - Full queue (`max_size`): `drop_newest` (default) discards the new line,
+      `drop_oldest` discards the oldest queued one, `block` waits for space.
+      Dropped lines are counted and reported in a `log.dropped` line.
+    - Flushed at exit; a forked child (gunicorn worker) starts its own thread.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        *,
+        max_size: int = 10000,
+        drop_policy: str = "drop_newest",
+        batch_size: int = 256,
+        flush_interval_s: float = 0.1,
+    ) -> None:
+        if drop_policy not in ("drop_newest", "drop_oldest", "block"):
+            raise ValueError(f"unknown drop policy {drop_policy!r}")
+        self._stream = stream  # None: sys.stdout at write time
+        self.max_size = max(1, int(max_size))
+        self.drop_policy = drop_policy
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = max(0.001, float(flush_interval_s))
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._closed = False
+        self.dropped = 0
+        self._dropped_reported = 0
+
+        if hasattr(os, "register_at_fork"):
+            ref = weakref.ref(self)
+
+            def _reset_in_child():
+                sink = ref()
+                if sink is not None:
+                    sink._after_fork()
+
+            os.register_at_fork(after_in_child=_reset_in_child)
+
+    def _after_fork(self) -> None:
+        # Locks may have been held by the parent's writer thread, and the queued
+        # lines are the parent's to write: start clean, the thread follows on first use.
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._queue.clear()
+        self._thread = None
+        self._pid = None
+
+    # ---------- producer side (any thread) ----------
+
+    def __call__(self, message) -> None:
+        self.put(_payload(message.record))
+
+    def put(self, payload: Dict[str, Any]) -> None:
+        self._ensure_thread()
+        with self._cond:
+            if len(self._queue) >= self.max_size:
+                if self.drop_policy == "drop_newest":
+                    self.dropped += 1
+                    return
+                if self.drop_policy == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self.max_size and not self._closed:
+                        self._cond.notify_all()
+                        self._cond.wait(self.flush_interval_s)
+            self._queue.append(payload)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    # ---------- writer side ----------
+
+    def _ensure_thread(self) -> None:
+        if self._pid == os.getpid() or self._closed:
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def _take(self):
+        # lock held
+        n = min(len(self._queue), self.batch_size)
+        batch = [self._queue.popleft() for _ in range(n)]
+        self._cond.notify_all()  # wake producers waiting under `block`
+        return batch
+
+    def _write(self, batch) -> None:
+        lines = [_dumps(p) for p in batch]
+        dropped = self.dropped - self._dropped_reported
+        if dropped:
+            self._dropped_reported += dropped
+            lines.append(_dumps({
+                "timestamp": _utc_now_iso_ms(), "level": "WARNING", "service": None, "module": "logging_setup",
+                "message": "log.dropped", "dropped": dropped, "drop_policy": self.drop_policy,
+            }))
+        if not lines:
+            return
+        stream = self._stream or sys.stdout
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+        except Exception:
+            pass  # nowhere left to report a broken stdout
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._queue) < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_interval_s)
+                batch = self._take()
+                done = self._closed and not self._queue
+            with self._write_lock:
+                self._write(batch)
+            if done:
+                return
+
+    def flush(self) -> None:
+        """Write everything queued so far on the calling thread."""
+        while True:
+            with self._cond:
+                batch = self._take()
+            with self._write_lock:
+                self._write(batch)
+            if not batch:
+                return
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
+
 
 _LEVELS = {"DEBUG": "DEBUG", "INFO": "INFO", "WARNING": "WARNING", "ERROR": "ERROR", "CRITICAL": "CRITICAL"}
+_LEVEL_NO = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
 _sink_installed = False  # guard: install sink only once
+_min_level_no = 0        # events below the sink level are skipped in log_event
+_queued_sink: Optional[QueuedJsonSink] = None
 
 def _ensure_sink_installed(default_level: str):
     """
@@ -49,17 +212,31 @@ def _ensure_sink_installed(default_level: str):
     global _sink_installed
     if _sink_installed:
         return
+    global _min_level_no, _queued_sink
     level = os.getenv("LOG_LEVEL", default_level).upper()
     level = _LEVELS.get(level, "INFO")
 
+    # LOG_SINK=sync (default): print on the calling thread; queued: see QueuedJsonSink
+    sink = _json_sink
+    if os.getenv("LOG_SINK", "sync").lower() == "queued":
+        _queued_sink = QueuedJsonSink(
+            max_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            drop_policy=os.getenv("LOG_DROP_POLICY", "drop_newest").lower(),
+            batch_size=int(os.getenv("LOG_BATCH_SIZE", "256")),
+            flush_interval_s=float(os.getenv("LOG_FLUSH_INTERVAL_MS", "100")) / 1000,
+        )
+        atexit.register(_queued_sink.close)
+        sink = _queued_sink
+
     _logger.remove()  # remove any default handlers
     _logger.add(
-        _json_sink,
+        sink,
         level=level,        # single global threshold from env
         backtrace=False,
         diagnose=False,
         enqueue=False,
     )
+    _min_level_no = _LEVEL_NO[level]
     _sink_installed = True
 
 # ---------- public API ----------
@@ -75,10 +252,13 @@ def setup_logger(service: str, module: str, env: Optional[str] = None, level: st
 def log_event(logger, level: str, event: str, *, duration_ms: Optional[int] = None, **fields: Any) -> None:
     """
     Emit one structured log event (JSON).
+    Events below LOG_LEVEL return before any context is built.
     """
+    lvl = level.upper()
+    if _LEVEL_NO.get(lvl, 20) < _min_level_no:
+        return
     bound = logger.bind(event=event, duration_ms=duration_ms, **fields)
 
-    lvl = level.upper()
     if   lvl == "DEBUG":    bound.debug(event)
     elif lvl == "INFO":     bound.info(event)
     elif lvl == "WARNING":  bound.warning(event)
@@ -0,0 +1,50 @@
+# common/metrics.py
+"""
+Shared Prometheus helpers for the API and the MQTT ingester.
+
+- Metric objects are created with prometheus_client directly in the module that
+  owns them (e.g. `api/metrics.py`, `api/db/metrics.py`).
+- Multi-process servers (gunicorn) set PROMETHEUS_MULTIPROC_DIR before the app
+  is imported; every worker then writes its samples there and a scrape of any
+  worker returns the aggregate over all of them (see `render`).
+"""
+import os
+from time import perf_counter
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
+
+# seconds; request and query latencies from ~1 ms to 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition body and content type for a scrape of this process (or all workers)."""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class Stopwatch:
+    """perf_counter based timer returning seconds (the Prometheus base unit)."""
+
+    __slots__ = ("_t0",)
+
+    def __init__(self) -> None:
+        self._t0 = perf_counter()
+
+    def elapsed_s(self) -> float:
+        return perf_counter() - self._t0
@@ -0,0 +1,91 @@
+# common/schema.py
+"""
+Startup migrations for tables added after the first deployment.
+
+The db/*.sql scripts are docker-entrypoint-initdb.d scripts: they only run on an
+empty volume. Objects the code depends on that came later are created here,
+idempotently, by the first process (API or ingester) that talks to the database:
+
+- `devices` + `refresh_devices()` (same definition as db/devices.sql, keep both
+  in sync): the ingester's upsert maintains it and the API reads from it. When
+  the table is missing it is created and backfilled from sensor_data once.
+
+An advisory lock serializes concurrent starters (several API workers plus the
+ingester); once the table exists, the check is one catalog lookup.
+"""
+from typing import Any
+
+# any constant; only has to be unique among this database's advisory locks
+MIGRATION_LOCK_ID = 7_310_001
+
+DEVICES_EXISTS_SQL = "SELECT to_regclass('devices') IS NOT NULL"
+
+DEVICES_DDL = """
+CREATE TABLE IF NOT EXISTS devices (
+    device_id INT PRIMARY KEY,
+    first_seen TIMESTAMPTZ NOT NULL,
+    last_seen TIMESTAMPTZ NOT NULL,
+    row_count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION refresh_devices() RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO devices (device_id, first_seen, last_seen, row_count)
+    SELECT device_id, MIN(timestamp), MAX(timestamp), COUNT(*)
+    FROM sensor_data
+    GROUP BY device_id
+    ORDER BY device_id
+    ON CONFLICT (device_id)
+    DO UPDATE SET
+        first_seen = EXCLUDED.first_seen,
+        last_seen = EXCLUDED.last_seen,
+        row_count = EXCLUDED.row_count;
+
+    DELETE FROM devices d
+    WHERE NOT EXISTS (SELECT 1 FROM sensor_data s WHERE s.device_id = d.device_id);
+END;
+$$;
+
+SELECT refresh_devices();
+"""
+
+
+def ensure_schema(conn: Any) -> bool:
+    """
+    Create and backfill `devices` if it does not exist yet (psycopg2 connection).
+    Commits; returns True if this call created it. Errors are left to the caller
+    (the transaction is rolled back first).
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute(DEVICES_EXISTS_SQL)
+            if cur.fetchone()[0]:
+                conn.rollback()
+                return False
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            # another process may have finished it while we waited for the lock
+            cur.execute(DEVICES_EXISTS_SQL)
+            created = not cur.fetchone()[0]
+            if created:
+                cur.execute(DEVICES_DDL)
+        conn.commit()
+        return created
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+
+
+async def ensure_schema_async(conn: Any) -> bool:
+    """`ensure_schema` for an asyncpg connection."""
+    if await conn.fetchval(DEVICES_EXISTS_SQL):
+        return False
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK_ID)
+        if await conn.fetchval(DEVICES_EXISTS_SQL):
+            return False
+        await conn.execute(DEVICES_DDL)
+    return True
@@ -0,0 +1,78 @@
+"""
+Gunicorn settings for the API (`gunicorn -c gunicorn.conf.py wsgi:app`).
+
+- Threaded workers (gthread): handlers mostly wait on PostgreSQL, so a few
+  threads per process share one connection pool and one set of caches.
+- preload_app: the app is imported once in the master and forked; nothing in
+  `create_app` opens connections or starts threads, each worker does that in
+  `post_fork` (its own pool, LISTEN thread and caches).
+- max_requests (+ jitter) recycles workers so slow leaks cannot accumulate;
+  the jitter keeps all workers from restarting at the same moment.
+- Prometheus multi-process mode: workers write their samples to
+  PROMETHEUS_MULTIPROC_DIR (set and emptied here, before the app is imported);
+  the master serves all of them on API_METRICS_PORT (9102, 0 = off).
+
+Every value can be overridden with the GUNICORN_* environment variables below.
+"""
+import multiprocessing
+import os
+import shutil
+
+
+def _int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = _int("GUNICORN_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 8))
+worker_class = "gthread"
+threads = _int("GUNICORN_THREADS", 4)
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+max_requests = _int("GUNICORN_MAX_REQUESTS", 2000)
+max_requests_jitter = _int("GUNICORN_MAX_REQUESTS_JITTER", 200)
+timeout = _int("GUNICORN_TIMEOUT", 60)
+graceful_timeout = _int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _int("GUNICORN_KEEPALIVE", 5)
+
+# structured app logs already go to stdout; keep gunicorn's own logs there too
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+# before the (pre)loaded app imports prometheus_client; stale files from a previous run are dropped
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def when_ready(server):
+    # Prometheus scrapes the master on an internal port (not published); it reads every
+    # worker's samples from PROMETHEUS_MULTIPROC_DIR, including recycled workers' counters.
+    port = _int("API_METRICS_PORT", 9102)
+    if port > 0:
+        from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+        server.log.info("metrics on port %s", port)
+
+
+def post_fork(server, worker):
+    from api.db import init_worker
+
+    init_worker()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    from api.db import get_pool
+
+    pool = get_pool()
+    if pool is not None:
+        pool.close_all()
@@ -0,0 +1,320 @@
+"""
+asyncio entry point for the MQTT ingester (alternative to main_ingester.py).
+
+    python -u mqtt_client/async_ingester.py
+
+- One event loop consumes from every configured broker at once (aiomqtt) and
+  writes through an asyncpg connection pool; no threads involved.
+- Routing, validation and log events are the same as in the threaded ingester
+  (metric_map / resolve_metric, parse_payload + VALID_RANGES via validate_reading).
+- Accepted rows go into a bounded asyncio queue; writer tasks drain it in batches
+  (size/age limits) with one multi-row upsert per batch.
+- Both brokers deliver every reading; the shared DedupCache lets only the first
+  copy through.
+- aiomqtt acks QoS 1 messages on receipt, so delivery here is at-most-once across
+  a crash; use main_ingester.py with INGEST_WRITE_MODE=buffered when that matters.
+"""
+import asyncio
+import signal
+from datetime import timezone
+from typing import Any, List, Optional, Sequence, Tuple
+
+import aiomqtt
+import asyncpg
+
+from mqtt_client.mqtt_config import (
+    MQTT_BASE_TOPIC, QOS, MQTT_CLIENT_ID,
+    DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT,
+    INGEST_BATCH_SIZE, INGEST_BATCH_MAX_AGE_MS, INGEST_QUEUE_SIZE,
+    INGEST_ASYNC_DB_POOL_MIN, INGEST_ASYNC_DB_POOL_MAX,
+    INGEST_DEDUP_TTL_S, INGEST_DEDUP_MAX_ENTRIES, INGEST_STATS_INTERVAL_S, INGEST_METRICS_PORT,
+)
+from mqtt_client.main_ingester import resolve_metric, decode_payload, configured_brokers, topic_label
+from mqtt_client.handler import validate_reading, log_failure, _iso_utc, MSG_PROCESSED
+from mqtt_client.db_writer import merge_sensor_rows, UPSERT_TEMPLATE
+from mqtt_client.dedup import DedupCache, reading_key
+from mqtt_client.metrics import (
+    MESSAGES, RECONNECTS, DB_WRITE_SECONDS, observe_committed, start_metrics_server,
+)
+from common.logging_setup import setup_logger, log_event, DurationTimer
+from common.metrics import Stopwatch
+from common.exceptions import to_log_fields
+from common.schema import ensure_schema_async
+
+logger = setup_logger(service="ingester", module="async_ingester")
+
+# unnest() turns the column arrays into rows: one statement, one round trip per batch
+UPSERT_QUERY = UPSERT_TEMPLATE.format(
+    rows="SELECT * FROM unnest($1::int[], $2::timestamptz[], $3::float8[], $4::float8[], $5::int[], $6::int[])"
+)
+
+WRITE_RETRIES = 5
+RECONNECT_DELAY_S = 5.0
+
+_STOP = None
+
+
+async def write_batch(pool: Any, rows: Sequence[Sequence[Any]]) -> int:
+    """Upsert a batch of rows (SENSOR_COLUMNS order) in one statement; returns rows sent."""
+    merged = merge_sensor_rows(rows)
+    if not merged:
+        return 0
+    columns = list(zip(*merged))
+    watch = Stopwatch()
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute(UPSERT_QUERY, *[list(col) for col in columns])
+    except Exception:
+        DB_WRITE_SECONDS.labels("batch", "error").observe(watch.elapsed_s())
+        raise
+    DB_WRITE_SECONDS.labels("batch", "ok").observe(watch.elapsed_s())
+    observe_committed(columns[1])
+    return len(merged)
+
+
+class AsyncIngester:
+    """Consume from several brokers and write through an asyncpg pool in one event loop."""
+
+    def __init__(
+        self,
+        pool: Any,
+        *,
+        batch_size: int = 500,
+        batch_max_age_ms: int = 1000,
+        queue_size: int = 10000,
+        writers: int = 2,
+        dedup: Optional[DedupCache] = None,
+        stats_interval_s: float = 60.0,
+    ) -> None:
+        self.pool = pool
+        self.dedup = dedup
+        self.stats_interval_s = stats_interval_s
+        self.batch_size = max(1, int(batch_size))
+        self.batch_max_age_s = max(1, int(batch_max_age_ms)) / 1000.0
+        self.writers = max(1, int(writers))
+        self.queue: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue(maxsize=max(1, int(queue_size)))
+        self.stats = {"accepted": 0, "rows_written": 0, "rows_dropped": 0, "reconnects": 0}
+
+    # ---------- receive side ----------
+
+    async def handle_message(self, topic: str, payload: bytes) -> bool:
+        """Route, decode and validate one message; queue the row. Returns True if accepted."""
+        t = DurationTimer().start()
+        metric_name = resolve_metric(topic)
+        if not metric_name:
+            return False
+        payload_dict = decode_payload(topic, payload)
+        if payload_dict is None:
+            return False
+
+        key = reading_key(metric_name, payload_dict) if self.dedup is not None else None
+        if key is not None and not self.dedup.claim(key):
+            log_event(logger, "DEBUG", "duplicate_dropped", result="skipped", reason="duplicate", topic=topic)
+            MESSAGES.labels(topic, "duplicate").inc()
+            return False
+
+        try:
+            reading = validate_reading(metric_name, payload_dict)
+        except Exception as e:
+            if key is not None:
+                self.dedup.release(key)
+            log_failure(e, metric_name, topic, payload_dict, duration_ms=t.stop_ms())
+            return False
+
+        # asyncpg wants an aware timestamp; same instant psycopg2 gets from the naive local one
+        row = reading.row(timezone.utc)
+        # Bounded queue: waits here when writers fall behind (backpressure to the broker)
+        try:
+            await self.queue.put(row)
+        except BaseException:
+            if key is not None:
+                self.dedup.release(key)
+            raise
+        if key is not None:
+            self.dedup.done(key)
+        self.stats["accepted"] += 1
+        duration_ms = t.stop_ms()
+        if MSG_PROCESSED.record((reading.device_id, metric_name), metric_name, duration_ms=duration_ms):
+            log_event(
+                logger, "INFO", "msg_processed",
+                duration_ms=duration_ms, result="ok", device_id=reading.device_id, metric=metric_name,
+                msg_ts=_iso_utc(reading.timestamp()), topic=topic, buffered=True
+            )
+        MESSAGES.labels(topic, "ok").inc()
+        return True
+
+    async def _handle_guarded(self, topic: str, payload: bytes) -> bool:
+        """handle_message that never raises: one bad message must not end the consumer."""
+        try:
+            return await self.handle_message(topic, payload)
+        except Exception as e:
+            log_event(
+                logger, "ERROR", "unhandled_exception",
+                result="failed", reason="unexpected", topic=topic, **to_log_fields(e)
+            )
+            MESSAGES.labels(topic_label(topic), "failed").inc()
+            return False
+
+    async def consume(self, broker: str, port: int) -> None:
+        """Subscribe to one broker and keep reconnecting until cancelled."""
+        while True:
+            try:
+                async with aiomqtt.Client(
+                    broker, port,
+                    identifier=MQTT_CLIENT_ID or None,
+                    clean_session=not MQTT_CLIENT_ID,
+                    keepalive=60,
+                ) as client:
+                    log_event(logger, "INFO", "mqtt_connected", result="ok", broker=f"{broker}:{port}")
+                    await client.subscribe(f"{MQTT_BASE_TOPIC}/+/+", qos=QOS)
+                    async for message in client.messages:
+                        await self._handle_guarded(str(message.topic), bytes(message.payload))
+            except aiomqtt.MqttError as e:
+                self.stats["reconnects"] += 1
+                RECONNECTS.labels("mqtt").inc()
+                log_event(
+                    logger, "WARNING", "mqtt_disconnected",
+                    reason="unexpected", broker=f"{broker}:{port}", retry_in_s=RECONNECT_DELAY_S,
+                    **to_log_fields(e)
+                )
+                await asyncio.sleep(RECONNECT_DELAY_S)
+
+    # ---------- write side ----------
+
+    async def _next_batch(self) -> Tuple[List[tuple], bool]:
+        """Collect up to batch_size rows or until batch_max_age elapsed; (rows, stop_seen)."""
+        loop = asyncio.get_running_loop()
+        first = await self.queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = loop.time() + self.batch_max_age_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                row = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if row is _STOP:
+                return batch, True
+            batch.append(row)
+        return batch, False
+
+    async def _write_with_retry(self, batch: List[tuple]) -> None:
+        t = DurationTimer().start()
+        delay = 0.5
+        for attempt in range(1, WRITE_RETRIES + 1):
+            try:
+                written = await write_batch(self.pool, batch)
+                self.stats["rows_written"] += written
+                log_event(
+                    logger, "INFO", "batch_flushed",
+                    duration_ms=t.stop_ms(), result="ok", rows=len(batch), rows_written=written
+                )
+                return
+            except Exception as e:
+                log_event(
+                    logger, "ERROR", "db_write_failed",
+                    duration_ms=t.stop_ms(), result="failed", reason="db_error",
+                    rows=len(batch), attempt=attempt, **to_log_fields(e)
+                )
+                if attempt < WRITE_RETRIES:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+        self.stats["rows_dropped"] += len(batch)
+        log_event(logger, "ERROR", "batch_dropped", result="failed", reason="retries_exhausted", rows=len(batch))
+
+    async def writer(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = await self._next_batch()
+            if batch:
+                await self._write_with_retry(batch)
+
+    # ---------- lifecycle ----------
+
+    async def report_stats(self) -> None:
+        while True:
+            await asyncio.sleep(self.stats_interval_s)
+            log_event(logger, "INFO", "ingester_stats", queue_depth=self.queue.qsize(), **self.stats)
+            if self.dedup is not None:
+                self.dedup.log_stats()
+
+    async def run(self, brokers: Sequence[Tuple[str, int]], stop_event: asyncio.Event) -> None:
+        writers = [asyncio.create_task(self.writer()) for _ in range(self.writers)]
+        consumers = [asyncio.create_task(self.consume(b, p)) for b, p in brokers]
+        if self.stats_interval_s:
+            consumers.append(asyncio.create_task(self.report_stats()))
+        log_event(
+            logger, "INFO", "ingester_start",
+            brokers=[f"{b}:{p}" for b, p in brokers], writers=self.writers, queue_size=self.queue.maxsize
+        )
+
+        await stop_event.wait()
+        log_event(logger, "INFO", "shutdown_requested")
+
+        # Stop receiving, then let the writers drain what is already queued
+        for task in consumers:
+            task.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+        for _ in writers:
+            await self.queue.put(_STOP)
+        await asyncio.gather(*writers, return_exceptions=True)
+        log_event(logger, "INFO", "ingester_stopped", **self.stats)
+        MSG_PROCESSED.flush()
+        if self.dedup is not None:
+            self.dedup.log_stats()
+
+
+async def main() -> None:
+    start_metrics_server(INGEST_METRICS_PORT)
+    try:
+        pool = await asyncpg.create_pool(
+            host=DB_HOST, port=DB_PORT, database=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+            min_size=INGEST_ASYNC_DB_POOL_MIN, max_size=INGEST_ASYNC_DB_POOL_MAX,
+        )
+    except Exception as e:
+        log_event(
+            logger, "CRITICAL", "ingester_exit", reason="db_unavailable",
+            host=DB_HOST, db=DB_NAME, **to_log_fields(e)
+        )
+        raise SystemExit(1)
+    try:
+        async with pool.acquire() as conn:
+            if await ensure_schema_async(conn):
+                log_event(logger, "INFO", "db_migrated", result="ok", table="devices")
+    except Exception as e:
+        log_event(
+            logger, "CRITICAL", "ingester_exit", reason="migration_error",
+            host=DB_HOST, db=DB_NAME, **to_log_fields(e)
+        )
+        await pool.close()
+        raise SystemExit(1)
+    log_event(logger, "INFO", "db_connected", result="ok", host=DB_HOST, db=DB_NAME, pool_max=INGEST_ASYNC_DB_POOL_MAX)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    ingester = AsyncIngester(
+        pool,
+        batch_size=INGEST_BATCH_SIZE,
+        batch_max_age_ms=INGEST_BATCH_MAX_AGE_MS,
+        queue_size=INGEST_QUEUE_SIZE,
+        writers=INGEST_ASYNC_DB_POOL_MAX,
+        dedup=DedupCache(ttl_s=INGEST_DEDUP_TTL_S, max_entries=INGEST_DEDUP_MAX_ENTRIES)
+        if INGEST_DEDUP_TTL_S > 0 else None,
+        stats_interval_s=INGEST_STATS_INTERVAL_S,
+    )
+    try:
+        await ingester.run(configured_brokers(), stop_event)
+    finally:
+        await pool.close()
+        log_event(logger, "INFO", "db_connection_closed", result="ok")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,175 @@
+"""
+Validation and normalisation of many readings at once (NumPy).
+
+Same rules as `handler.validate_reading`, applied to a whole batch:
+- One Python pass only pulls device_id / timestamp / value out of the payload
+  dicts; the range, type and integer checks run on arrays.
+- Nothing is raised per row: every input row gets a reject reason (or None),
+  using the `reason` labels of ingester_validation_rejects_total.
+- Accepted rows come back as typed columns (`columns()`: masked arrays, ready
+  for a bulk COPY), as SENSOR_COLUMNS tuples for `insert_sensor_data_batch` (`rows()`)
+  or as `Reading`s for the writer chain (`readings()`).
+
+Used by the pipeline workers (`main_ingester.dispatch_batch`).
+
+Difference to the per-message path: device_id must be an integer (or an integer
+string) within the INT range of the column; the single-row path leaves that to the DB.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mqtt_client.db_writer import SensorRow
+from mqtt_client.handler import VALID_RANGES, INTEGER_METRICS
+# Same metric codes as `Reading.metric`; they index these arrays, -1 = unknown metric.
+from mqtt_client.reading import Reading, METRICS, METRIC_CODES, TS_EPOCH_MIN as _TS_MIN, TS_EPOCH_MAX as _TS_MAX
+
+_LOW = np.array([VALID_RANGES[m][0] for m in METRICS], dtype=np.float64)
+_HIGH = np.array([VALID_RANGES[m][1] for m in METRICS], dtype=np.float64)
+_IS_INTEGER = np.array([m in INTEGER_METRICS for m in METRICS], dtype=bool)
+_DTYPES = {m: np.int32 if m in INTEGER_METRICS else np.float64 for m in METRICS}
+
+# Reject reasons, in the order the per-message path would hit them (0 = accepted).
+REJECT_REASONS = (None, "payload_invalid", "unknown_metric", "non_numeric", "out_of_range")
+_PAYLOAD_INVALID, _UNKNOWN_METRIC, _NON_NUMERIC, _OUT_OF_RANGE = 1, 2, 3, 4
+
+_INT32_MIN, _INT32_MAX = -(2 ** 31), 2 ** 31 - 1
+
+
+class ValidatedBatch:
+    """Accepted readings as arrays (input order) plus a reject reason per input row."""
+
+    __slots__ = ("index", "device_id", "timestamp_s", "metric", "value", "reasons")
+
+    def __init__(self, index, device_id, timestamp_s, metric, value, reasons) -> None:
+        self.index = index              # int64: input position of each accepted row
+        self.device_id = device_id      # int32
+        self.timestamp_s = timestamp_s  # int64 epoch seconds
+        self.metric = metric            # int8 code into METRICS
+        self.value = value              # float64, already range/type checked
+        self.reasons: List[Optional[str]] = reasons  # one entry per input row
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def rejected(self) -> List[Tuple[int, str]]:
+        """(input position, reason) of every rejected row."""
+        return [(i, reason) for i, reason in enumerate(self.reasons) if reason is not None]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        SENSOR_COLUMNS as arrays, one entry per accepted row: `device_id` (int32),
+        `timestamp_s` (int64) and one masked array per metric (masked = NULL),
+        float64 for temperature/humidity, int32 for pollen/particulate_matter.
+        """
+        cols: Dict[str, np.ndarray] = {"device_id": self.device_id, "timestamp_s": self.timestamp_s}
+        for code, name in enumerate(METRICS):
+            present = self.metric == code
+            cols[name] = np.ma.masked_array(
+                np.where(present, self.value, 0).astype(_DTYPES[name]), mask=~present
+            )
+        return cols
+
+    def readings(self) -> List[Reading]:
+        """Accepted rows as `Reading`s (value normalised like `validate_reading`)."""
+        return [
+            Reading(device_id, ts, code, int(value) if _IS_INTEGER[code] else value)
+            for device_id, ts, code, value in zip(
+                self.device_id.tolist(), self.timestamp_s.tolist(), self.metric.tolist(), self.value.tolist()
+            )
+        ]
+
+    def rows(self) -> List[SensorRow]:
+        """Row tuples as `Reading.row()` builds them for the per-message path."""
+        out: List[SensorRow] = []
+        stamps: Dict[int, datetime] = {}  # readings of one batch share few distinct seconds
+        for device_id, ts, code, value in zip(
+            self.device_id.tolist(), self.timestamp_s.tolist(), self.metric.tolist(), self.value.tolist()
+        ):
+            stamp = stamps.get(ts)
+            if stamp is None:
+                stamp = stamps[ts] = datetime.fromtimestamp(ts)
+            row: List[Any] = [device_id, stamp, None, None, None, None]
+            row[2 + code] = int(value) if _IS_INTEGER[code] else value
+            out.append(tuple(row))
+        return out
+
+
+def validate_batch(readings: Sequence[Tuple[str, Dict[str, Any]]]) -> ValidatedBatch:
+    """Validate `(metric_name, payload_dict)` pairs; never raises for bad rows."""
+    n = len(readings)
+    reject = np.zeros(n, dtype=np.int8)
+    device_ids: List[int] = [0] * n
+    timestamps: List[int] = [0] * n
+    codes: List[int] = [-1] * n
+    values: List[float] = [np.nan] * n
+    numeric = np.zeros(n, dtype=bool)
+
+    # 1) Extraction into plain lists: the only per-row Python work
+    for i, (metric_name, payload) in enumerate(readings):
+        try:
+            raw_value = payload.get("value")
+            raw_ts = payload.get("timestamp")
+            raw_device = payload.get("meta", {}).get("device_id")
+            if raw_value is None or raw_ts is None or raw_device is None:
+                raise ValueError("missing required fields")
+            ts = int(raw_ts)
+            device = int(raw_device)
+        except (AttributeError, TypeError, ValueError, OverflowError):
+            reject[i] = _PAYLOAD_INVALID
+            continue
+        # out-of-range ids/timestamps are rejected below; clamp so the int64 arrays can hold them
+        timestamps[i] = min(max(ts, _TS_MIN - 1), _TS_MAX + 1)
+        device_ids[i] = min(max(device, _INT32_MIN - 1), _INT32_MAX + 1)
+        codes[i] = METRIC_CODES.get(metric_name, -1)
+        if isinstance(raw_value, (int, float)):
+            numeric[i] = True
+            try:
+                values[i] = float(raw_value)
+            except OverflowError:
+                values[i] = np.inf  # huge int: out of range below
+
+    device_id = np.array(device_ids, dtype=np.int64)
+    timestamp_s = np.array(timestamps, dtype=np.int64)
+    metric = np.array(codes, dtype=np.int8)
+    value = np.array(values, dtype=np.float64)
+
+    # 2) Checks on arrays, in the per-message order; the first failing check wins
+    ok = reject == 0
+    bad = ok & (
+        (timestamp_s < _TS_MIN) | (timestamp_s > _TS_MAX)
+        | (device_id < _INT32_MIN) | (device_id > _INT32_MAX)
+    )
+    reject[bad] = _PAYLOAD_INVALID
+    ok &= ~bad
+
+    bad = ok & (metric < 0)
+    reject[bad] = _UNKNOWN_METRIC
+    ok &= ~bad
+
+    bad = ok & ~numeric
+    reject[bad] = _NON_NUMERIC
+    ok &= ~bad
+
+    code = np.where(metric < 0, 0, metric)
+    with np.errstate(invalid="ignore"):
+        in_range = (value >= _LOW[code]) & (value <= _HIGH[code])  # NaN compares False
+    bad = ok & ~in_range
+    reject[bad] = _OUT_OF_RANGE
+    ok &= ~bad
+
+    # pollen / particulate_matter: 12.0 is fine, 12.3 is not
+    bad = ok & _IS_INTEGER[code] & (value != np.floor(value))
+    reject[bad] = _PAYLOAD_INVALID
+    ok &= ~bad
+
+    index = np.flatnonzero(ok)
+    return ValidatedBatch(
+        index=index,
+        device_id=device_id[index].astype(np.int32),
+        timestamp_s=timestamp_s[index],
+        metric=metric[index],
+        value=value[index],
+        reasons=[REJECT_REASONS[r] for r in reject.tolist()],
+    )
@@ -0,0 +1,233 @@
+import threading
+from time import monotonic
+from typing import Any, Callable, List, Optional, Tuple
+
+from mqtt_client.db_writer import insert_sensor_data_batch
+from mqtt_client.metrics import RECONNECTS
+from mqtt_client.reading import Reading
+from common.logging_setup import setup_logger, log_event, DurationTimer
+from common.exceptions import (
+    DatabaseConnectionError,
+    DatabaseTimeoutError,
+    to_log_fields,
+)
+
+logger = setup_logger(service="ingester", module="buffered_writer")
+
+# (row tuple in SENSOR_COLUMNS order, optional ack callback)
+PendingEntry = Tuple[tuple, Optional[Callable[[], Any]]]
+
+
+class BufferedWriter:
+    """
+    Collect validated rows in memory and write them as one multi-row upsert.
+    - Flushes when `max_rows` rows are pending or the oldest row is `max_age_ms` old.
+      Both are done by the flusher thread (`start()`): `add()` only signals it, so
+      the MQTT network thread never waits for the database.
+    - At-least-once: `ack` callbacks run only after the batch is committed. A failed
+      batch stays in the buffer and is retried; replays are harmless because the
+      upsert is idempotent.
+    - Thread-safe: rows are added from the MQTT thread while the flusher thread writes.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        *,
+        conn: Any = None,
+        max_rows: int = 500,
+        max_age_ms: int = 1000,
+        max_buffer_rows: int = 50000,
+    ) -> None:
+        self._connect = connect
+        self._conn = conn
+        self.max_rows = max(1, int(max_rows))
+        self.max_age_s = max(1, int(max_age_ms)) / 1000.0
+        self.max_buffer_rows = max(self.max_rows, int(max_buffer_rows))
+
+        self._pending: List[PendingEntry] = []
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()        # guards the buffer
+        self._wake = threading.Condition(self._lock)  # size limit reached / stopping
+        self._retry_after = 0.0  # no size-triggered flush before this (backoff after a failure)
+        self._flush_lock = threading.Lock()  # one flush at a time; owns the connection
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {
+            "rows_added": 0,
+            "rows_flushed": 0,
+            "rows_dropped": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+        }
+
+    # ---------- producer side ----------
+
+    def add(
+        self,
+        device_id: int,
+        timestamp: Any,
+        *,
+        ack: Optional[Callable[[], Any]] = None,
+        temperature: Optional[float] = None,
+        humidity: Optional[float] = None,
+        pollen: Optional[int] = None,
+        particulate_matter: Optional[int] = None,
+    ) -> None:
+        """Queue one row; wakes the flusher once the size limit is reached."""
+        self._append((device_id, timestamp, temperature, humidity, pollen, particulate_matter), ack)
+
+    def add_reading(self, reading: Reading, *, ack: Optional[Callable[[], Any]] = None) -> None:
+        """Queue one validated `Reading` (other metric columns NULL)."""
+        self._append(reading.row(), ack)
+
+    def _append(self, row: tuple, ack: Optional[Callable[[], Any]]) -> None:
+        with self._lock:
+            if not self._pending:
+                self._oldest = monotonic()
+            self._pending.append((row, ack))
+            self.stats["rows_added"] += 1
+            if self._size_due():
+                self._wake.notify()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # ---------- flushing ----------
+
+    def _size_due(self) -> bool:
+        # lock held
+        return len(self._pending) >= self.max_rows and monotonic() >= self._retry_after
+
+    def flush_if_due(self) -> int:
+        """Flush when the size limit is reached or the oldest pending row exceeded the age limit."""
+        with self._lock:
+            if self._size_due():
+                reason = "size"
+            elif self._oldest is not None and monotonic() - self._oldest >= self.max_age_s:
+                reason = "age"
+            else:
+                return 0
+        return self.flush(reason=reason)
+
+    def flush(self, reason: str = "manual") -> int:
+        """
+        Write all pending rows in one transaction.
+        Returns the number of rows written (0 on failure; rows are kept for retry).
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._oldest = None
+            if not batch:
+                return 0
+
+            t = DurationTimer().start()
+            try:
+                conn = self._ensure_connection()
+                written = insert_sensor_data_batch(conn, [row for row, _ in batch])
+            except Exception as e:
+                self.stats["flush_failures"] += 1
+                self._requeue(batch)
+                if isinstance(e, DatabaseTimeoutError):
+                    fail_reason = "timeout"
+                elif isinstance(e, DatabaseConnectionError):
+                    fail_reason = "db_unavailable"
+                else:
+                    fail_reason = "db_error"
+                log_event(
+                    logger, "ERROR", "db_write_failed",
+                    duration_ms=t.stop_ms(), result="failed", reason=fail_reason,
+                    rows=len(batch), flush_reason=reason, **to_log_fields(e)
+                )
+                return 0
+
+            # Commit succeeded → acknowledge the messages behind these rows
+            for _, ack in batch:
+                if ack is None:
+                    continue
+                try:
+                    ack()
+                except Exception as e:
+                    log_event(logger, "WARNING", "mqtt_ack_failed", result="failed", **to_log_fields(e))
+
+            self.stats["flushes"] += 1
+            self.stats["rows_flushed"] += len(batch)
+            log_event(
+                logger, "INFO", "batch_flushed",
+                duration_ms=t.stop_ms(), result="ok",
+                rows=len(batch), rows_written=written, flush_reason=reason
+            )
+            return written
+
+    def _ensure_connection(self) -> Any:
+        if self._conn is None or getattr(self._conn, "closed", True):
+            if self._conn is not None:
+                RECONNECTS.labels("db").inc()
+            self._conn = self._connect()
+        if self._conn is None or getattr(self._conn, "closed", True):
+            raise DatabaseConnectionError("database unavailable", details={"op": "flush"})
+        return self._conn
+
+    def _requeue(self, batch: List[PendingEntry]) -> None:
+        """Put a failed batch back in front; drop the oldest rows beyond the hard limit."""
+        with self._lock:
+            self._pending = batch + self._pending
+            overflow = len(self._pending) - self.max_buffer_rows
+            if overflow > 0:
+                # Dropped rows are never acked, so a persistent session can still replay them.
+                del self._pending[:overflow]
+                self.stats["rows_dropped"] += overflow
+            # Restart the age clock so the retry waits one interval (natural backoff)
+            self._oldest = monotonic() if self._pending else None
+            self._retry_after = monotonic() + self.max_age_s
+
+        if overflow > 0:
+            log_event(
+                logger, "ERROR", "buffer_overflow",
+                result="failed", reason="buffer_full",
+                rows_dropped=overflow, buffer_max_rows=self.max_buffer_rows
+            )
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> "BufferedWriter":
+        """Start the background thread that enforces the size and age limits."""
+        if self._thread is None:
+            interval = max(0.05, self.max_age_s / 2)
+
+            def _run():
+                while True:
+                    with self._wake:
+                        self._wake.wait_for(lambda: self._stop.is_set() or self._size_due(), timeout=interval)
+                    if self._stop.is_set():
+                        return
+                    self.flush_if_due()
+
+            self._thread = threading.Thread(target=_run, name="buffered-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the flusher, write what is left and close the connection."""
+        self._stop.set()
+        with self._wake:
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=max(1.0, self.max_age_s * 2))
+            self._thread = None
+
+        self.flush(reason="shutdown")
+        left = self.pending
+        log_event(
+            logger, "INFO" if left == 0 else "ERROR", "buffer_closed",
+            result="ok" if left == 0 else "failed", rows_pending=left, **self.stats
+        )
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,188 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from mqtt_client.db_writer import METRIC_COLUMNS
+from mqtt_client.reading import Reading
+from common.logging_setup import setup_logger, log_event, DurationTimer
+from common.exceptions import to_log_fields
+
+logger = setup_logger(service="ingester", module="coalescer")
+
+
+class _PendingRow:
+    __slots__ = ("first_seen", "fields", "acks")
+
+    def __init__(self, first_seen: float) -> None:
+        self.first_seen = first_seen
+        self.fields: Dict[str, Any] = {}
+        self.acks: List[Callable[[], Any]] = []
+
+
+def _chain_acks(acks: List[Callable[[], Any]]) -> Optional[Callable[[], Any]]:
+    if not acks:
+        return None
+    if len(acks) == 1:
+        return acks[0]
+
+    def _ack_all():
+        for ack in acks:
+            ack()
+    return _ack_all
+
+
+class ReadingCoalescer:
+    """
+    Merge per-metric readings of one (device_id, timestamp) into a single row.
+    - Every metric arrives on its own topic; without merging each reading is a
+      separate upsert of the same row.
+    - A row is passed downstream once all metric columns are set or `window_ms`
+      after its first metric arrived, whichever comes first.
+    - Same `add()` interface as BufferedWriter, so the handler does not care
+      which one it talks to. Acks of merged readings travel with the row.
+    """
+
+    def __init__(
+        self,
+        downstream: Any,
+        *,
+        window_ms: int = 2000,
+        max_keys: int = 10000,
+        stats_interval_s: float = 60.0,
+    ) -> None:
+        self.downstream = downstream
+        self.window_s = max(1, int(window_ms)) / 1000.0
+        self.max_keys = max(1, int(max_keys))
+        self.stats_interval_s = stats_interval_s
+
+        self._rows: "OrderedDict[Tuple[Any, Any], _PendingRow]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {
+            "readings_in": 0,
+            "rows_out": 0,
+            "upserts_saved": 0,
+            "rows_complete": 0,
+            "rows_expired": 0,
+            "rows_evicted": 0,
+        }
+
+    # ---------- producer side ----------
+
+    def add(self, device_id: int, timestamp: Any, *, ack: Optional[Callable[[], Any]] = None, **fields: Any) -> None:
+        self._add(device_id, timestamp, ack, fields.items())
+
+    def add_reading(self, reading: Reading, *, ack: Optional[Callable[[], Any]] = None) -> None:
+        self._add(reading.device_id, reading.timestamp(), ack, ((reading.metric_name, reading.value),))
+
+    def _add(self, device_id: int, timestamp: Any, ack: Optional[Callable[[], Any]], fields: Iterable[Tuple[str, Any]]) -> None:
+        key = (device_id, timestamp)
+        ready: List[Tuple[Tuple[Any, Any], _PendingRow]] = []
+        with self._lock:
+            self.stats["readings_in"] += 1
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = _PendingRow(monotonic())
+            else:
+                # This reading rides along with an already pending row: one upsert less.
+                self.stats["upserts_saved"] += 1
+            for column, value in fields:
+                if value is not None:
+                    row.fields[column] = value
+            if ack is not None:
+                row.acks.append(ack)
+
+            if all(c in row.fields for c in METRIC_COLUMNS):
+                ready.append((key, self._rows.pop(key)))
+                self.stats["rows_complete"] += 1
+
+            while len(self._rows) > self.max_keys:
+                ready.append(self._rows.popitem(last=False))
+                self.stats["rows_evicted"] += 1
+
+        self._emit(ready)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    # ---------- emitting ----------
+
+    def flush_expired(self) -> int:
+        """Pass rows older than the window downstream; returns how many were emitted."""
+        now = monotonic()
+        ready: List[Tuple[Tuple[Any, Any], _PendingRow]] = []
+        with self._lock:
+            # Insertion order == age order, so stop at the first row still inside the window
+            while self._rows:
+                key, row = next(iter(self._rows.items()))
+                if now - row.first_seen < self.window_s:
+                    break
+                ready.append((key, self._rows.pop(key)))
+            self.stats["rows_expired"] += len(ready)
+        self._emit(ready)
+        return len(ready)
+
+    def flush_all(self) -> int:
+        with self._lock:
+            ready = list(self._rows.items())
+            self._rows.clear()
+        self._emit(ready)
+        return len(ready)
+
+    def _emit(self, ready: List[Tuple[Tuple[Any, Any], _PendingRow]]) -> None:
+        # Called without holding the lock: downstream may flush synchronously.
+        # Only the counter update takes it, since add() runs on several threads.
+        for (device_id, timestamp), row in ready:
+            try:
+                self.downstream.add(device_id, timestamp, ack=_chain_acks(row.acks), **row.fields)
+                with self._lock:
+                    self.stats["rows_out"] += 1
+            except Exception as e:
+                log_event(
+                    logger, "ERROR", "unhandled_exception",
+                    result="failed", reason="unexpected", device_id=device_id, **to_log_fields(e)
+                )
+
+    def log_stats(self) -> None:
+        with self._lock:
+            snapshot = dict(self.stats)
+            pending = len(self._rows)
+        readings = snapshot["readings_in"]
+        log_event(
+            logger, "INFO", "coalescer_stats",
+            rows_pending=pending,
+            saved_ratio=round(snapshot["upserts_saved"] / readings, 3) if readings else 0.0,
+            **snapshot
+        )
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> "ReadingCoalescer":
+        if self._thread is None:
+            interval = max(0.05, self.window_s / 2)
+
+            def _run():
+                last_stats = DurationTimer().start()
+                while not self._stop.wait(interval):
+                    self.flush_expired()
+                    if self.stats_interval_s and last_stats.stop_ms() >= self.stats_interval_s * 1000:
+                        self.log_stats()
+                        last_stats.start()
+
+            self._thread = threading.Thread(target=_run, name="reading-coalescer", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the timer thread and hand every pending row downstream (downstream stays open)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(1.0, self.window_s * 2))
+            self._thread = None
+        self.flush_all()
+        self.log_stats()
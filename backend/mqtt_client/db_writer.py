@@ -1,75 +1,199 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
 from common.exceptions import (
     DatabaseError,
     DatabaseTimeoutError,
     DatabaseConnectionError,
 )
+from common.metrics import Stopwatch
+from mqtt_client.metrics import DB_WRITE_SECONDS, observe_committed
+
+# Column order shared by the single-row and the batch writer.
+SENSOR_COLUMNS = ("device_id", "timestamp", "temperature", "humidity", "pollen", "particulate_matter")
+METRIC_COLUMNS = SENSOR_COLUMNS[2:]
+
+SensorRow = Tuple[int, Any, Optional[float], Optional[float], Optional[int], Optional[int]]
+
+# The API LISTENs here to keep its caches current.
+# Payload "<device_id>:<first_ts>:<last_ts>": epoch seconds of the rows just written.
+NOTIFY_CHANNEL = "sensor_data_written"
+
+# One statement per write:
+# - upsert the rows into sensor_data,
+# - keep the `devices` summary (first_seen, last_seen, row_count) in step,
+# - NOTIFY once per written device (delivered on commit only).
+# New rows are those the INSERT created: `xmax = 0` in RETURNING is false for rows
+# taken over by ON CONFLICT DO UPDATE, also when a concurrent writer inserted the
+# same key first (the upsert waits for it and updates), so each row counts once.
+# `{rows}` is a VALUES list or a SELECT producing SENSOR_COLUMNS.
+UPSERT_TEMPLATE = """
+WITH incoming (device_id, timestamp, temperature, humidity, pollen, particulate_matter) AS (
+    {rows}
+),
+written AS (
+    INSERT INTO sensor_data (device_id, timestamp, temperature, humidity, pollen, particulate_matter)
+    SELECT device_id::int, timestamp::timestamptz, temperature::numeric, humidity::numeric, pollen::int, particulate_matter::int
+    FROM incoming
+    ON CONFLICT (device_id, timestamp)
+    DO UPDATE SET
+        temperature = COALESCE(EXCLUDED.temperature, sensor_data.temperature),
+        humidity = COALESCE(EXCLUDED.humidity, sensor_data.humidity),
+        pollen = COALESCE(EXCLUDED.pollen, sensor_data.pollen),
+        particulate_matter = COALESCE(EXCLUDED.particulate_matter, sensor_data.particulate_matter)
+    RETURNING device_id, timestamp, (xmax = 0) AS inserted
+),
+summary AS (
+    SELECT device_id,
+    MIN(timestamp) AS first_seen,
+    MAX(timestamp) AS last_seen,
+    COUNT(*) FILTER (WHERE inserted) AS new_rows
+    FROM written
+    GROUP BY device_id
+),
+device_summary AS (
+    INSERT INTO devices (device_id, first_seen, last_seen, row_count)
+    SELECT device_id, first_seen, last_seen, new_rows FROM summary
+    ORDER BY device_id
+    ON CONFLICT (device_id)
+    DO UPDATE SET
+        first_seen = LEAST(devices.first_seen, EXCLUDED.first_seen),
+        last_seen = GREATEST(devices.last_seen, EXCLUDED.last_seen),
+        row_count = devices.row_count + EXCLUDED.row_count
+)
+SELECT pg_notify(
+    '""" + NOTIFY_CHANNEL + """',
+    device_id || ':' || EXTRACT(EPOCH FROM first_seen AT TIME ZONE 'UTC')::BIGINT
+              || ':' || EXTRACT(EPOCH FROM last_seen AT TIME ZONE 'UTC')::BIGINT
+)
+FROM summary;
+"""
+
+
+SINGLE_ROW_UPSERT = UPSERT_TEMPLATE.format(rows="VALUES (%s, %s, %s, %s, %s, %s)")
+
+
+def _rollback_quietly(conn: Any) -> None:
+    try:
+        conn.rollback()
+    except Exception:
+        pass
+
+
+def _map_write_error(e: Exception) -> DatabaseError:
+    """Very light classification without driver-specific imports."""
+    msg = str(e).lower()
+    if "timeout" in msg or "timed out" in msg:
+        return DatabaseTimeoutError("database write timeout")
+    if "connect" in msg or "could not connect" in msg:
+        return DatabaseConnectionError("database connection error")
+    return DatabaseError("database write failed")
+
+
+def _write_outcome(error: DatabaseError) -> str:
+    if isinstance(error, DatabaseTimeoutError):
+        return "timeout"
+    if isinstance(error, DatabaseConnectionError):
+        return "connection_error"
+    return "error"
+
+
+def insert_sensor_row(conn: Any, row: Sequence[Any]) -> None:
+    """
+    Upsert one row (SENSOR_COLUMNS order, NULL for missing metrics) and commit.
+    - No logging here (logging is done by the caller).
+    - On failure: rollback and raise a domain-specific exception.
+    """
+    cursor = conn.cursor()
+    watch = Stopwatch()
+    try:
+        cursor.execute(SINGLE_ROW_UPSERT, row)
+        conn.commit()
+        DB_WRITE_SECONDS.labels("single", "ok").observe(watch.elapsed_s())
+        observe_committed((row[1],))
+
+    except Exception as e:
+        # Keep DB consistent
+        _rollback_quietly(conn)
+        error = _map_write_error(e)
+        DB_WRITE_SECONDS.labels("single", _write_outcome(error)).observe(watch.elapsed_s())
+        raise error from e
+
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
 
 def insert_sensor_data(
     conn: Any,
     device_id: int,
-    timestamp: Any,  
+    timestamp: Any,
     *,
     temperature: Optional[float] = None,
     humidity: Optional[float] = None,
     pollen: Optional[int] = None,
     particulate_matter: Optional[int] = None,
-) -> Dict[str, Any]:
+) -> None:
+    """Insert a row into sensor_data, allowing NULL values for missing metrics (see insert_sensor_row)."""
+    insert_sensor_row(conn, (device_id, timestamp, temperature, humidity, pollen, particulate_matter))
+
+
+def merge_sensor_rows(rows: Iterable[Sequence[Any]]) -> List[SensorRow]:
     """
-    Insert a row into sensor_data, allowing NULL values for missing metrics.
-    - No logging here (logging is done by the caller).
-    - On failure: rollback and raise a domain-specific exception.
-    - Returns a small summary for the caller to include in logs.
+    Collapse rows sharing (device_id, timestamp) into one row.
+    - Later non-NULL values win, NULLs never overwrite (same rule as the COALESCE upsert).
+    - Required for multi-row upserts: Postgres rejects an INSERT ... ON CONFLICT DO UPDATE
+      that touches the same key twice in one statement.
+    - Keeps first-seen order of the keys.
     """
-    # Build query and params
-    insert_query = """
-    INSERT INTO sensor_data (device_id, timestamp, temperature, humidity, pollen, particulate_matter)
-    VALUES (%s, %s, %s, %s, %s, %s)
-    ON CONFLICT (device_id, timestamp)
-    DO UPDATE SET 
-        temperature = COALESCE(EXCLUDED.temperature, sensor_data.temperature),
-        humidity = COALESCE(EXCLUDED.humidity, sensor_data.humidity),
-        pollen = COALESCE(EXCLUDED.pollen, sensor_data.pollen),
-        particulate_matter = COALESCE(EXCLUDED.particulate_matter, sensor_data.particulate_matter);
+    merged: Dict[Tuple[Any, Any], List[Any]] = {}
+    for row in rows:
+        key = (row[0], row[1])
+        current = merged.get(key)
+        if current is None:
+            merged[key] = list(row)
+            continue
+        for i in range(2, len(SENSOR_COLUMNS)):
+            if row[i] is not None:
+                current[i] = row[i]
+    return [tuple(r) for r in merged.values()]
+
+
+def insert_sensor_data_batch(conn: Any, rows: Sequence[Sequence[Any]], *, page_size: int = 1000) -> int:
     """
+    Upsert many rows into sensor_data with one multi-row statement and one commit.
+    - Each written device is announced once on NOTIFY_CHANNEL.
+    - Rows are (device_id, timestamp, temperature, humidity, pollen, particulate_matter) tuples.
+    - Same COALESCE semantics as insert_sensor_data; duplicate keys are merged first.
+    - On failure: rollback and raise a domain-specific exception (nothing is committed).
+    - Returns the number of rows sent to the database.
+    """
+    if not rows:
+        return 0
+
+    merged = merge_sensor_rows(rows)
+    insert_query = UPSERT_TEMPLATE.format(rows="VALUES %s")
 
     cursor = conn.cursor()
+    watch = Stopwatch()
     try:
-        cursor.execute(
-            insert_query,
-            (device_id, timestamp, temperature, humidity, pollen, particulate_matter),
-        )
+        execute_values(cursor, insert_query, merged, page_size=page_size)
         conn.commit()
-
-        return {
-            "device_id": device_id,
-            "timestamp": timestamp,
-            "updated_fields": {
-                "temperature": temperature,
-                "humidity": humidity,
-                "pollen": pollen,
-                "particulate_matter": particulate_matter,
-            },
-            "rows_affected": getattr(cursor, "rowcount", 1),
-        }
+        DB_WRITE_SECONDS.labels("batch", "ok").observe(watch.elapsed_s())
+        observe_committed(row[1] for row in merged)
+        return len(merged)
 
     except Exception as e:
-        # Keep DB consistent
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-
-        # Very light classification without driver-specific imports
-        msg = str(e).lower()
-        if "timeout" in msg or "timed out" in msg:
-            raise DatabaseTimeoutError("database write timeout") from e
-        if "connect" in msg or "could not connect" in msg:
-            raise DatabaseConnectionError("database connection error") from e
-        raise DatabaseError("database write failed") from e
+        _rollback_quietly(conn)
+        error = _map_write_error(e)
+        DB_WRITE_SECONDS.labels("batch", _write_outcome(error)).observe(watch.elapsed_s())
+        raise error from e
 
     finally:
         try:
             cursor.close()
         except Exception:
-            pass
\ No newline at end of file
+            pass
@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from common.logging_setup import setup_logger, log_event
+from mqtt_client.metrics import DEDUP_LOOKUPS
+
+logger = setup_logger(service="ingester", module="dedup")
+
+# (device_id, metric, epoch seconds)
+ReadingKey = Tuple[Any, str, int]
+
+
+def reading_key(metric_name: str, payload_dict: Any) -> Optional[ReadingKey]:
+    """
+    Build the de-duplication key of a raw payload, or None if it has no usable
+    device id/timestamp (validation rejects those anyway).
+    """
+    if not isinstance(payload_dict, dict):
+        return None
+    meta = payload_dict.get("meta")
+    device_id = meta.get("device_id") if isinstance(meta, dict) else None
+    try:
+        timestamp = int(payload_dict.get("timestamp"))
+    except (TypeError, ValueError):
+        return None
+    # must be hashable and comparable to other copies; validation rejects anything else
+    if isinstance(device_id, bool) or not isinstance(device_id, (int, str)):
+        return None
+    return (device_id, metric_name, timestamp)
+
+
+class DedupCache:
+    """
+    Remember recently written readings for `ttl_s` seconds.
+    - Both brokers deliver every reading. `claim()` is check-and-insert under the
+      lock, so of two copies arriving at the same time only one is written.
+    - The claimant reports the outcome: `done()` once the copy was committed (or
+      taken over by the writer), `release()` if it was rejected or the write failed.
+      A copy that finds its key still in flight waits up to `wait_s` for that
+      outcome, so a failed first write does not leave its duplicate acked and dropped.
+    - Entries expire in insertion order (constant TTL), so purging only looks at
+      the oldest entries. `max_entries` bounds memory if the TTL is generous.
+    - Thread-safe: paho network threads and pipeline workers share one cache.
+    """
+
+    def __init__(self, *, ttl_s: float = 600.0, max_entries: int = 100000, wait_s: float = 0.0) -> None:
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.max_entries = max(1, int(max_entries))
+        self.wait_s = max(0.0, float(wait_s))
+        self._seen: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._in_flight: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def claim(self, key: Hashable) -> bool:
+        """
+        True: no copy of `key` was written or is being written; the caller owns it
+        and must call `done()` or `release()`. False: duplicate, skip it.
+        """
+        deadline = monotonic() + self.wait_s
+        while True:
+            claimed, pending = self._try_claim(key)
+            if pending is None:
+                return claimed
+            remaining = deadline - monotonic()
+            if remaining <= 0 or not pending.wait(remaining):
+                # still in flight: the owner writes it (or its writer retries)
+                with self._lock:
+                    self._count("hits")
+                return False
+
+    def try_claim(self, key: Hashable) -> Optional[bool]:
+        """`claim()` without waiting: None while another copy of `key` is in flight."""
+        claimed, pending = self._try_claim(key)
+        return None if pending is not None else claimed
+
+    def _try_claim(self, key: Hashable) -> Tuple[bool, Optional[threading.Event]]:
+        # (claimed, event of the copy in flight); nothing is counted while in flight
+        now = monotonic()
+        with self._lock:
+            self._purge(now)
+            if key not in self._seen:
+                self._seen[key] = now + self.ttl_s
+                self._in_flight[key] = threading.Event()
+                while len(self._seen) > self.max_entries:
+                    old, _ = self._seen.popitem(last=False)
+                    self._in_flight.pop(old, None)
+                    self.stats["evicted"] += 1
+                self._count("misses")
+                return True, None
+            pending = self._in_flight.get(key)
+            if pending is None:
+                self._count("hits")
+            return False, pending
+
+    def done(self, key: Hashable) -> None:
+        """The claimed copy was committed or accepted by the writer."""
+        with self._lock:
+            pending = self._in_flight.pop(key, None)
+        if pending is not None:
+            pending.set()
+
+    def release(self, key: Hashable) -> None:
+        """The claimed copy was not written: let the next copy have a go."""
+        with self._lock:
+            self._seen.pop(key, None)
+            pending = self._in_flight.pop(key, None)
+        if pending is not None:
+            pending.set()
+
+    def _count(self, result: str) -> None:
+        # lock held
+        self.stats[result] += 1
+        DEDUP_LOOKUPS.labels("hit" if result == "hits" else "miss").inc()
+
+    def _purge(self, now: float) -> None:
+        while self._seen:
+            key, expires_at = next(iter(self._seen.items()))
+            if expires_at > now:
+                break
+            del self._seen[key]
+            self._in_flight.pop(key, None)
+            self.stats["expired"] += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._seen)
+
+    def log_stats(self) -> None:
+        with self._lock:
+            snapshot = dict(self.stats)
+            size = len(self._seen)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        log_event(
+            logger, "INFO", "dedup_stats",
+            entries=size, hit_ratio=round(snapshot["hits"] / lookups, 3) if lookups else 0.0,
+            **snapshot
+        )
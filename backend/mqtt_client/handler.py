@@ -1,8 +1,11 @@
 from datetime import datetime, timezone
-from typing import Any, Dict, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from mqtt_client.db_writer import insert_sensor_data
+from mqtt_client.db_writer import insert_sensor_row
+from mqtt_client.reading import Reading, METRIC_CODES, TS_EPOCH_MIN, TS_EPOCH_MAX
+from mqtt_client.metrics import MESSAGES, VALIDATION_REJECTS
 from common.logging_setup import setup_logger, log_event, DurationTimer
+from common.log_sampling import SampledEvent
 from common.exceptions import (
     AppError,
     PayloadValidationError,
@@ -24,6 +27,12 @@ VALID_RANGES = {
     "pollen": (1, 700),
     "particulate_matter": (1, 700),
 }
+# Stored as INT: 12.0 is accepted as 12, 12.3 is rejected
+INTEGER_METRICS = ("pollen", "particulate_matter")
+
+# `msg_processed` is sampled per (device, metric) and summarised per metric
+# (LOG_SAMPLE_* / LOG_SUMMARY_INTERVAL_S); failures below are always logged.
+MSG_PROCESSED = SampledEvent(logger, "msg_processed", summary_key_name="metric")
 
 
 # ---------- Helpers ----------
@@ -37,9 +46,9 @@ def _iso_utc(dt: datetime) -> str:
 
 # ---------- Keep original API (minimal changes) ----------
 
-def parse_payload(payload: Dict[str, Any]) -> Tuple[int, datetime, Any]:
+def parse_payload(payload: Dict[str, Any]) -> Tuple[int, int, Any]:
     """
-    Extract device_id, timestamp (as datetime), and value from payload dict.
+    Extract device_id, timestamp (epoch seconds), and value from payload dict.
     Raise domain-specific ingestion errors instead of logging here.
     """
     try:
@@ -55,10 +64,12 @@ def parse_payload(payload: Dict[str, Any]) -> Tuple[int, datetime, Any]:
             missing.append("timestamp")
         else:
             try:
-            # Original code used epoch seconds (string) → datetime
-                timestamp = datetime.fromtimestamp(int(timestamp_str))
+                # epoch seconds (string); turned into a datetime only when the row is written
+                timestamp = int(timestamp_str)
             except Exception as e:
                 raise PayloadValidationError("invalid timestamp", details={"timestamp": timestamp_str}) from e
+            if not TS_EPOCH_MIN <= timestamp <= TS_EPOCH_MAX:
+                raise PayloadValidationError("invalid timestamp", details={"timestamp": timestamp_str})
         if value is None:
             missing.append("value")
         if missing:
@@ -74,147 +85,186 @@ def parse_payload(payload: Dict[str, Any]) -> Tuple[int, datetime, Any]:
         raise PayloadValidationError("payload parsing failed", details={"error": str(e)[:120]}) from e
 
 
-def handle_metric(metric_name: str, topic: str, payload_dict: Dict[str, Any], db_conn) -> None:
+def validate_reading(metric_name: str, payload_dict: Dict[str, Any]) -> Reading:
+    """
+    Parse and validate one reading.
+    - The value is normalized to the metric's column type (float, or int for pollen/PM).
+    - Raises the ingestion errors handled by `log_failure`; no logging here.
+    """
+    # 1) Parse payload
+    device_id, ts_epoch, value = parse_payload(payload_dict)
+
+    # 2) Metric checks
+    if metric_name not in VALID_RANGES:
+        raise UnknownMetricError(metric_name)
+
+    if not isinstance(value, (int, float)):
+        raise NonNumericMetricError(metric_name, type(value).__name__)
+
+    min_val, max_val = VALID_RANGES[metric_name]
+    if not (min_val <= float(value) <= max_val):
+        raise MetricOutOfRangeError(metric_name, float(value), float(min_val), float(max_val))
+
+    # 3) Type normalization
+    if metric_name in INTEGER_METRICS:
+        # allow 12.0 -> 12 but reject 12.3
+        if isinstance(value, float) and not value.is_integer():
+            raise PayloadValidationError(
+                "non-integer value for integer metric",
+                details={"metric": metric_name, "value": value},
+            )
+        value = int(value)
+    else:
+        value = float(value)
+
+    return Reading(device_id, ts_epoch, METRIC_CODES[metric_name], value)
+
+
+def handle_metric(
+    metric_name: str,
+    topic: str,
+    payload_dict: Dict[str, Any],
+    db_conn,
+    *,
+    writer=None,
+    ack: Optional[Callable[[], Any]] = None,
+) -> bool:
     """
     Validate and write the metric value into the database.
     Emit v0-compliant structured logs (JSON to stdout) here.
+    - With a `writer` (buffered mode) the row is queued instead of written;
+      `ack` is handed over and runs once the row is committed.
+    - Returns True when the reading was accepted, False when it was rejected or failed.
     """
     t = DurationTimer().start()
 
     try:
-        # 1) Parse payload
-        device_id, timestamp, value = parse_payload(payload_dict)
-
-        # 2) Metric checks
-        if metric_name not in VALID_RANGES:
-            raise UnknownMetricError(metric_name)
-
-        if not isinstance(value, (int, float)):
-            raise NonNumericMetricError(metric_name, type(value).__name__)
-
-        min_val, max_val = VALID_RANGES[metric_name]
-        if not (min_val <= float(value) <= max_val):
-            raise MetricOutOfRangeError(metric_name, float(value), float(min_val), float(max_val))
-
-        # 3) Type normalization (no kwargs; explicit named args per metric)
-        if metric_name == "temperature":
-            insert_sensor_data(db_conn, device_id, timestamp, temperature=float(value))
-        elif metric_name == "humidity":
-            insert_sensor_data(db_conn, device_id, timestamp, humidity=float(value))
-        elif metric_name == "pollen":
-            # pollen must be an integer; allow 12.0 -> 12 but reject 12.3
-            if isinstance(value, float) and not value.is_integer():
-                raise PayloadValidationError(
-                    "non-integer value for integer metric",
-                    details={"metric": metric_name, "value": value},
-                )
-            insert_sensor_data(db_conn, device_id, timestamp, pollen=int(value))
-        elif metric_name == "particulate_matter":
-            if isinstance(value, float) and not value.is_integer():
-                raise PayloadValidationError(
-                    "non-integer value for integer metric",
-                    details={"metric": metric_name, "value": value},
-                )
-            insert_sensor_data(db_conn, device_id, timestamp, particulate_matter=int(value))
+        reading = validate_reading(metric_name, payload_dict)
+
+        if writer is not None:
+            writer.add_reading(reading, ack=ack)
         else:
-            # Should not happen due to the earlier check, but keep a guard.
-            raise UnknownMetricError(metric_name)
+            insert_sensor_row(db_conn, reading.row())
+
+        # 4) Success log (single JSON line, v0 fields), sampled
+        log_processed(
+            reading.device_id, metric_name, reading.timestamp(), topic,
+            duration_ms=t.stop_ms(), buffered=writer is not None,
+        )
+        return True
 
-        # 4) Success log (single JSON line, v0 fields)
+    except Exception as e:
+        log_failure(e, metric_name, topic, payload_dict, duration_ms=t.stop_ms())
+        return False
+
+
+def log_processed(
+    device_id: Any,
+    metric_name: str,
+    timestamp: datetime,
+    topic: str,
+    *,
+    duration_ms: Optional[int] = None,
+    buffered: bool = False,
+) -> None:
+    """Count an accepted reading and emit its (sampled) `msg_processed` line."""
+    if MSG_PROCESSED.record((device_id, metric_name), metric_name, duration_ms=duration_ms):
         log_event(
             logger,
             "INFO",
             "msg_processed",
-            duration_ms=t.stop_ms(),
+            duration_ms=duration_ms,
             result="ok",
             device_id=device_id,
             metric=metric_name,
             msg_ts=_iso_utc(timestamp),
             topic=topic,
+            buffered=buffered,
         )
+    MESSAGES.labels(topic, "ok").inc()
 
-    # ---- Ingestion/domain validation failures (Warning) ----
-    except (PayloadValidationError, UnknownMetricError, NonNumericMetricError) as e:
-        # Map reason: range issues -> min_max_check; others -> schema_mismatch
-        code = getattr(e, "error_code", "")
-        reason = "min_max_check" if code == "VALUE_OUT_OF_RANGE" else "schema_mismatch"
 
-        log_event(
-            logger,
-            "WARNING",
-            "value_out_of_range",
-            duration_ms=t.stop_ms(),
-            result="failed",
-            reason=reason,
-            device_id=payload_dict.get("meta", {}).get("device_id"),
-            metric=metric_name,
-            msg_ts=str(payload_dict.get("timestamp")),
-            topic=topic,
-            **to_log_fields(e),  # adds error_type / error_code / details
-        )
-    
-    except MetricOutOfRangeError as e:
-        # Map reason: range issues -> min_max_check; others -> schema_mismatch
-        code = getattr(e, "error_code", "")
-        reason = "min_max_check" if code == "VALUE_OUT_OF_RANGE" else "schema_mismatch"
+# Validation errors → `reason` label of ingester_validation_rejects_total
+_REJECT_REASONS = {
+    PayloadValidationError: "payload_invalid",
+    UnknownMetricError: "unknown_metric",
+    NonNumericMetricError: "non_numeric",
+    MetricOutOfRangeError: "out_of_range",
+}
+_REJECT_ERROR_TYPES = {reason: cls.__name__ for cls, reason in _REJECT_REASONS.items()}
 
-        log_event(
-            logger,
-            "INFO",
-            "value_out_of_range",
-            duration_ms=t.stop_ms(),
-            result="failed",
-            reason=reason,
-            device_id=payload_dict.get("meta", {}).get("device_id"),
-            metric=metric_name,
-            msg_ts=str(payload_dict.get("timestamp")),
-            topic=topic,
-            **to_log_fields(e),  # adds error_type / error_code / details
-        )
 
-    # ---- DB failures (Error) ----
-    except DatabaseTimeoutError as e:
-        log_event(
-            logger,
-            "ERROR",
-            "db_write_failed",
-            duration_ms=t.stop_ms(),
-            result="failed",
-            reason="timeout",
-            device_id=payload_dict.get("meta", {}).get("device_id"),
-            metric=metric_name,
-            msg_ts=str(payload_dict.get("timestamp")),
-            topic=topic,
-            **to_log_fields(e),
-        )
+def log_failure(
+    e: Exception,
+    metric_name: str,
+    topic: str,
+    payload_dict: Dict[str, Any],
+    *,
+    duration_ms: Optional[int] = None,
+) -> None:
+    """Emit the v0 log line for a rejected reading or a failed write."""
+    common = dict(
+        duration_ms=duration_ms,
+        result="failed",
+        device_id=payload_dict.get("meta", {}).get("device_id"),
+        metric=metric_name,
+        msg_ts=str(payload_dict.get("timestamp")),
+        topic=topic,
+        **to_log_fields(e),  # adds error_type / error_code / details
+    )
 
-    except DatabaseError as e:
-        log_event(
-            logger,
-            "ERROR",
-            "db_write_failed",
-            duration_ms=t.stop_ms(),
-            result="failed",
-            reason="db_error",
-            device_id=payload_dict.get("meta", {}).get("device_id"),
-            metric=metric_name,
-            msg_ts=str(payload_dict.get("timestamp")),
-            topic=topic,
-            **to_log_fields(e),
-        )
+    reject_reason = _REJECT_REASONS.get(type(e))
+    if reject_reason is not None:
+        VALIDATION_REJECTS.labels(reject_reason).inc()
+    MESSAGES.labels(topic, "failed" if reject_reason is None else "rejected").inc()
+
+    # ---- Ingestion/domain validation failures ----
+    # Map reason: range issues -> min_max_check; others -> schema_mismatch
+    if isinstance(e, (PayloadValidationError, UnknownMetricError, NonNumericMetricError)):
+        log_event(logger, "WARNING", "value_out_of_range", reason="schema_mismatch", **common)
+    elif isinstance(e, MetricOutOfRangeError):
+        log_event(logger, "INFO", "value_out_of_range", reason="min_max_check", **common)
+
+    # ---- DB failures (Error) ----
+    elif isinstance(e, DatabaseTimeoutError):
+        log_event(logger, "ERROR", "db_write_failed", reason="timeout", **common)
+    elif isinstance(e, DatabaseError):
+        log_event(logger, "ERROR", "db_write_failed", reason="db_error", **common)
 
     # ---- Unknown/unexpected (Error) ----
-    except Exception as e:
-        log_event(
-            logger,
-            "ERROR",
-            "unhandled_exception",
-            duration_ms=t.stop_ms(),
-            result="failed",
-            reason="unexpected",
-            device_id=payload_dict.get("meta", {}).get("device_id"),
-            metric=metric_name,
-            msg_ts=str(payload_dict.get("timestamp")),
-            topic=topic,
-            **to_log_fields(e),
-        )
\ No newline at end of file
+    else:
+        log_event(logger, "ERROR", "unhandled_exception", reason="unexpected", **common)
+
+
+def log_reject(
+    reason: str,
+    metric_name: str,
+    topic: str,
+    payload_dict: Any,
+    *,
+    duration_ms: Optional[int] = None,
+) -> None:
+    """`log_failure` for a reject reason of `validate_batch`, which raises nothing per row."""
+    VALIDATION_REJECTS.labels(reason).inc()
+    MESSAGES.labels(topic, "rejected").inc()
+    common = dict(
+        _message_fields(metric_name, topic, payload_dict),
+        duration_ms=duration_ms, error_type=_REJECT_ERROR_TYPES[reason],
+    )
+    if reason == "out_of_range":
+        log_event(logger, "INFO", "value_out_of_range", reason="min_max_check", **common)
+    else:
+        log_event(logger, "WARNING", "value_out_of_range", reason="schema_mismatch", **common)
+
+
+def _message_fields(metric_name: str, topic: str, payload_dict: Any) -> Dict[str, Any]:
+    """v0 fields of a failure line; the payload may be any JSON value."""
+    payload = payload_dict if isinstance(payload_dict, dict) else {}
+    meta = payload.get("meta")
+    return dict(
+        result="failed",
+        device_id=meta.get("device_id") if isinstance(meta, dict) else None,
+        metric=metric_name,
+        msg_ts=str(payload.get("timestamp")),
+        topic=topic,
+    )
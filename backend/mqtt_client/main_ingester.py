@@ -1,13 +1,32 @@
 import json
+import signal
+import time
+from functools import partial
+
 import psycopg2
 import paho.mqtt.client as mqtt
 
 from mqtt_client.mqtt_config import (
-    MQTT_BROKER, MQTT_PORT, MQTT_BROKER2, MQTT_PORT2, MQTT_BASE_TOPIC, QOS,
-    DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT
+    MQTT_BROKER, MQTT_PORT, MQTT_BROKER2, MQTT_PORT2, MQTT_BASE_TOPIC, QOS, MQTT_CLIENT_ID,
+    MQTT_DUAL_SUBSCRIBE,
+    DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT,
+    INGEST_WRITE_MODE, INGEST_BATCH_SIZE, INGEST_BATCH_MAX_AGE_MS, INGEST_BUFFER_MAX_ROWS,
+    INGEST_COALESCE_WINDOW_MS, INGEST_COALESCE_MAX_KEYS, INGEST_STATS_INTERVAL_S,
+    INGEST_DEDUP_TTL_S, INGEST_DEDUP_MAX_ENTRIES, INGEST_DEDUP_WAIT_S,
+    INGEST_PIPELINE_WORKERS, INGEST_PIPELINE_BATCH_SIZE, INGEST_QUEUE_SIZE, INGEST_BACKPRESSURE,
+    INGEST_QUEUE_PUT_TIMEOUT_MS,
+    INGEST_METRICS_PORT,
 )
-from mqtt_client.handler import handle_metric
-from common.logging_setup import setup_logger, log_event
+from mqtt_client.handler import handle_metric, log_failure, log_processed, log_reject, MSG_PROCESSED
+from mqtt_client.batch_validation import validate_batch
+from mqtt_client.db_writer import insert_sensor_data_batch
+from mqtt_client.buffered_writer import BufferedWriter
+from mqtt_client.coalescer import ReadingCoalescer
+from mqtt_client.pipeline import IngestPipeline
+from mqtt_client.dedup import DedupCache, reading_key
+from mqtt_client.metrics import MESSAGES, VALIDATION_REJECTS, RECONNECTS, UNMATCHED_TOPIC, start_metrics_server
+from common.logging_setup import setup_logger, log_event, DurationTimer
+from common.schema import ensure_schema
 
 # Structured logger bound to this module/service
 logger = setup_logger(service="ingester", module="main_ingester")
@@ -39,17 +58,18 @@ metric_map = {
 
 def on_connect(client, userdata, flags, rc):
     """Log connection result and subscribe on success."""
+    broker = (userdata or {}).get("broker", f"{MQTT_BROKER}:{MQTT_PORT}")
     if rc == 0:
         log_event(
             logger, "INFO", "mqtt_connected",
-            result="ok", rc=rc, broker=f"{MQTT_BROKER}:{MQTT_PORT}"
+            result="ok", rc=rc, broker=broker
         )
         client.subscribe(f"{MQTT_BASE_TOPIC}/+/+", QOS)
     else:
         # Connection failed: treat as MQTT failure (no message processing yet)
         log_event(
             logger, "ERROR", "mqtt_connected",
-            result="failed", reason="connect_failed", rc=rc, broker=f"{MQTT_BROKER}:{MQTT_PORT}"
+            result="failed", reason="connect_failed", rc=rc, broker=broker
         )
 
 
@@ -57,7 +77,10 @@ def on_disconnect(client, userdata, rc):
     """Log clean vs unexpected disconnects."""
     level = "INFO" if rc == 0 else "WARNING"
     reason = "clean" if rc == 0 else "unexpected"
-    log_event(logger, level, "mqtt_disconnected", rc=rc, reason=reason)
+    if rc != 0:
+        # paho reconnects on its own (loop_start/loop_forever)
+        RECONNECTS.labels("mqtt").inc()
+    log_event(logger, level, "mqtt_disconnected", rc=rc, reason=reason, broker=(userdata or {}).get("broker"))
 
 
 def on_message(client, userdata, msg):
@@ -65,26 +88,177 @@ def on_message(client, userdata, msg):
     Parse topic → route to handler. Topic/schema issues are logged here.
     Handler is responsible for structured logging of processing success/failure.
     """
+    # No-op unless the client was created with manual_ack
+    ack = partial(client.ack, msg.mid, msg.qos)
+
+    pipeline = userdata.get("pipeline")
+    if pipeline is not None:
+        # Pipeline mode: keep the network loop free, workers do the rest
+        pipeline.submit(msg, ack)
+        return
+
+    dispatch_message(userdata, msg, ack)
+
+
+def dispatch_message(userdata, msg, ack=None):
+    """Process one message and take care of its ack (also used by pipeline workers)."""
+    writer = userdata.get("writer")
+    if writer is None:
+        # Direct write: committed (or failed and logged) when this returns
+        _process_message(userdata, msg)
+        if ack is not None:
+            ack()
+        return
+
+    # Writer chain: accepted messages are acked by the writer after their row is
+    # committed; rejected messages never reach the DB, ack them now.
+    if not _process_message(userdata, msg, writer=writer, ack=ack) and ack is not None:
+        ack()
+
+
+def _process_message(userdata, msg, *, writer=None, ack=None) -> bool:
+    """Route one message to the handler; returns True if the reading was accepted."""
     db_conn = userdata.get("db_connection")
     topic = msg.topic or ""
 
-     # Check if connection is closed (psycopg2: closed==True means unusable)
-    if db_conn is None or getattr(db_conn, "closed", True):
+    if writer is None:
+        # buffered mode: the writer owns and re-opens its own connection
+        db_conn = _usable_connection(userdata, topic)
+        if db_conn is None:
+            MESSAGES.labels(topic_label(topic), "failed").inc()
+            return False
+
+    metric_name = resolve_metric(topic)
+    if not metric_name:
+        return False
+
+    payload_dict = decode_payload(topic, msg.payload)
+    if payload_dict is None:
+        return False
+
+    # Both brokers deliver every reading: only the copy that claims the key is written
+    dedup = userdata.get("dedup")
+    key = reading_key(metric_name, payload_dict) if dedup is not None else None
+    if key is not None and not dedup.claim(key):
+        _count_duplicate(userdata, topic)
+        return False
+
+    # Delegate to handler; it will log success/failure per v0
+    try:
+        accepted = handle_metric(metric_name, topic, payload_dict, db_conn, writer=writer, ack=ack)
+    except Exception as e:
         log_event(
-            logger, "WARNING", "db_connection_closed",
-            result="failed", reason="reconnecting",
-            topic=topic
+            logger, "ERROR", "unhandled_exception",
+            result="failed", reason="unexpected",
+            topic=topic, error_type=type(e).__name__, error_msg=str(e)[:200]
         )
-        db_conn = connect_db()
-        userdata["db_connection"] = db_conn
-        if db_conn is None or getattr(db_conn, "closed", True):
-            log_event(
-                logger, "ERROR", "db_reconnect_failed",
-                result="failed", reason="db_unavailable",
-                topic=topic
+        MESSAGES.labels(topic, "failed").inc()
+        accepted = False
+    if key is not None:
+        if accepted:
+            # committed (direct) or owned by the writer, which retries until it commits
+            dedup.done(key)
+        else:
+            dedup.release(key)
+    return accepted
+
+
+def dispatch_batch(userdata, items):
+    """
+    Process the (msg, ack) pairs a pipeline worker took from the queue in one go.
+    - Routing, JSON decoding and de-duplication run per message; validation runs
+      once for the batch (`validate_batch`).
+    - Direct write: all accepted rows go into one upsert and one commit, then every
+      message is acked (failed writes too, like `dispatch_message`).
+    - Writer chain: accepted readings are queued with their ack, the rest is acked now.
+    - A copy whose key another message is still writing (the other broker's copy in
+      this or another worker's batch) goes through `dispatch_message` afterwards, where
+      it waits for that outcome without holding claims of its own.
+    """
+    t = DurationTimer().start()
+    writer = userdata.get("writer")
+    dedup = userdata.get("dedup")
+    acks = []
+    deferred = []
+    # (topic, metric_name, payload_dict, dedup key, ack) of every message to validate
+    candidates = []
+    for msg, ack in items:
+        topic = msg.topic or ""
+        metric_name = resolve_metric(topic)
+        payload_dict = decode_payload(topic, msg.payload) if metric_name else None
+        if payload_dict is None:
+            acks.append(ack)
+            continue
+        key = reading_key(metric_name, payload_dict) if dedup is not None else None
+        claimed = dedup.try_claim(key) if key is not None else True
+        if claimed is None:
+            deferred.append((msg, ack))
+        elif not claimed:
+            _count_duplicate(userdata, topic)
+            acks.append(ack)
+        else:
+            candidates.append((topic, metric_name, payload_dict, key, ack))
+
+    batch = validate_batch([(metric_name, payload_dict) for _, metric_name, payload_dict, _, _ in candidates])
+    for i, reason in batch.rejected():
+        topic, metric_name, payload_dict, key, ack = candidates[i]
+        log_reject(reason, metric_name, topic, payload_dict, duration_ms=t.stop_ms())
+        if key is not None:
+            dedup.release(key)
+        acks.append(ack)
+
+    accepted = [candidates[i] for i in batch.index.tolist()]
+    if accepted and writer is not None:
+        for (topic, metric_name, payload_dict, key, ack), reading in zip(accepted, batch.readings()):
+            try:
+                writer.add_reading(reading, ack=ack)
+            except Exception as e:
+                log_failure(e, metric_name, topic, payload_dict, duration_ms=t.stop_ms())
+                if key is not None:
+                    dedup.release(key)
+                acks.append(ack)
+                continue
+            if key is not None:
+                dedup.done(key)
+            log_processed(
+                reading.device_id, metric_name, reading.timestamp(), topic,
+                duration_ms=t.stop_ms(), buffered=True,
             )
-            return
+    elif accepted:
+        rows = batch.rows()
+        error = None
+        db_conn = _usable_connection(userdata, accepted[0][0])
+        if db_conn is not None:
+            try:
+                insert_sensor_data_batch(db_conn, rows)
+            except Exception as e:
+                error = e
+        for (topic, metric_name, payload_dict, key, ack), row in zip(accepted, rows):
+            if db_conn is None:
+                MESSAGES.labels(topic, "failed").inc()
+            elif error is not None:
+                log_failure(error, metric_name, topic, payload_dict, duration_ms=t.stop_ms())
+            else:
+                log_processed(row[0], metric_name, row[1], topic, duration_ms=t.stop_ms())
+            if key is not None:
+                if db_conn is not None and error is None:
+                    dedup.done(key)
+                else:
+                    dedup.release(key)
+            acks.append(ack)
+
+    for ack in acks:
+        if ack is not None:
+            ack()
+    for msg, ack in deferred:
+        dispatch_message(userdata, msg, ack)
 
+
+def resolve_metric(topic: str):
+    """
+    Map a topic to its metric via metric_map; log and return None if it has none.
+    Shared by the threaded and the asyncio entry point.
+    """
     # Expect topic like: dhbw/ai/si2023/<group>/<sensor-type>/<sensor-id>
     parts = topic.split("/")
     if len(parts) < 6:
@@ -93,7 +267,8 @@ def on_message(client, userdata, msg):
             result="failed", reason="schema_mismatch",
             topic=topic, details={"why": "unexpected_topic_format"}
         )
-        return
+        _count_rejected(topic, "unknown_topic")
+        return None
 
     sensor_type = parts[-2]
     sensor_id = parts[-1]
@@ -104,34 +279,95 @@ def on_message(client, userdata, msg):
             result="failed", reason="schema_mismatch",
             topic=topic, details={"sensor_type": sensor_type, "sensor_id": sensor_id, "why": "unknown_metric_mapping"}
         )
-        return
+        _count_rejected(topic, "unknown_topic")
+        return None
+
+    return metric_name
 
-    # Decode JSON payload; on failure, log as schema mismatch (ingestion-side issue)
+
+def configured_brokers():
+    """(host, port) of the primary and, if configured and different, the backup broker."""
+    brokers = [(MQTT_BROKER, MQTT_PORT)]
+    if MQTT_BROKER2 and (MQTT_BROKER2, MQTT_PORT2) != (MQTT_BROKER, MQTT_PORT):
+        brokers.append((MQTT_BROKER2, MQTT_PORT2))
+    return brokers
+
+
+def decode_payload(topic: str, payload: bytes):
+    """Decode the JSON body; on failure, log as schema mismatch (ingestion-side issue) and return None."""
     try:
-        payload_dict = json.loads(msg.payload.decode("utf-8"))
+        return json.loads(payload.decode("utf-8"))
     except Exception as e:
         log_event(
             logger, "WARNING", "value_out_of_range",
             result="failed", reason="schema_mismatch",
             topic=topic, error_type=type(e).__name__, error_msg=str(e)[:200]
         )
-        return
+        _count_rejected(topic, "invalid_json")
+        return None
 
-    # Delegate to handler; it will log success/failure per v0
-    try:
-        handle_metric(metric_name, topic, payload_dict, db_conn)
-    except Exception as e:
+
+def topic_label(topic: str) -> str:
+    """
+    `topic` label of ingester_messages_total. Only topics metric_map knows keep their
+    name (a fixed set under the `<base>/+/+` subscription); anything else anyone
+    publishes on the broker is counted as "unmatched", so it cannot add label series.
+    """
+    parts = topic.split("/")
+    if len(parts) >= 6 and metric_map.get(parts[-2], {}).get(parts[-1]):
+        return topic
+    return UNMATCHED_TOPIC
+
+
+def _count_rejected(topic: str, reason: str) -> None:
+    VALIDATION_REJECTS.labels(reason).inc()
+    MESSAGES.labels(topic_label(topic), "rejected").inc()
+
+
+def _count_duplicate(userdata, topic: str) -> None:
+    log_event(
+        logger, "DEBUG", "duplicate_dropped",
+        result="skipped", reason="duplicate", topic=topic, broker=userdata.get("broker")
+    )
+    MESSAGES.labels(topic, "duplicate").inc()
+
+
+# ---------------- DB connection helper ----------------
+
+def _usable_connection(userdata, topic: str):
+    """The caller's direct-write connection, re-opened if it was closed; None if the DB is unavailable."""
+    db_conn = userdata.get("db_connection")
+    # psycopg2: closed==True means unusable
+    if db_conn is not None and not getattr(db_conn, "closed", True):
+        return db_conn
+    log_event(
+        logger, "WARNING", "db_connection_closed",
+        result="failed", reason="reconnecting",
+        topic=topic
+    )
+    RECONNECTS.labels("db").inc()
+    db_conn = connect_db()
+    userdata["db_connection"] = db_conn
+    if db_conn is None or getattr(db_conn, "closed", True):
         log_event(
-            logger, "ERROR", "unhandled_exception",
-            result="failed", reason="unexpected",
-            topic=topic, error_type=type(e).__name__, error_msg=str(e)[:200]
+            logger, "ERROR", "db_reconnect_failed",
+            result="failed", reason="db_unavailable",
+            topic=topic
         )
+        return None
+    return db_conn
 
 
-# ---------------- DB connection helper ----------------
+_schema_ready = False
+
 
 def connect_db():
-    """Create a DB connection; emit structured logs for success/failure."""
+    """
+    Create a DB connection; emit structured logs for success/failure.
+    The first connection of the process also runs the startup migration
+    (common/schema.py); if that fails, the connection counts as failed.
+    """
+    global _schema_ready
     try:
         conn = psycopg2.connect(
             host=DB_HOST,
@@ -141,11 +377,6 @@ def connect_db():
             port=DB_PORT,
         )
         conn.autocommit = False
-        log_event(
-            logger, "INFO", "db_connected",
-            result="ok", host=DB_HOST, db=DB_NAME
-        )
-        return conn
     except Exception as e:
         log_event(
             logger, "ERROR", "db_connect_failed",
@@ -154,77 +385,221 @@ def connect_db():
         )
         return None
 
+    if not _schema_ready:
+        try:
+            created = ensure_schema(conn)
+        except Exception as e:
+            log_event(
+                logger, "ERROR", "db_migration_failed",
+                result="failed", reason="migration_error",
+                host=DB_HOST, db=DB_NAME, error_type=type(e).__name__, error_msg=str(e)[:200]
+            )
+            conn.close()
+            return None
+        _schema_ready = True
+        if created:
+            log_event(logger, "INFO", "db_migrated", result="ok", table="devices")
+
+    log_event(
+        logger, "INFO", "db_connected",
+        result="ok", host=DB_HOST, db=DB_NAME
+    )
+    return conn
+
+
+def make_client(userdata, *, manual_ack=False):
+    """
+    Create a paho client with the ingester callbacks.
+    A fixed client id enables a persistent session (un-acked QoS 1 messages are
+    redelivered after a restart). With a writer chain or the pipeline, messages
+    are acked manually once they are committed (or deliberately dropped).
+    """
+    client = mqtt.Client(
+        client_id=MQTT_CLIENT_ID,
+        clean_session=not MQTT_CLIENT_ID,
+        userdata=userdata,
+        manual_ack=manual_ack,
+    )
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+    client.on_message = on_message
+    return client
+
+
+def connect_with_fallback(client) -> bool:
+    """Single-broker mode: try the first MQTT broker, then the second, with structured logs."""
+    try:
+        client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        log_event(
+            logger, "INFO", "mqtt_connect_attempt",
+            broker=MQTT_BROKER, port=MQTT_PORT, result="ok"
+        )
+        return True
+    except Exception as e:
+        log_event(
+            logger, "WARNING", "mqtt_connect_attempt",
+            broker=MQTT_BROKER, port=MQTT_PORT, result="failed", error_type=type(e).__name__, error_msg=str(e)[:200]
+        )
+    if not MQTT_BROKER2:
+        log_event(
+            logger, "CRITICAL", "mqtt_connect_fallback",
+            broker=None, port=None, result="failed", reason="no_fallback_configured"
+        )
+        return False
+
+    log_event(
+        logger, "INFO", "mqtt_connect_fallback_attempt",
+        broker=MQTT_BROKER2, port=MQTT_PORT2, result="attempt"
+    )
+    try:
+        client.connect(MQTT_BROKER2, MQTT_PORT2, 60)
+        log_event(
+            logger, "INFO", "mqtt_connect_fallback",
+            broker=MQTT_BROKER2, port=MQTT_PORT2, result="ok"
+        )
+        return True
+    except Exception as e2:
+        log_event(
+            logger, "WARNING", "mqtt_connect_attempt",
+            broker=MQTT_BROKER2, port=MQTT_PORT2, result="failed", error_type=type(e2).__name__, error_msg=str(e2)[:200]
+        )
+        log_event(
+            logger, "CRITICAL", "mqtt_connect_fallback",
+            broker=MQTT_BROKER2, port=MQTT_PORT2, result="failed", error_type=type(e2).__name__, error_msg=str(e2)[:200]
+        )
+        return False
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    """Treat SIGTERM (docker stop) like Ctrl+C so buffered rows are flushed."""
+    raise KeyboardInterrupt
+
 
 # ---------------- Main entry point ----------------
 
 if __name__ == "__main__":
     log_event(logger, "INFO", "ingester_start", msg="Launching MQTT ingester")
+    start_metrics_server(INGEST_METRICS_PORT)
 
     db_connection = connect_db()
     if not db_connection:
         log_event(logger, "CRITICAL", "ingester_exit", reason="db_unavailable")
         raise SystemExit(1)
 
-    client = mqtt.Client(userdata={"db_connection": db_connection})
-    client.on_connect = on_connect
-    client.on_disconnect = on_disconnect
-    client.on_message = on_message
+    # Write chain: [coalescer] → [buffered writer] → DB. Without either the
+    # handler writes directly on the shared connection (original behaviour).
+    buffered = None
+    if INGEST_WRITE_MODE == "buffered" or INGEST_COALESCE_WINDOW_MS > 0:
+        buffered = BufferedWriter(
+            connect_db,
+            conn=db_connection,
+            # coalescing alone: write each merged row as soon as it is complete
+            max_rows=INGEST_BATCH_SIZE if INGEST_WRITE_MODE == "buffered" else 1,
+            max_age_ms=INGEST_BATCH_MAX_AGE_MS,
+            max_buffer_rows=INGEST_BUFFER_MAX_ROWS,
+        ).start()
+    coalescer = None
+    if INGEST_COALESCE_WINDOW_MS > 0:
+        coalescer = ReadingCoalescer(
+            buffered,
+            window_ms=INGEST_COALESCE_WINDOW_MS,
+            max_keys=INGEST_COALESCE_MAX_KEYS,
+            stats_interval_s=INGEST_STATS_INTERVAL_S,
+        ).start()
+    writer = coalescer or buffered
+
+    dedup = None
+    if INGEST_DEDUP_TTL_S > 0:
+        dedup = DedupCache(
+            ttl_s=INGEST_DEDUP_TTL_S, max_entries=INGEST_DEDUP_MAX_ENTRIES, wait_s=INGEST_DEDUP_WAIT_S
+        )
+
+    pipeline = None
+    if INGEST_PIPELINE_WORKERS > 0:
+        pipeline = IngestPipeline(
+            dispatch_message,
+            connect_db,
+            writer=writer,
+            context={"dedup": dedup},
+            workers=INGEST_PIPELINE_WORKERS,
+            queue_size=INGEST_QUEUE_SIZE,
+            backpressure=INGEST_BACKPRESSURE,
+            put_timeout_ms=INGEST_QUEUE_PUT_TIMEOUT_MS,
+            stats_interval_s=INGEST_STATS_INTERVAL_S,
+            process_batch=dispatch_batch if INGEST_PIPELINE_BATCH_SIZE > 1 else None,
+            batch_size=INGEST_PIPELINE_BATCH_SIZE,
+        ).start()
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    manual_ack = writer is not None or pipeline is not None
 
-    # Fallback: try first MQTT broker, then second, with structured logs
+    clients = []
+    extra_connections = []
     try:
-        connected = False
-        try:
-            client.connect(MQTT_BROKER, MQTT_PORT, 60)
-            log_event(
-                logger, "INFO", "mqtt_connect_attempt",
-                broker=MQTT_BROKER, port=MQTT_PORT, result="ok"
-            )
-            connected = True
-        except Exception as e:
-            log_event(
-                logger, "WARNING", "mqtt_connect_attempt",
-                broker=MQTT_BROKER, port=MQTT_PORT, result="failed", error_type=type(e).__name__, error_msg=str(e)[:200]
-            )
-            if MQTT_BROKER2:
-                log_event(
-                    logger, "INFO", "mqtt_connect_fallback_attempt",
-                    broker=MQTT_BROKER2, port=MQTT_PORT2, result="attempt"
+        if MQTT_DUAL_SUBSCRIBE:
+            # One client + network thread per broker, like the sensor exporter. Each
+            # keeps reconnecting on its own, so losing a broker later costs nothing.
+            for i, (broker, port) in enumerate(configured_brokers()):
+                conn = db_connection
+                if i > 0 and writer is None and pipeline is None:
+                    # Direct writes from two network threads need two connections
+                    conn = connect_db()
+                    extra_connections.append(conn)
+                client = make_client(
+                    {
+                        "db_connection": conn, "writer": writer, "pipeline": pipeline,
+                        "dedup": dedup, "broker": f"{broker}:{port}",
+                    },
+                    manual_ack=manual_ack,
                 )
-                try:
-                    client.connect(MQTT_BROKER2, MQTT_PORT2, 60)
-                    log_event(
-                        logger, "INFO", "mqtt_connect_fallback",
-                        broker=MQTT_BROKER2, port=MQTT_PORT2, result="ok"
-                    )
-                    connected = True
-                except Exception as e2:
-                    log_event(
-                        logger, "WARNING", "mqtt_connect_attempt",
-                        broker=MQTT_BROKER2, port=MQTT_PORT2, result="failed", error_type=type(e2).__name__, error_msg=str(e2)[:200]
-                    )
-                    log_event(
-                        logger, "CRITICAL", "mqtt_connect_fallback",
-                        broker=MQTT_BROKER2, port=MQTT_PORT2, result="failed", error_type=type(e2).__name__, error_msg=str(e2)[:200]
-                    )
-            else:
+                client.connect_async(broker, port, 60)
+                client.loop_start()
                 log_event(
-                    logger, "CRITICAL", "mqtt_connect_fallback",
-                    broker=None, port=None, result="failed", reason="no_fallback_configured"
+                    logger, "INFO", "mqtt_connect_attempt",
+                    broker=broker, port=port, result="started", mode="dual_subscribe"
                 )
-        if not connected:
-            log_event(logger, "CRITICAL", "ingester_exit", reason="no_mqtt_connection")
-            raise SystemExit(1)
-        client.loop_forever()
+                clients.append(client)
+
+            while True:
+                time.sleep(INGEST_STATS_INTERVAL_S or 60)
+                if dedup is not None:
+                    dedup.log_stats()
+        else:
+            client = make_client(
+                {"db_connection": db_connection, "writer": writer, "pipeline": pipeline, "dedup": dedup},
+                manual_ack=manual_ack,
+            )
+            clients.append(client)
+            if not connect_with_fallback(client):
+                log_event(logger, "CRITICAL", "ingester_exit", reason="no_mqtt_connection")
+                raise SystemExit(1)
+            client.loop_forever()
     except KeyboardInterrupt:
         log_event(logger, "INFO", "shutdown_requested")
     finally:
-        try:
-            if db_connection:
-                db_connection.close()
-                log_event(logger, "INFO", "db_connection_closed", result="ok")
-        except Exception as e:
-            log_event(
-                logger, "WARNING", "db_connection_closed",
-                result="failed", reason="close_failed",
-                error_type=type(e).__name__, error_msg=str(e)[:200]
-            )
+        for client in clients:
+            try:
+                client.disconnect()
+                client.loop_stop()
+            except Exception:
+                pass
+        # Order matters: drain the queue, hand merged rows to the buffer, flush the buffer.
+        if pipeline is not None:
+            pipeline.close()
+        if coalescer is not None:
+            coalescer.close()
+        if buffered is not None:
+            buffered.close()
+        if dedup is not None:
+            dedup.log_stats()
+        MSG_PROCESSED.flush()
+        for conn in [db_connection, *extra_connections]:
+            try:
+                if conn:
+                    conn.close()
+                    log_event(logger, "INFO", "db_connection_closed", result="ok")
+            except Exception as e:
+                log_event(
+                    logger, "WARNING", "db_connection_closed",
+                    result="failed", reason="close_failed",
+                    error_type=type(e).__name__, error_msg=str(e)[:200]
+                )
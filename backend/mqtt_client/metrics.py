@@ -0,0 +1,64 @@
+"""
+Prometheus metrics of the MQTT ingester, served over HTTP on INGEST_METRICS_PORT
+(like sensor-exporter; scraped by Prometheus as job `mqtt_ingester`).
+
+- ingester_messages_total{topic, result}: ok | rejected | duplicate | failed;
+  `topic` is a mapped topic or "unmatched" (see main_ingester.topic_label)
+- ingester_validation_rejects_total{reason}
+- ingester_end_to_end_latency_seconds: message timestamp → commit of its row
+  (sensor timestamps have 1 s resolution, so the low buckets are coarse)
+- ingester_db_write_duration_seconds{mode, outcome}: one upsert + commit
+- ingester_reconnects_total{target}: mqtt | db
+- ingester_dedup_lookups_total{result}: hit (second broker's copy) | miss
+"""
+import time
+from typing import Any, Iterable
+
+from prometheus_client import Counter, Histogram, start_http_server
+
+from common.logging_setup import setup_logger, log_event
+from common.metrics import LATENCY_BUCKETS
+
+logger = setup_logger(service="ingester", module="metrics")
+
+# `topic` label for messages whose topic has no metric mapping (bounded label set)
+UNMATCHED_TOPIC = "unmatched"
+
+MESSAGES = Counter("ingester_messages_total", "MQTT messages by topic and outcome", ["topic", "result"])
+VALIDATION_REJECTS = Counter("ingester_validation_rejects_total", "Readings rejected before the DB", ["reason"])
+END_TO_END_SECONDS = Histogram(
+    "ingester_end_to_end_latency_seconds",
+    "Time from the reading's timestamp until its row is committed",
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+DB_WRITE_SECONDS = Histogram(
+    "ingester_db_write_duration_seconds",
+    "Duration of one upsert including commit",
+    ["mode", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+RECONNECTS = Counter("ingester_reconnects_total", "Reconnects after a lost connection", ["target"])
+DEDUP_LOOKUPS = Counter("ingester_dedup_lookups_total", "Duplicate-filter lookups", ["result"])
+
+
+def observe_committed(timestamps: Iterable[Any]) -> None:
+    """End-to-end latency for rows just committed (datetimes as handed to the DB)."""
+    now = time.time()
+    for ts in timestamps:
+        try:
+            END_TO_END_SECONDS.observe(max(0.0, now - ts.timestamp()))
+        except (AttributeError, TypeError, ValueError, OverflowError):
+            continue
+
+
+def start_metrics_server(port: int) -> bool:
+    """Serve /metrics on `port` in a daemon thread; 0 disables. Returns True if started."""
+    if port <= 0:
+        return False
+    try:
+        start_http_server(port)
+    except OSError as e:
+        log_event(logger, "ERROR", "metrics_server_failed", result="failed", port=port, error_type=type(e).__name__)
+        return False
+    log_event(logger, "INFO", "metrics_server_started", result="ok", port=port)
+    return True
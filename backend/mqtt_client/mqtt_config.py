@@ -52,10 +52,17 @@ MQTT_BROKER2 = os.getenv("MQTT_BROKER_BACKUP")
 MQTT_PORT2 = int(os.getenv("MQTT_PORT_BACKUP", MQTT_PORT))
 MQTT_BASE_TOPIC = os.getenv("MQTT_BASE_TOPIC", "dhbw/ai/si2023/01")
 QOS = int(os.getenv("MQTT_QOS", "1"))
+# Optional fixed client id; when set the ingester uses a persistent session so
+# un-acked QoS 1 messages are redelivered after a restart.
+MQTT_CLIENT_ID = os.getenv("MQTT_CLIENT_ID", "")
+# Consume from primary and backup broker at the same time ("1", default) or only
+# fall back to the backup when the primary is unreachable at startup ("0").
+MQTT_DUAL_SUBSCRIBE = os.getenv("MQTT_DUAL_SUBSCRIBE", "1") == "1"
 
 log_event(
     logger, "INFO", "mqtt.config.loaded",
-    broker=MQTT_BROKER, port=MQTT_PORT, base_topic=MQTT_BASE_TOPIC, qos=QOS
+    broker=MQTT_BROKER, port=MQTT_PORT, base_topic=MQTT_BASE_TOPIC, qos=QOS,
+    dual_subscribe=MQTT_DUAL_SUBSCRIBE
 )
 
 
@@ -72,6 +79,62 @@ log_event(
 )
 
 
+# --- Ingest write configuration ---
+# "direct": one upsert + commit per message (default)
+# "buffered": collect rows and flush them as one multi-row upsert
+INGEST_WRITE_MODE = os.getenv("INGEST_WRITE_MODE", "direct").lower()
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_BATCH_MAX_AGE_MS = int(os.getenv("INGEST_BATCH_MAX_AGE_MS", "1000"))
+INGEST_BUFFER_MAX_ROWS = int(os.getenv("INGEST_BUFFER_MAX_ROWS", "50000"))
+# Merge per-metric readings of the same (device_id, timestamp) for up to this long
+# before writing them as one row; 0 disables coalescing.
+INGEST_COALESCE_WINDOW_MS = int(os.getenv("INGEST_COALESCE_WINDOW_MS", "0"))
+INGEST_COALESCE_MAX_KEYS = int(os.getenv("INGEST_COALESCE_MAX_KEYS", "10000"))
+INGEST_STATS_INTERVAL_S = float(os.getenv("INGEST_STATS_INTERVAL_S", "60"))
+# Drop readings already seen (same device, metric, timestamp) within this TTL;
+# both brokers deliver every reading. 0 disables de-duplication.
+INGEST_DEDUP_TTL_S = float(os.getenv("INGEST_DEDUP_TTL_S", "600"))
+INGEST_DEDUP_MAX_ENTRIES = int(os.getenv("INGEST_DEDUP_MAX_ENTRIES", "100000"))
+# How long a copy waits for the other broker's copy of the same reading to be written
+# (or fail) before it is skipped; only the threaded ingester waits.
+INGEST_DEDUP_WAIT_S = float(os.getenv("INGEST_DEDUP_WAIT_S", "5"))
+# Pipeline mode: on_message only enqueues; N writer workers drain the queue.
+# 0 workers keeps processing inline in the MQTT network thread.
+INGEST_PIPELINE_WORKERS = int(os.getenv("INGEST_PIPELINE_WORKERS", "0"))
+# Messages a worker takes from the queue at once (validated together, one upsert in
+# direct mode); 1 processes them one by one.
+INGEST_PIPELINE_BATCH_SIZE = int(os.getenv("INGEST_PIPELINE_BATCH_SIZE", "100"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_BACKPRESSURE = os.getenv("INGEST_BACKPRESSURE", "block").lower()
+INGEST_QUEUE_PUT_TIMEOUT_MS = int(os.getenv("INGEST_QUEUE_PUT_TIMEOUT_MS", "5000"))
+# asyncio entry point (mqtt_client/async_ingester.py): asyncpg pool bounds
+INGEST_ASYNC_DB_POOL_MIN = int(os.getenv("INGEST_ASYNC_DB_POOL_MIN", "1"))
+INGEST_ASYNC_DB_POOL_MAX = int(os.getenv("INGEST_ASYNC_DB_POOL_MAX", "4"))
+
+# Prometheus metrics HTTP port (0 = off)
+INGEST_METRICS_PORT = int(os.getenv("INGEST_METRICS_PORT", "9101"))
+
+if INGEST_WRITE_MODE not in ("direct", "buffered"):
+    log_event(logger, "ERROR", "config.invalid_value", key="INGEST_WRITE_MODE", value=INGEST_WRITE_MODE)
+    raise RuntimeError(f"INGEST_WRITE_MODE must be 'direct' or 'buffered', got {INGEST_WRITE_MODE!r}")
+
+if INGEST_BACKPRESSURE not in ("block", "drop_newest", "drop_oldest"):
+    log_event(logger, "ERROR", "config.invalid_value", key="INGEST_BACKPRESSURE", value=INGEST_BACKPRESSURE)
+    raise RuntimeError(
+        f"INGEST_BACKPRESSURE must be 'block', 'drop_newest' or 'drop_oldest', got {INGEST_BACKPRESSURE!r}"
+    )
+
+log_event(
+    logger, "INFO", "ingest.config.loaded",
+    write_mode=INGEST_WRITE_MODE, batch_size=INGEST_BATCH_SIZE,
+    batch_max_age_ms=INGEST_BATCH_MAX_AGE_MS, buffer_max_rows=INGEST_BUFFER_MAX_ROWS,
+    coalesce_window_ms=INGEST_COALESCE_WINDOW_MS, dedup_ttl_s=INGEST_DEDUP_TTL_S,
+    pipeline_workers=INGEST_PIPELINE_WORKERS, pipeline_batch_size=INGEST_PIPELINE_BATCH_SIZE,
+    queue_size=INGEST_QUEUE_SIZE,
+    backpressure=INGEST_BACKPRESSURE
+)
+
+
 #  a sanitized view useful for debugging endpoints or health checks
 def public_config() -> dict:
     """
@@ -83,6 +146,20 @@ def public_config() -> dict:
             "port": MQTT_PORT,
             "base_topic": MQTT_BASE_TOPIC,
             "qos": QOS,
+            "persistent_session": bool(MQTT_CLIENT_ID),
+            "dual_subscribe": MQTT_DUAL_SUBSCRIBE,
+        },
+        "ingest": {
+            "write_mode": INGEST_WRITE_MODE,
+            "batch_size": INGEST_BATCH_SIZE,
+            "batch_max_age_ms": INGEST_BATCH_MAX_AGE_MS,
+            "buffer_max_rows": INGEST_BUFFER_MAX_ROWS,
+            "coalesce_window_ms": INGEST_COALESCE_WINDOW_MS,
+            "dedup_ttl_s": INGEST_DEDUP_TTL_S,
+            "pipeline_workers": INGEST_PIPELINE_WORKERS,
+            "pipeline_batch_size": INGEST_PIPELINE_BATCH_SIZE,
+            "queue_size": INGEST_QUEUE_SIZE,
+            "backpressure": INGEST_BACKPRESSURE,
         },
         "db": {
             "host": DB_HOST,
@@ -0,0 +1,242 @@
+import queue
+import threading
+from time import monotonic
+from typing import Any, Callable, List, Optional, Tuple
+
+from common.logging_setup import setup_logger, log_event, DurationTimer
+from common.exceptions import to_log_fields
+
+logger = setup_logger(service="ingester", module="pipeline")
+
+BACKPRESSURE_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+# (raw MQTT message, ack callback, enqueue time)
+QueueItem = Tuple[Any, Optional[Callable[[], Any]], float]
+
+_STOP = object()
+
+
+class IngestPipeline:
+    """
+    Decouple MQTT receive from database writes.
+    - `submit()` runs in paho's network thread and only enqueues the raw message.
+    - `workers` threads drain the bounded queue; each owns its own DB connection
+      (direct mode) or shares the thread-safe writer chain (buffered/coalescing).
+    - Backpressure when the queue is full:
+        block       → wait up to `put_timeout_ms` (stalls the network loop), then drop
+        drop_newest → drop the incoming message
+        drop_oldest → drop the oldest queued message to make room
+      Dropped messages are acked: shedding load is a deliberate loss, and un-acked
+      messages would keep occupying the broker's in-flight window.
+    - With `process_batch`, a worker takes up to `batch_size` queued messages at
+      once (whatever is already waiting, it never waits for more) and hands them
+      over as one list of (msg, ack) pairs.
+    - Queue depth and enqueue→dequeue lag are tracked in `stats`.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[dict, Any, Optional[Callable[[], Any]]], Any],
+        connect: Callable[[], Any],
+        *,
+        writer: Any = None,
+        context: Optional[dict] = None,
+        workers: int = 2,
+        queue_size: int = 10000,
+        backpressure: str = "block",
+        put_timeout_ms: int = 5000,
+        stats_interval_s: float = 60.0,
+        process_batch: Optional[Callable[[dict, List[Tuple[Any, Optional[Callable[[], Any]]]]], Any]] = None,
+        batch_size: int = 1,
+    ) -> None:
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"backpressure must be one of {BACKPRESSURE_POLICIES}, got {backpressure!r}")
+        self._process = process
+        self._process_batch = process_batch
+        self.batch_size = max(1, int(batch_size))
+        self._connect = connect
+        self.writer = writer
+        # extra userdata shared by all workers (e.g. the de-duplication cache)
+        self.context = dict(context or {})
+        self.workers = max(1, int(workers))
+        self.backpressure = backpressure
+        self.put_timeout_s = max(0, int(put_timeout_ms)) / 1000.0
+        self.stats_interval_s = stats_interval_s
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self._stop_stats = threading.Event()
+
+        self.stats = {
+            "enqueued": 0,
+            "processed": 0,
+            "dropped": 0,
+            "worker_errors": 0,
+            "queue_depth_max": 0,
+            "lag_ms_last": 0,
+            "lag_ms_max": 0,
+        }
+
+    # ---------- producer side (paho network thread) ----------
+
+    def submit(self, msg: Any, ack: Optional[Callable[[], Any]] = None) -> bool:
+        """Enqueue one raw message; returns False if it was dropped."""
+        item: QueueItem = (msg, ack, monotonic())
+        try:
+            if self.backpressure == "block":
+                self._queue.put(item, timeout=self.put_timeout_s)
+            elif self.backpressure == "drop_newest":
+                self._queue.put_nowait(item)
+            else:
+                self._put_drop_oldest(item)
+        except queue.Full:
+            self._drop(item, reason=self.backpressure)
+            return False
+
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self.stats["enqueued"] += 1
+            if depth > self.stats["queue_depth_max"]:
+                self.stats["queue_depth_max"] = depth
+        return True
+
+    def _put_drop_oldest(self, item: QueueItem) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    oldest = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if oldest is _STOP:
+                    # never swallow a shutdown sentinel
+                    self._queue.put(oldest)
+                    raise
+                self._drop(oldest, reason="drop_oldest")
+
+    def _drop(self, item: QueueItem, *, reason: str) -> None:
+        msg, ack, _ = item
+        with self._stats_lock:
+            self.stats["dropped"] += 1
+        log_event(
+            logger, "WARNING", "queue_full_dropped",
+            result="failed", reason=reason, topic=getattr(msg, "topic", None),
+            queue_depth=self._queue.qsize()
+        )
+        if ack is not None:
+            try:
+                ack()
+            except Exception as e:
+                log_event(logger, "WARNING", "mqtt_ack_failed", result="failed", **to_log_fields(e))
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    # ---------- consumer side (writer workers) ----------
+
+    def _worker(self, index: int) -> None:
+        # Direct mode: every worker writes on its own connection.
+        userdata = {
+            **self.context,
+            "db_connection": self._connect() if self.writer is None else None,
+            "writer": self.writer,
+        }
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            items = [item]
+            if self._process_batch is not None:
+                while len(items) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    items.append(item)
+            lag_ms = int((monotonic() - items[0][2]) * 1000)
+            try:
+                if self._process_batch is not None:
+                    self._process_batch(userdata, [(msg, ack) for msg, ack, _ in items])
+                else:
+                    msg, ack, _ = items[0]
+                    self._process(userdata, msg, ack)
+            except Exception as e:
+                with self._stats_lock:
+                    self.stats["worker_errors"] += 1
+                log_event(
+                    logger, "ERROR", "unhandled_exception",
+                    result="failed", reason="unexpected", worker=index,
+                    topic=getattr(items[0][0], "topic", None), batch_size=len(items), **to_log_fields(e)
+                )
+            with self._stats_lock:
+                self.stats["processed"] += len(items)
+                self.stats["lag_ms_last"] = lag_ms
+                if lag_ms > self.stats["lag_ms_max"]:
+                    self.stats["lag_ms_max"] = lag_ms
+
+        conn = userdata.get("db_connection")
+        try:
+            if conn is not None:
+                conn.close()
+        except Exception:
+            pass
+
+    def log_stats(self) -> None:
+        with self._stats_lock:
+            snapshot = dict(self.stats)
+            # max values are per reporting interval
+            self.stats["queue_depth_max"] = 0
+            self.stats["lag_ms_max"] = 0
+        log_event(
+            logger, "INFO", "pipeline_stats",
+            queue_depth=self.depth, queue_size=self._queue.maxsize, workers=self.workers,
+            **snapshot
+        )
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> "IngestPipeline":
+        if self._threads:
+            return self
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, args=(i,), name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+        if self.stats_interval_s:
+            def _report():
+                while not self._stop_stats.wait(self.stats_interval_s):
+                    self.log_stats()
+            threading.Thread(target=_report, name="ingest-pipeline-stats", daemon=True).start()
+
+        log_event(
+            logger, "INFO", "pipeline_started",
+            workers=self.workers, queue_size=self._queue.maxsize, backpressure=self.backpressure
+        )
+        return self
+
+    def close(self, timeout_s: float = 30.0) -> None:
+        """Let the workers drain the queue, then stop them (call after the MQTT loop stopped)."""
+        t = DurationTimer().start()
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        deadline = monotonic() + timeout_s
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - monotonic()))
+        self._threads = []
+        self._stop_stats.set()
+
+        left = self.depth
+        log_event(
+            logger, "INFO" if left == 0 else "ERROR", "pipeline_closed",
+            duration_ms=t.stop_ms(), result="ok" if left == 0 else "failed", queue_depth=left
+        )
+        self.log_stats()
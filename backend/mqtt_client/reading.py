@@ -0,0 +1,52 @@
+"""
+One validated sensor reading as it travels through the ingest path.
+
+`handler.validate_reading` returns a `Reading`; the writers turn it into a
+SENSOR_COLUMNS row only when the row is queued or written, so a message no
+longer goes dict → tuple → keyword arguments → summary dict.
+"""
+from datetime import datetime, tzinfo
+from typing import Any, Optional, Tuple
+
+# Metric columns in SENSOR_COLUMNS order; a Reading's `metric` indexes this tuple.
+METRICS = ("temperature", "humidity", "pollen", "particulate_matter")
+METRIC_CODES = {name: code for code, name in enumerate(METRICS)}
+
+# Epoch seconds datetime.fromtimestamp() accepts (years 1..9999)
+TS_EPOCH_MIN, TS_EPOCH_MAX = -62135596800, 253402300799
+
+
+class Reading:
+    """device_id, epoch seconds, metric code and normalised value (float, or int for pollen/PM)."""
+
+    __slots__ = ("device_id", "ts_epoch", "metric", "value")
+
+    def __init__(self, device_id: Any, ts_epoch: int, metric: int, value: Any) -> None:
+        self.device_id = device_id
+        self.ts_epoch = ts_epoch
+        self.metric = metric
+        self.value = value
+
+    @property
+    def metric_name(self) -> str:
+        return METRICS[self.metric]
+
+    def timestamp(self, tz: Optional[tzinfo] = None) -> datetime:
+        """Naive local time by default (what the ingester always sent to the DB)."""
+        return datetime.fromtimestamp(self.ts_epoch, tz)
+
+    def row(self, tz: Optional[tzinfo] = None) -> Tuple[Any, ...]:
+        """(device_id, timestamp, temperature, humidity, pollen, particulate_matter); other metrics NULL."""
+        row = [self.device_id, self.timestamp(tz), None, None, None, None]
+        row[2 + self.metric] = self.value
+        return tuple(row)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Reading):
+            return NotImplemented
+        return (self.device_id, self.ts_epoch, self.metric, self.value) == (
+            other.device_id, other.ts_epoch, other.metric, other.value
+        )
+
+    def __repr__(self) -> str:
+        return f"Reading({self.device_id!r}, {self.ts_epoch}, {self.metric_name}, {self.value!r})"
@@ -0,0 +1,104 @@
+import pytest
+
+from api.db import aggregates
+
+
+@pytest.fixture(autouse=True)
+def enabled(mocker):
+    mocker.patch.object(aggregates, "log_event")
+    mocker.patch.object(aggregates, "USE_CONTINUOUS_AGGREGATES", True)
+
+
+@pytest.mark.parametrize("bucket_size, view", [
+    (10, None),
+    (59, None),
+    (60, "sensor_data_1m"),
+    (240, "sensor_data_1m"),
+    (900, "sensor_data_15m"),
+    (1680, "sensor_data_1m"),  # 7 d / 360: 15 m grains would straddle buckets
+    (2700, "sensor_data_15m"),
+    (5400, "sensor_data_15m"),
+    (7200, "sensor_data_1h"),
+    (7230, None),
+])
+def test_pick_aggregate_chooses_coarsest_grain_dividing_the_bucket(bucket_size, view):
+    picked = aggregates.pick_aggregate(bucket_size)
+    assert (picked[0] if picked else None) == view
+
+
+def test_pick_aggregate_needs_an_aligned_origin_and_more_than_one_grain():
+    assert aggregates.pick_aggregate(7200, origin=3600) == ("sensor_data_1h", 3600)
+    assert aggregates.pick_aggregate(7200, origin=1800) == ("sensor_data_15m", 900)
+    assert aggregates.pick_aggregate(7200, origin=1830) is None
+    # no grain boundary between start and end: raw rows
+    assert aggregates.pick_aggregate(60, start=10, end=50) is None
+
+
+def test_grain_bounds_split_off_partial_edge_grains():
+    assert aggregates.grain_bounds(3600, 1800, 4 * 3600 + 10) == (3600, 4 * 3600)
+    assert aggregates.grain_bounds(3600, 3600, 7200) == (3600, 7200)
+    assert aggregates.grain_bounds(3600, None, 7300) == (None, 7200)
+    assert aggregates.grain_bounds(3600, 100, 200) is None
+
+
+def _bucket_avgs(readings, bucket_size):
+    sums = {}
+    for ts, value in readings:
+        b = ts // bucket_size * bucket_size
+        total, count = sums.get(b, (0.0, 0))
+        sums[b] = (total + value, count + 1)
+    return {b: (total / count, count) for b, (total, count) in sums.items()}
+
+
+def test_aggregate_path_matches_raw_rows_for_an_unaligned_window():
+    # 7 days in 360 buckets starting mid-hour: the shape of a chart request from "now"
+    readings = [(ts, float(ts % 997)) for ts in range(0, 9 * 86400, 30)]
+    start, end = 86400 + 1234, 8 * 86400 + 567
+    bucket_size = -(-(end - start) // 360)
+    bucket_size -= bucket_size % 60  # an interval the 1 m grain divides
+    view, grain = aggregates.pick_aggregate(bucket_size, start, end)
+    assert grain == 60
+
+    # what the view holds: per-grain sums and counts over all readings
+    grains = _bucket_avgs(readings, grain)
+    whole_from, whole_to = aggregates.grain_bounds(grain, start, end)
+    edges = [(ts, v) for ts, v in readings if start <= ts < whole_from or whole_to <= ts <= end]
+    combined = {}
+    for b, (avg, count) in grains.items():
+        if whole_from <= b < whole_to:
+            combined.setdefault(b // bucket_size * bucket_size, []).append((avg * count, count))
+    for b, (avg, count) in _bucket_avgs(edges, grain).items():
+        combined.setdefault(b // bucket_size * bucket_size, []).append((avg * count, count))
+    from_aggregate = {
+        b: (sum(s for s, _ in parts) / sum(c for _, c in parts), sum(c for _, c in parts))
+        for b, parts in combined.items()
+    }
+
+    raw = _bucket_avgs([(ts, v) for ts, v in readings if start <= ts <= end], bucket_size)
+    assert from_aggregate.keys() == raw.keys()
+    for b, (avg, count) in raw.items():
+        assert from_aggregate[b][1] == count
+        assert from_aggregate[b][0] == pytest.approx(avg)
+
+
+def test_pick_aggregate_can_be_disabled(mocker):
+    mocker.patch.object(aggregates, "USE_CONTINUOUS_AGGREGATES", False)
+    assert aggregates.pick_aggregate(7200) is None
+
+
+def test_aggregate_expr_reaggregates_grain_columns():
+    assert aggregates.aggregate_expr("pollen", "avg") == "SUM(pollen_sum) / NULLIF(SUM(pollen_count), 0)"
+    assert aggregates.aggregate_expr("pollen", "last") == "last(pollen_last, bucket)"
+    with pytest.raises(ValueError):
+        aggregates.aggregate_expr("pollen", "median")
+
+
+def test_missing_aggregate_only_matches_undefined_views(mocker):
+    from psycopg2 import errors
+    mocker.patch.object(aggregates, "_views_missing", False)
+
+    assert aggregates.missing_aggregate(errors.UndefinedTable("x"), "sensor_data") is False
+    assert aggregates.missing_aggregate(errors.QueryCanceled("x"), "sensor_data_1h") is False
+    assert aggregates.pick_aggregate(7200) == ("sensor_data_1h", 3600)
+    assert aggregates.missing_aggregate(errors.UndefinedTable("x"), "sensor_data_1h") is True
+    assert aggregates.pick_aggregate(7200) is None
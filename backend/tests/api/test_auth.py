@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask
+
+import auth
+from auth import JWKSCache, TokenCache
+
+
+@pytest.fixture(scope="module")
+def rsa_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def jwks_response(mocker, rsa_key, kid="k1"):
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(rsa_key.public_key()))
+    jwk.update({"kid": kid, "kty": "RSA"})
+    response = mocker.MagicMock()
+    response.json.return_value = {"keys": [jwk]}
+    return response
+
+
+def make_token(rsa_key, kid="k1", azp="frontend", exp_in=300):
+    claims = {"sub": "user", "azp": azp, "exp": int(time.time()) + exp_in}
+    return jwt.encode(claims, rsa_key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def fresh_caches(mocker):
+    mocker.patch("auth.log_event")
+    mocker.patch("auth.CLIENT_ID", "frontend")
+    mocker.patch("auth.jwks_cache", JWKSCache("http://keycloak/jwks", min_refresh_interval_s=30))
+    mocker.patch("auth.token_cache", TokenCache(100))
+
+
+def test_keys_fetched_once_for_many_requests(mocker, rsa_key, fresh_caches):
+    mock_get = mocker.patch("auth.requests.get", return_value=jwks_response(mocker, rsa_key))
+
+    for _ in range(3):
+        assert auth.validate_token(make_token(rsa_key, exp_in=300 + _))["sub"] == "user"
+
+    mock_get.assert_called_once()
+    assert mock_get.call_args.kwargs["timeout"] == 5.0
+
+
+def test_validated_token_is_memoized(mocker, rsa_key, fresh_caches):
+    mocker.patch("auth.requests.get", return_value=jwks_response(mocker, rsa_key))
+    token = make_token(rsa_key)
+    auth.validate_token(token)
+
+    mock_decode = mocker.patch("auth.jwt.decode")
+    assert auth.validate_token(token)["sub"] == "user"
+    mock_decode.assert_not_called()
+
+
+def test_unknown_kid_forces_refresh_but_rate_limited(mocker, rsa_key, fresh_caches):
+    mock_get = mocker.patch(
+        "auth.requests.get",
+        side_effect=[jwks_response(mocker, rsa_key, "k1"), jwks_response(mocker, rsa_key, "k2")],
+    )
+    auth.validate_token(make_token(rsa_key, kid="k1"))
+
+    with pytest.raises(Exception, match="Public key not found"):
+        auth.validate_token(make_token(rsa_key, kid="k2"))  # rotation inside the rate limit window
+    assert mock_get.call_count == 1
+
+    auth.jwks_cache._attempted_at -= 31
+    assert auth.validate_token(make_token(rsa_key, kid="k2"))["sub"] == "user"
+    assert mock_get.call_count == 2
+
+
+def test_failed_refresh_keeps_existing_keys(mocker, rsa_key, fresh_caches):
+    mocker.patch("auth.requests.get", return_value=jwks_response(mocker, rsa_key))
+    auth.jwks_cache.refresh()
+    auth.jwks_cache._attempted_at -= 31
+    mocker.patch("auth.requests.get", side_effect=Exception("keycloak down"))
+
+    assert auth.jwks_cache.refresh() is False
+    assert auth.jwks_cache.get_key("k1") is not None
+
+
+def test_background_refresh_does_not_block_requests(mocker, rsa_key, fresh_caches):
+    mocker.patch("auth.requests.get", return_value=jwks_response(mocker, rsa_key))
+    cache = auth.jwks_cache
+    cache.refresh()
+    cache._fetched_at -= cache.refresh_interval_s + 1
+    cache._attempted_at -= 31
+
+    started, release = threading.Event(), threading.Event()
+    response = jwks_response(mocker, rsa_key)
+
+    def slow_get(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return response
+
+    mocker.patch("auth.requests.get", side_effect=slow_get)
+    assert cache.get_key("k1") is not None  # starts the background fetch
+    assert started.wait(2)
+
+    # Keycloak is still answering: requests are served from the current keys
+    t0 = time.monotonic()
+    assert cache.get_key("k1") is not None
+    assert time.monotonic() - t0 < 1
+    assert cache._lock.acquire(timeout=1)
+    cache._lock.release()
+    release.set()
+    deadline = time.monotonic() + 2
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache._refreshing is False
+
+
+def test_azp_mismatch_is_rejected_and_not_cached(mocker, rsa_key, fresh_caches):
+    mocker.patch("auth.requests.get", return_value=jwks_response(mocker, rsa_key))
+    token = make_token(rsa_key, azp="other")
+
+    with pytest.raises(Exception, match="Authorized party mismatch"):
+        auth.validate_token(token)
+    assert auth.token_cache.get(token) is None
+
+
+def test_expired_memo_entry_is_dropped():
+    cache = TokenCache(10)
+    cache.put("t", {"exp": time.time() - 1})
+    assert cache.get("t") is None
+
+
+def test_token_required_returns_401_for_invalid_token(mocker, fresh_caches):
+    app = Flask(__name__)
+    view = auth.token_required(lambda: ({"ok": True}, 200))
+
+    with app.test_request_context(headers={"Authorization": "Bearer not-a-jwt"}):
+        body, status = view()
+    assert status == 401
+    assert body["message"] == "Token is invalid"
@@ -29,6 +29,54 @@ def test_comparison_endpoint_basic(client, mocker):
     assert json_data['metric'] == 'temperature'
     assert 'start' in json_data and 'end' in json_data
 
+COMPARE_RESULT = {
+    'data': {
+        'device_1': [{'timestamp': 1609459200, 'value': 20.5}, {'timestamp': 1609459260, 'value': None}],
+        'device_2': [{'timestamp': 1609459200, 'value': 20.2}],
+    },
+    'message': None,
+    'status': 'success',
+}
+
+@patch("api.comparison.Comparison.method_decorators", [mock_token_required])
+def test_comparison_columnar_and_delta_formats(client, mocker):
+    mocker.patch('api.comparison.compare_devices_over_time', return_value=COMPARE_RESULT)
+
+    columnar = client.get('/api/comparison?device_1=1&device_2=2&metric=temperature&format=columnar').get_json()
+    delta = client.get(
+        '/api/comparison?device_1=1&device_2=2&metric=temperature',
+        headers={"Accept": "application/vnd.altbau.delta+json"},
+    ).get_json()
+
+    assert columnar['format'] == 'columnar'
+    assert columnar['device_1'] == {'timestamps': [1609459200, 1609459260], 'values': [20.5, None]}
+    assert delta['format'] == 'delta'
+    assert delta['device_1']['timestamps'] == [1609459200, 60]
+
+@patch("api.comparison.Comparison.method_decorators", [mock_token_required])
+def test_comparison_float32_format_is_packed_binary(client, mocker):
+    import struct
+    mocker.patch('api.comparison.compare_devices_over_time', return_value=COMPARE_RESULT)
+
+    response = client.get('/api/comparison?device_1=1&device_2=2&metric=temperature&format=float32')
+
+    assert response.status_code == 200
+    assert response.headers['X-Series'] == 'device_1=2,device_2=1'
+    body = response.get_data()
+    assert len(body) == (2 + 2) * 4 + (1 + 1) * 4
+    ts = struct.unpack('<2I', body[:8])
+    values = struct.unpack('<2f', body[8:16])
+    assert ts == (1609459200, 1609459260)
+    assert values[0] == struct.unpack('<f', struct.pack('<f', 20.5))[0]
+    assert values[1] != values[1]  # NaN for missing
+
+@patch("api.comparison.Comparison.method_decorators", [mock_token_required])
+def test_comparison_unknown_format_is_400(client, mocker):
+    mock_compare = mocker.patch('api.comparison.compare_devices_over_time')
+    response = client.get('/api/comparison?device_1=1&device_2=2&metric=temperature&format=xml')
+    assert response.status_code == 400
+    mock_compare.assert_not_called()
+
 @patch("api.comparison.Comparison.method_decorators", [mock_token_required])
 def test_comparison_endpoint_missing_metric(client):
     response = client.get('/api/comparison?device_1=1&device_2=2')
@@ -111,4 +159,113 @@ def test_comparison_endpoint_app_error_maps_500(client, mocker):
     mocker.patch('api.comparison.compare_devices_over_time', side_effect=AppError('app layer fail'))
     resp = client.get('/api/comparison?device_1=1&metric=temperature')
     assert resp.status_code == 500
-    assert resp.get_json()['message'] == 'app layer fail'
\ No newline at end of file
+    assert resp.get_json()['message'] == 'app layer fail'
+
+def _db_cursor(mocker, use_aggregates=False):
+    from api.db import comparison as db_comparison
+    mocker.patch.object(db_comparison, "log_event")
+    mocker.patch("api.db.aggregates.USE_CONTINUOUS_AGGREGATES", use_aggregates)
+    conn = mocker.patch.object(db_comparison, "get_db_connection").return_value
+    return db_comparison, conn, conn.cursor.return_value
+
+
+def test_compare_bucketed_is_one_sargable_query_with_raw_count(mocker):
+    db_comparison, conn, cursor = _db_cursor(mocker)
+    cursor.fetchall.return_value = [
+        {"device_id": 1, "bucket_start": 1000, "avg_value": 20.5, "total_raw_entries": 300, "bucket_size": 60},
+        {"device_id": 2, "bucket_start": 1000, "avg_value": 21.0, "total_raw_entries": 300, "bucket_size": 60},
+    ]
+
+    result = db_comparison.compare_devices_over_time(1, 2, "temperature", 1000, 1600, 10)
+
+    cursor.execute.assert_called_once()
+    query = cursor.execute.call_args.args[0]
+    assert "time_bucket(" in query
+    assert "timestamp >= TO_TIMESTAMP(%(start)s)" in query
+    assert "EXTRACT(EPOCH FROM timestamp) >=" not in query
+    assert "COUNT(*) FROM sensor_data" not in query
+    assert result["raw_count"] == 300
+    assert result["data"]["device_1"] == [{"timestamp": 1000, "value": 20.5}]
+    assert result["message"] is None
+    conn.close.assert_called_once()
+
+
+def test_compare_bucketed_falls_back_to_raw_rows_when_sparse(mocker):
+    db_comparison, _, cursor = _db_cursor(mocker)
+    cursor.fetchall.side_effect = [
+        [{"device_id": 1, "bucket_start": 1000, "avg_value": 20.5, "total_raw_entries": 2, "bucket_size": 60}],
+        [
+            {"device_id": 1, "unix_timestamp_seconds": 1000, "temperature": 20.0},
+            {"device_id": 1, "unix_timestamp_seconds": 1010, "temperature": 21.0},
+        ],
+    ]
+
+    result = db_comparison.compare_devices_over_time(1, 2, "temperature", 1000, 1600, 10)
+
+    assert cursor.execute.call_count == 2
+    assert len(result["data"]["device_1"]) == 2
+    assert result["message"].startswith("Warning: The number of buckets (10) exceeds")
+
+
+def test_compare_missing_bounds_use_index_probes_in_same_statement(mocker):
+    db_comparison, _, cursor = _db_cursor(mocker)
+    cursor.fetchall.return_value = [
+        {"device_id": 1, "bucket_start": 1000, "avg_value": 20.5, "total_raw_entries": 50, "bucket_size": 60},
+    ]
+
+    db_comparison.compare_devices_over_time(1, 2, "humidity", None, None, 10)
+
+    cursor.execute.assert_called_once()
+    query = cursor.execute.call_args.args[0]
+    assert "ORDER BY timestamp ASC LIMIT 1" in query
+    assert "ORDER BY timestamp DESC LIMIT 1" in query
+    assert "MIN(EXTRACT(EPOCH FROM timestamp))" not in query
+
+
+def test_compare_long_range_reads_the_coarsest_fitting_aggregate(mocker):
+    db_comparison, _, cursor = _db_cursor(mocker, use_aggregates=True)
+    cursor.fetchall.return_value = [
+        {"device_id": 1, "bucket_start": 0, "avg_value": 20.5, "total_raw_entries": 86400, "bucket_size": 7200},
+    ]
+
+    # 30 days in 360 buckets → 7200 s per bucket → hourly aggregate
+    result = db_comparison.compare_devices_over_time(1, 2, "temperature", 0, 30 * 86400, 360)
+
+    query, params = cursor.execute.call_args.args
+    assert "FROM sensor_data_1h" in query
+    # raw rows only for the grain at `end`
+    assert "timestamp >= TO_TIMESTAMP(%(grain_to)s)" in query
+    assert params["grain_to"] == 30 * 86400
+    assert "SUM(temperature_sum) / NULLIF(SUM(temperature_count), 0)" in query
+    assert params["bucket_size"] == 7200
+    assert result["raw_count"] == 86400
+
+
+def test_compare_unaligned_start_does_not_use_coarse_grains(mocker):
+    db_comparison, _, cursor = _db_cursor(mocker, use_aggregates=True)
+    cursor.fetchall.return_value = []
+
+    db_comparison.compare_devices_over_time(1, 2, "temperature", 1234, 1234 + 30 * 86400, 360)
+
+    query = cursor.execute.call_args.args[0]
+    assert "sensor_data_1h" not in query and "sensor_data_15m" not in query
+
+
+def test_compare_without_aggregate_views_uses_the_raw_bucketed_query(mocker):
+    from psycopg2 import errors
+    from api.db import aggregates
+    db_comparison, conn, cursor = _db_cursor(mocker, use_aggregates=True)
+    mocker.patch.object(aggregates, "log_event")
+    mocker.patch.object(aggregates, "_views_missing", False)
+    cursor.execute.side_effect = [errors.UndefinedTable("relation \"sensor_data_1h\" does not exist"), None]
+    cursor.fetchall.return_value = [
+        {"device_id": 1, "bucket_start": 0, "avg_value": 20.5, "total_raw_entries": 86400, "bucket_size": 7200},
+    ]
+
+    result = db_comparison.compare_devices_over_time(1, 2, "temperature", 0, 30 * 86400, 360)
+
+    conn.rollback.assert_called_once()
+    query = cursor.execute.call_args.args[0]
+    assert "FROM sensor_data_1h" not in query
+    assert "time_bucket(" in query
+    assert result["raw_count"] == 86400
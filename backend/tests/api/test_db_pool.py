@@ -0,0 +1,172 @@
+import gc
+from unittest.mock import MagicMock
+
+import pytest
+from psycopg2 import extensions
+
+from api.db import connection
+from api.db.pool import ConnectionPool
+from api.db.metrics import POOL_EVENTS
+from common.exceptions import DatabaseConnectionError
+
+
+def make_raw():
+    raw = MagicMock()
+    raw.closed = 0
+    raw.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+    return raw
+
+
+def make_pool(mocker, **kwargs):
+    mocker.patch("api.db.pool.log_event")
+    raws = []
+
+    def connect():
+        raws.append(make_raw())
+        return raws[-1]
+
+    kwargs.setdefault("stats_interval_s", 0)
+    return ConnectionPool(connect, **kwargs), raws
+
+
+def test_close_returns_connection_for_reuse(mocker):
+    pool, raws = make_pool(mocker, max_size=2)
+    counted = POOL_EVENTS.labels("checkouts")._value.get()
+
+    conn = pool.getconn()
+    conn.cursor()
+    conn.close()
+    again = pool.getconn()
+
+    assert len(raws) == 1
+    raws[0].cursor.assert_called_once()
+    raws[0].close.assert_not_called()
+    assert again.closed == 0
+    assert pool.stats()["checkouts"] == 2
+    assert POOL_EVENTS.labels("checkouts")._value.get() == counted + 2
+    again.close()
+
+
+def test_open_transaction_is_rolled_back_on_return(mocker):
+    pool, raws = make_pool(mocker)
+    conn = pool.getconn()
+    raws[0].get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+
+    conn.close()
+
+    raws[0].rollback.assert_called_once()
+    assert pool.stats()["idle"] == 1
+
+
+def test_connection_returned_after_close_all_is_closed(mocker):
+    pool, raws = make_pool(mocker, max_size=2)
+    busy = pool.getconn()
+    pool.getconn().close()
+
+    pool.close_all()
+    raws[1].close.assert_called_once()
+    raws[0].close.assert_not_called()
+
+    busy.close()
+    raws[0].close.assert_called_once()
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"], stats["in_use"]) == (0, 0, 0)
+
+
+def test_exhausted_pool_times_out(mocker):
+    pool, _ = make_pool(mocker, max_size=1, timeout_s=0.05)
+    held = pool.getconn()
+
+    with pytest.raises(DatabaseConnectionError):
+        pool.getconn()
+
+    stats = pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["utilization"] == 1.0
+    held.close()
+
+
+def test_broken_idle_connection_is_replaced_on_checkout(mocker):
+    pool, raws = make_pool(mocker, check_after_s=0)
+    pool.getconn().close()
+    raws[0].cursor.return_value.__enter__.return_value.execute.side_effect = Exception("server closed the connection")
+
+    conn = pool.getconn()
+
+    assert len(raws) == 2
+    assert conn._raw is raws[1]
+    raws[0].close.assert_called_once()
+    assert pool.stats()["closed_broken"] == 1
+    conn.close()
+
+
+def test_idle_connections_above_min_size_are_evicted(mocker):
+    clock = mocker.patch("api.db.pool.monotonic", return_value=100.0)
+    pool, raws = make_pool(mocker, min_size=1, max_size=3, max_idle_s=60)
+    a, b = pool.getconn(), pool.getconn()
+    a.close()
+    b.close()
+
+    clock.return_value = 200.0
+    pool.getconn().close()
+
+    stats = pool.stats()
+    assert stats["closed_idle"] == 1
+    assert stats["size"] == 1
+    raws[0].close.assert_called_once()
+
+
+def test_dropped_proxy_gives_its_slot_back(mocker):
+    pool, _ = make_pool(mocker, max_size=1)
+    pool.getconn()
+    gc.collect()
+
+    assert pool.stats()["in_use"] == 0
+    pool.getconn().close()
+
+
+def test_pool_started_before_fork_leaves_parent_connections_alone(mocker):
+    pool, raws = make_pool(mocker)
+    pool.getconn().close()
+
+    mocker.patch("api.db.pool.os.getpid", return_value=-1)
+    pool.getconn().close()
+
+    assert len(raws) == 2
+    raws[0].close.assert_not_called()
+
+
+def test_get_db_connection_uses_pool_unless_disabled(mocker):
+    mocker.patch.object(connection, "check_db_config")
+    mocker.patch.object(connection, "_pool", None)
+    raw_connect = mocker.patch.object(connection, "_connect", side_effect=lambda: make_raw())
+
+    mocker.patch.dict(connection.DB_POOL_CONFIG, {"max_size": 2, "stats_interval_s": 0})
+    connection.get_db_connection().close()
+    connection.get_db_connection().close()
+    assert raw_connect.call_count == 1
+
+    mocker.patch.dict(connection.DB_POOL_CONFIG, {"max_size": 0})
+    conn = connection.get_db_connection()
+    assert raw_connect.call_count == 2
+    conn.close()
+
+
+def test_init_worker_replaces_inherited_pool_and_starts_caches(mocker):
+    from api.db import worker
+
+    pool, raws = make_pool(mocker, min_size=2)
+    pool.getconn().close()  # opened in the master before fork
+    mocker.patch.object(worker, "get_pool", return_value=pool)
+    latest = mocker.patch.object(worker, "get_latest_cache")
+    registry = mocker.patch.object(worker, "get_device_registry")
+    mocker.patch.object(worker, "log_event")
+
+    mocker.patch("api.db.pool.os.getpid", return_value=-1)
+    worker.init_worker()
+
+    assert pool.stats()["size"] == 2
+    assert len(raws) == 3
+    raws[0].close.assert_not_called()
+    latest.assert_called_once()
+    registry.assert_called_once()
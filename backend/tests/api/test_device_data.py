@@ -1,3 +1,4 @@
+import pytest
 import psycopg2
 from common.exceptions import DatabaseError, DatabaseOperationalError, DatabaseQueryTimeoutError
 from unittest.mock import patch
@@ -113,4 +114,198 @@ def test_device_data_db_generic_maps_500_and_logs(client, mocker):
     resp = client.get('/api/devices/1/data')
     assert resp.status_code == 500
     assert resp.get_json()['message'] == 'A database error occurred while processing your request.'
-    assert ("ERROR", "device_data.db_error") in [(c.args[1], c.args[2]) for c in mock_log.call_args_list]
\ No newline at end of file
+    assert ("ERROR", "device_data.db_error") in [(c.args[1], c.args[2]) for c in mock_log.call_args_list]
+@patch("api.device_data.DeviceData.method_decorators", [mock_token_required])
+def test_device_data_buckets_are_turned_into_interval(client, mocker):
+    mocker.patch('api.device_data.log_event')
+    mocker.patch('api.device_data.device_exists', return_value=True)
+    mock_get = mocker.patch('api.device_data.get_device_data_from_db', return_value=[{"unix_timestamp_seconds": 0, "temperature": 21.0}])
+
+    response = client.get('/api/devices/1/data?start=0&end=86400&buckets=100&agg=max')
+
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data['interval'] == 864
+    assert json_data['agg'] == 'max'
+    assert mock_get.call_args.kwargs['interval'] == 864
+    assert mock_get.call_args.kwargs['agg'] == 'max'
+
+@patch("api.device_data.DeviceData.method_decorators", [mock_token_required])
+def test_device_data_invalid_downsampling_params_are_400(client, mocker):
+    mocker.patch('api.device_data.log_event')
+    mock_exists = mocker.patch('api.device_data.device_exists', return_value=True)
+
+    assert client.get('/api/devices/1/data?buckets=100').status_code == 400  # no range
+    assert client.get('/api/devices/1/data?start=0&end=10&buckets=5&interval=60').status_code == 400
+    assert client.get('/api/devices/1/data?interval=0').status_code == 400
+    mock_exists.assert_not_called()
+
+def test_get_device_data_from_db_aggregates_with_time_bucket(mocker):
+    from api.db import device_data as db_device_data
+    mocker.patch.object(db_device_data, 'log_event')
+    mocker.patch("api.db.aggregates.USE_CONTINUOUS_AGGREGATES", False)
+    conn = mocker.patch.object(db_device_data, 'get_db_connection').return_value
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [{"device_id": 1, "unix_timestamp_seconds": 3600, "pollen": 4}]
+
+    rows = db_device_data.get_device_data_from_db(1, metric="pollen", start=1800, end=7200, interval=3600, agg="last")
+
+    query, params = cursor.execute.call_args.args
+    assert "time_bucket(%s * INTERVAL '1 second', timestamp)" in query
+    assert "last(pollen, timestamp) AS pollen" in query
+    assert "GROUP BY 1, 2 ORDER BY 2" in query
+    assert params == (3600, 1, 1800, 7200)
+    assert rows == [{"device_id": 1, "unix_timestamp_seconds": 3600, "pollen": 4}]
+    conn.close.assert_called_once()
+
+def test_get_device_data_from_db_rejects_unknown_agg():
+    from api.db import get_device_data_from_db
+    with pytest.raises(ValueError):
+        get_device_data_from_db(1, start=0, end=100, buckets=10, agg="median")
+
+def test_get_device_data_from_db_uses_continuous_aggregate_for_wide_buckets(mocker):
+    from api.db import device_data as db_device_data
+    mocker.patch.object(db_device_data, 'log_event')
+    mocker.patch("api.db.aggregates.USE_CONTINUOUS_AGGREGATES", True)
+    conn = mocker.patch.object(db_device_data, 'get_db_connection').return_value
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = []
+
+    db_device_data.get_device_data_from_db(1, metric="humidity", start=1800, end=86400 + 100, interval=1800, agg="max")
+
+    query, params = cursor.execute.call_args.args
+    assert "FROM sensor_data_15m" in query
+    assert "MAX(humidity_max) AS humidity" in query
+    # whole grains from the view, the partial last grain from raw rows up to `end`
+    assert "bucket >= TO_TIMESTAMP(%(grain_from)s)" in query
+    assert "bucket < TO_TIMESTAMP(%(grain_to)s)" in query
+    assert "timestamp <= TO_TIMESTAMP(%(grain_end)s)" in query
+    assert params["bucket_size"] == 1800 and params["device_id"] == 1
+    assert (params["grain_from"], params["grain_to"], params["grain_end"]) == (1800, 86400, 86500)
+
+
+def test_get_device_data_from_db_reads_the_partial_first_grain_from_raw_rows(mocker):
+    from api.db import device_data as db_device_data
+    mocker.patch.object(db_device_data, 'log_event')
+    mocker.patch("api.db.aggregates.USE_CONTINUOUS_AGGREGATES", True)
+    conn = mocker.patch.object(db_device_data, 'get_db_connection').return_value
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = []
+
+    db_device_data.get_device_data_from_db(1, metric="humidity", start=1000, end=86400, interval=3600)
+
+    query, params = cursor.execute.call_args.args
+    assert "FROM sensor_data_1h" in query
+    assert "timestamp >= TO_TIMESTAMP(%(grain_start)s) AND timestamp < TO_TIMESTAMP(%(grain_from)s)" in query
+    assert (params["grain_start"], params["grain_from"]) == (1000, 3600)
+
+def test_get_device_data_from_db_falls_back_to_raw_rows_without_aggregate_views(mocker):
+    from psycopg2 import errors
+    from api.db import device_data as db_device_data, aggregates
+    mocker.patch.object(db_device_data, 'log_event')
+    mocker.patch.object(aggregates, 'log_event')
+    mocker.patch.object(aggregates, "USE_CONTINUOUS_AGGREGATES", True)
+    mocker.patch.object(aggregates, "_views_missing", False)
+    conn = mocker.patch.object(db_device_data, 'get_db_connection').return_value
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.execute.side_effect = [errors.UndefinedTable("relation \"sensor_data_15m\" does not exist"), None]
+    cursor.fetchall.return_value = []
+
+    db_device_data.get_device_data_from_db(1, metric="humidity", start=1800, end=86400, interval=1800)
+
+    conn.rollback.assert_called_once()
+    query, _ = cursor.execute.call_args.args
+    assert "FROM sensor_data\n" in query
+    # later requests of this process skip the views right away
+    assert aggregates.pick_aggregate(1800) is None
+
+@patch("api.device_data.DeviceData.method_decorators", [mock_token_required])
+def test_device_data_stream_json_matches_buffered_shape(client, mocker):
+    mocker.patch('api.device_data.log_event')
+    mocker.patch('api.device_data.device_exists', return_value=True)
+    mock_stream = mocker.patch(
+        'api.device_data.stream_device_data_from_db',
+        return_value=iter([[{"unix_timestamp_seconds": 1, "temperature": 20.5}], [{"unix_timestamp_seconds": 2, "temperature": 21.0}]]),
+    )
+
+    response = client.get('/api/devices/1/data?start=1&end=1000&stream=json')
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    body = response.get_json()
+    assert body["status"] == "success"
+    assert body["start"] == 1
+    assert [r["unix_timestamp_seconds"] for r in body["data"]] == [1, 2]
+    mock_stream.assert_called_once_with(1, metric=None, start=1, end=1000, interval=None, agg="avg")
+
+@patch("api.device_data.DeviceData.method_decorators", [mock_token_required])
+def test_device_data_stream_ndjson_via_accept_header(client, mocker):
+    mock_log = mocker.patch('api.device_data.log_event')
+    mocker.patch('api.device_data.device_exists', return_value=True)
+    mocker.patch(
+        'api.device_data.stream_device_data_from_db',
+        return_value=iter([[{"unix_timestamp_seconds": 1}, {"unix_timestamp_seconds": 2}]]),
+    )
+
+    response = client.get('/api/devices/1/data', headers={"Accept": "application/x-ndjson"})
+
+    assert response.mimetype == "application/x-ndjson"
+    assert response.get_data(as_text=True) == '{"unix_timestamp_seconds":1}\n{"unix_timestamp_seconds":2}\n'
+    assert ("INFO", "device_data.stream.ok") in [(c.args[1], c.args[2]) for c in mock_log.call_args_list]
+
+@patch("api.device_data.DeviceData.method_decorators", [mock_token_required])
+def test_device_data_stream_timeout_before_first_byte_maps_504(client, mocker):
+    mocker.patch('api.device_data.log_event')
+    mocker.patch('api.device_data.device_exists', return_value=True)
+    mocker.patch('api.device_data.stream_device_data_from_db', side_effect=DatabaseQueryTimeoutError('timeout'))
+
+    response = client.get('/api/devices/1/data?stream=ndjson')
+    assert response.status_code == 504
+
+@patch("api.device_data.DeviceData.method_decorators", [mock_token_required])
+def test_device_data_invalid_stream_format_is_400(client, mocker):
+    mocker.patch('api.device_data.log_event')
+    mocker.patch('api.device_data.device_exists', return_value=True)
+
+    response = client.get('/api/devices/1/data?stream=csv')
+    assert response.status_code == 400
+
+def test_stream_device_data_uses_named_cursor_and_closes(mocker):
+    from api.db.device_data import stream_device_data_from_db
+    mocker.patch('api.db.device_data.log_event')
+    cursor = mocker.MagicMock()
+    cursor.fetchmany.side_effect = [[{"device_id": 1, "temperature": 20}], [{"device_id": 1, "temperature": 21}], []]
+    conn = mocker.MagicMock()
+    conn.cursor.return_value = cursor
+    mocker.patch('api.db.device_data.get_db_connection', return_value=conn)
+    mocker.patch('api.db.aggregates.USE_CONTINUOUS_AGGREGATES', False)
+
+    batches = stream_device_data_from_db(1, metric="temperature", batch_size=1)
+    cursor.execute.assert_called_once()  # query already running before iteration
+    assert conn.cursor.call_args.kwargs["name"].startswith("device_data_")
+
+    assert [row for batch in batches for row in batch] == [{"device_id": 1, "temperature": 20}, {"device_id": 1, "temperature": 21}]
+    cursor.close.assert_called_once()
+    conn.close.assert_called_once()
+
+@patch("api.device_data.DeviceData.method_decorators", [mock_token_required])
+def test_device_data_columnar_format(client, mocker):
+    mocker.patch('api.device_data.log_event')
+    mocker.patch('api.device_data.device_exists', return_value=True)
+    mocker.patch('api.device_data.get_device_data_from_db', return_value=[
+        {"device_id": 1, "unix_timestamp_seconds": 100, "temperature": 20.5},
+        {"device_id": 1, "unix_timestamp_seconds": 130, "temperature": 21.0},
+    ])
+
+    body = client.get('/api/devices/1/data?metric=temperature&format=delta').get_json()
+
+    assert body['format'] == 'delta'
+    assert body['data'] == {"timestamps": [100, 30], "temperature": [20.5, 21.0]}
+
+@patch("api.device_data.DeviceData.method_decorators", [mock_token_required])
+def test_device_data_stream_with_columnar_format_is_400(client, mocker):
+    mocker.patch('api.device_data.log_event')
+    mocker.patch('api.device_data.device_exists', return_value=True)
+
+    response = client.get('/api/devices/1/data?stream=json&format=columnar')
+    assert response.status_code == 400
@@ -1,10 +1,20 @@
 import psycopg2
 from common.exceptions import DatabaseError, DatabaseOperationalError, DatabaseQueryTimeoutError
+import pytest
 from unittest.mock import patch
 
+from api.db.latest_cache import LatestCache
+
 def mock_token_required(f):
     return f
 
+@pytest.fixture(autouse=True)
+def latest_cache(mocker):
+    # fresh cache per test, no listener thread
+    cache = LatestCache(ttl_s=5)
+    mocker.patch('api.device_latest.get_latest_cache', return_value=cache)
+    return cache
+
 @patch("api.device_latest.DeviceLatest.method_decorators", [mock_token_required])
 def test_device_latest_basic(client, mocker):
     mock_log = mocker.patch('api.device_latest.log_event')
@@ -23,6 +33,7 @@ def test_device_latest_basic(client, mocker):
 def test_device_latest_missing_device(client, mocker):
     mock_log = mocker.patch('api.device_latest.log_event')
     mocker.patch('api.device_latest.device_exists', return_value=False)
+    mocker.patch('api.device_latest.get_latest_device_data_from_db', return_value=[])
     
     response = client.get('/api/devices/999/latest')
     assert response.status_code == 404
@@ -112,4 +123,35 @@ def test_device_latest_db_generic_maps_500_and_logs(client, mocker):
     resp = client.get('/api/devices/1/latest')
     assert resp.status_code == 500
     assert resp.get_json()['message'] == 'database error'
-    assert ("ERROR", "device_latest.db_error") in [(c.args[1], c.args[2]) for c in mock_log.call_args_list]
\ No newline at end of file
+    assert ("ERROR", "device_latest.db_error") in [(c.args[1], c.args[2]) for c in mock_log.call_args_list]
+
+@patch("api.device_latest.DeviceLatest.method_decorators", [mock_token_required])
+def test_device_latest_second_request_served_from_cache(client, mocker, latest_cache):
+    mock_log = mocker.patch('api.device_latest.log_event')
+    mock_exists = mocker.patch('api.device_latest.device_exists', return_value=True)
+    mock_latest = mocker.patch('api.device_latest.get_latest_device_data_from_db', return_value={"device_id": 1, "temperature": 21.5})
+
+    first = client.get('/api/devices/1/latest')
+    second = client.get('/api/devices/1/latest')
+
+    assert first.get_json() == second.get_json()
+    mock_latest.assert_called_once_with(1)
+    mock_exists.assert_not_called()
+    caches = [c.kwargs.get("cache") for c in mock_log.call_args_list if c.args[2] == "device_latest.ok"]
+    assert caches == ["miss", "hit"]
+
+@patch("api.device_latest.DeviceLatest.method_decorators", [mock_token_required])
+def test_device_latest_notify_invalidates_cached_row(client, mocker, latest_cache):
+    mocker.patch('api.device_latest.log_event')
+    mocker.patch('api.device_latest.device_exists', return_value=True)
+    mock_latest = mocker.patch(
+        'api.device_latest.get_latest_device_data_from_db',
+        side_effect=[{"device_id": 1, "temperature": 21.5}, {"device_id": 1, "temperature": 22.0}],
+    )
+
+    client.get('/api/devices/1/latest')
+    latest_cache.on_notify("1")
+    resp = client.get('/api/devices/1/latest')
+
+    assert mock_latest.call_count == 2
+    assert resp.get_json()['data']['temperature'] == 22.0
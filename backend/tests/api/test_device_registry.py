@@ -0,0 +1,96 @@
+from unittest.mock import MagicMock
+
+from api.db.device_registry import DeviceRegistry
+from api.db.notifications import parse_written
+from api.db.validation import validate_timestamps_and_range
+from api.db.devices import device_exists
+
+
+def make_registry(mocker, rows):
+    mocker.patch("api.db.device_registry.log_event")
+    load = MagicMock(return_value=rows)
+    return DeviceRegistry(load, reconcile_interval_s=300), load
+
+
+def test_loaded_once_then_answered_from_memory(mocker):
+    registry, load = make_registry(mocker, [{"device_id": 1, "start": 100, "end": 200}])
+
+    assert registry.exists(1) is True
+    assert registry.exists(2) is False
+    assert registry.get(1) == {"device_id": 1, "start": 100, "end": 200}
+    load.assert_called_once()
+
+
+def test_notifications_widen_ranges_and_add_devices(mocker):
+    registry, _ = make_registry(mocker, [{"device_id": 1, "start": 100, "end": 200}])
+    registry.ranges()
+
+    registry.on_notify("1:150:260")
+    registry.on_notify("3:500:510")
+
+    assert registry.ranges() == [
+        {"device_id": 1, "start": 100, "end": 260},
+        {"device_id": 3, "start": 500, "end": 510},
+    ]
+
+
+def test_reconnect_triggers_background_reconcile(mocker):
+    registry, load = make_registry(mocker, [{"device_id": 1, "start": 100, "end": 200}])
+    registry.ranges()
+    thread = mocker.patch("api.db.device_registry.threading.Thread")
+
+    registry.on_notify(None)
+    registry.exists(1)
+
+    thread.assert_called_once()
+    assert thread.call_args.kwargs["target"] == registry._reconcile
+
+
+def test_parse_written_payloads():
+    assert parse_written("4:10:20") == (4, 10, 20)
+    assert parse_written("4") == (4, None, None)
+    assert parse_written("x") is None
+    assert parse_written(None) is None
+
+
+def test_validation_uses_registry_and_reloads_before_rejecting(mocker):
+    registry, load = make_registry(mocker, [{"device_id": 1, "start": 100, "end": 200}])
+    mocker.patch("api.db.validation.get_device_registry", return_value=registry)
+    mocker.patch("api.db.validation.log_event")
+
+    assert validate_timestamps_and_range(1, 2, 150, 300) == (True, None)
+    assert load.call_count == 1
+
+    load.return_value = [{"device_id": 1, "start": 100, "end": 400}]
+    assert validate_timestamps_and_range(1, None, 300, 500) == (True, None)  # registry was behind
+    assert load.call_count == 2
+
+    ok, msg = validate_timestamps_and_range(5, None, 150, 300)
+    assert ok is False
+    assert msg == "No overlapping data available for device ID 5 in the specified time range."
+
+
+def test_forced_reload_is_rate_limited(mocker):
+    clock = mocker.patch("api.db.device_registry.monotonic", return_value=1000.0)
+    registry, load = make_registry(mocker, [{"device_id": 1, "start": 100, "end": 200}])
+    mocker.patch("api.db.validation.get_device_registry", return_value=registry)
+    mocker.patch("api.db.validation.log_event")
+
+    for _ in range(3):
+        assert validate_timestamps_and_range(5, None, 150, 300)[0] is False
+    assert load.call_count == 2  # initial load + one forced reload
+
+    clock.return_value = 1000.0 + registry.min_reload_interval_s
+    assert validate_timestamps_and_range(5, None, 150, 300)[0] is False
+    assert load.call_count == 3
+
+
+def test_device_exists_checks_db_only_for_unknown_devices(mocker):
+    registry, _ = make_registry(mocker, [{"device_id": 1, "start": 100, "end": 200}])
+    mocker.patch("api.db.devices.get_device_registry", return_value=registry)
+    mock_db = mocker.patch("api.db.devices._device_exists_in_db", return_value=False)
+
+    assert device_exists(1) is True
+    mock_db.assert_not_called()
+    assert device_exists(9) is False
+    mock_db.assert_called_once_with(9)
@@ -0,0 +1,63 @@
+import datetime
+import gzip
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from api import encoding
+
+
+def mock_token_required(f):
+    return f
+
+
+ROW = {"temperature": Decimal("21.50"), "ts": datetime.datetime(2025, 8, 6, 13, 0, tzinfo=datetime.timezone.utc), "pollen": 3}
+
+
+@pytest.mark.parametrize("name", sorted(encoding.ENCODERS))
+def test_encoders_handle_decimal_and_datetime(name):
+    decoded = json.loads(encoding.ENCODERS[name](ROW))
+    assert decoded["temperature"] == 21.5
+    assert decoded["ts"] == "2025-08-06T13:00:00+00:00"
+    assert decoded["pollen"] == 3
+
+
+def many_ranges(n=200):
+    return [{"device_id": i, "start": 1609459200, "end": 1612137600} for i in range(n)]
+
+
+@patch("api.range.TimeRange.method_decorators", [mock_token_required])
+def test_large_response_is_gzipped_when_accepted(client, mocker):
+    mocker.patch("api.range.log_event")
+    mocker.patch("api.range.get_all_device_time_ranges_from_db", return_value=many_ranges())
+
+    response = client.get("/api/range", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    body = json.loads(gzip.decompress(response.get_data()))
+    assert len(body["data"]) == 200
+
+
+@patch("api.range.TimeRange.method_decorators", [mock_token_required])
+def test_small_response_is_not_compressed(client, mocker):
+    mocker.patch("api.range.log_event")
+    mocker.patch("api.range.get_all_device_time_ranges_from_db", return_value=many_ranges(1))
+
+    response = client.get("/api/range", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+
+@patch("api.range.TimeRange.method_decorators", [mock_token_required])
+def test_unchanged_poll_returns_304(client, mocker):
+    mocker.patch("api.range.log_event")
+    mocker.patch("api.range.get_all_device_time_ranges_from_db", return_value=many_ranges())
+
+    first = client.get("/api/range", headers={"Accept-Encoding": "gzip"})
+    etag = first.headers["ETag"]
+    second = client.get("/api/range", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+
+    assert second.status_code == 304
+    assert second.get_data() == b""
@@ -0,0 +1,67 @@
+from unittest.mock import MagicMock
+
+from api.db.latest_cache import LatestCache
+from api.db.notifications import NotificationListener
+
+
+def test_cache_hit_until_ttl_expires(mocker):
+    clock = mocker.patch("api.db.latest_cache.monotonic", return_value=100.0)
+    cache = LatestCache(ttl_s=5)
+    cache.put(1, {"temperature": 21.5}, cache.version())
+
+    assert cache.get(1) == {"temperature": 21.5}
+    clock.return_value = 105.0
+    assert cache.get(1) is None
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_notify_drops_only_that_device_and_none_drops_all():
+    cache = LatestCache(ttl_s=60)
+    cache.put(1, "a", cache.version())
+    cache.put(2, "b", cache.version())
+
+    cache.on_notify("1")
+    assert cache.get(1) is None
+    assert cache.get(2) == "b"
+
+    cache.on_notify(None)  # listener reconnected: anything may have changed
+    assert cache.get(2) is None
+
+
+def test_row_read_before_invalidation_is_not_stored():
+    cache = LatestCache(ttl_s=60)
+    version = cache.version()
+    cache.on_notify("1")  # write lands while the request is still reading
+
+    cache.put(1, "stale", version)
+    assert cache.get(1) is None
+
+
+def test_zero_ttl_disables_caching():
+    cache = LatestCache(ttl_s=0)
+    cache.put(1, "a", cache.version())
+    assert cache.get(1) is None
+
+
+def test_listener_dispatches_payloads_and_reset(mocker):
+    mocker.patch("api.db.notifications.log_event")
+    mocker.patch("api.db.notifications.select.select", return_value=([1], [], []))
+    listener = NotificationListener(MagicMock())
+    received = []
+    listener.subscribe(received.append)
+
+    conn = MagicMock()
+    notify = MagicMock(payload="7")
+
+    def poll():
+        conn.notifies = [notify]
+        listener._stop.set()
+
+    conn.poll.side_effect = poll
+    conn.notifies = []
+    listener._listen(conn)
+
+    assert received == [None, "7"]
+    assert listener.connected is True
+    assert listener.stats["notifications"] == 1
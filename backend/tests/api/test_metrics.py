@@ -0,0 +1,82 @@
+from unittest.mock import patch
+
+import pytest
+
+from api.db import metrics as db_metrics
+from common.exceptions import DatabaseQueryTimeoutError
+
+
+def mock_token_required(f):
+    return f
+
+
+def sample(client, name, **labels):
+    """Value of one sample in the /metrics exposition (None if absent)."""
+    text = client.get("/metrics").get_data(as_text=True)
+    wanted = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    for line in text.splitlines():
+        if line.startswith(f"{name}{{{wanted}}} ") or (not labels and line.startswith(f"{name} ")):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_metrics_endpoint_exposes_prometheus_text(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert b"api_http_request_duration_seconds" in response.data
+
+
+def test_request_duration_is_labelled_by_route_template(client, mocker):
+    labels = {"method": "GET", "route": "/api/devices/<int:device_id>/latest", "status": "400"}
+    before = sample(client, "api_http_request_duration_seconds_count", **labels) or 0
+
+    with patch("api.device_latest.DeviceLatest.method_decorators", [mock_token_required]):
+        mocker.patch("api.device_latest.log_event")
+        client.get("/api/devices/0/latest")
+
+    assert sample(client, "api_http_request_duration_seconds_count", **labels) == before + 1
+    assert sample(client, "api_http_requests_in_flight", route="/api/devices/<int:device_id>/latest") == 0
+
+
+def test_timed_op_records_outcome():
+    @db_metrics.timed_op("test_op")
+    def failing():
+        raise DatabaseQueryTimeoutError("query timeout", details={"op": "test_op"})
+
+    @db_metrics.timed_op("test_op")
+    def ok():
+        return 1
+
+    assert ok() == 1
+    with pytest.raises(DatabaseQueryTimeoutError):
+        failing()
+
+    histogram = db_metrics.DB_OP_SECONDS
+    counts = {
+        s.labels["outcome"]: s.value
+        for metric in histogram.collect() for s in metric.samples
+        if s.name.endswith("_count") and s.labels["op"] == "test_op"
+    }
+    assert counts == {"ok": 1, "timeout": 1}
+
+
+def test_cache_lookups_are_counted_by_the_cache(client):
+    from api.db.latest_cache import LatestCache
+
+    cache = LatestCache(ttl_s=60)
+    hits = sample(client, "api_cache_lookups_total", cache="latest", result="hit") or 0
+    misses = sample(client, "api_cache_lookups_total", cache="latest", result="miss") or 0
+
+    cache.get(1)
+    cache.put(1, {"temperature": 20}, cache.version())
+    cache.get(1)
+    cache.get(1)
+
+    assert sample(client, "api_cache_lookups_total", cache="latest", result="hit") == hits + 2
+    assert sample(client, "api_cache_lookups_total", cache="latest", result="miss") == misses + 1
+
+
+def test_metrics_route_is_local_only(client):
+    response = client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.7"})
+    assert response.status_code == 404
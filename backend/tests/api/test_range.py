@@ -82,4 +82,14 @@ def test_time_range_db_generic_maps_500_and_logs(client, mocker):
     resp = client.get('/api/range')
     assert resp.status_code == 500
     assert resp.get_json()['message'] == 'database error'
-    assert ("ERROR", "time_range.db_error") in [(c.args[1], c.args[2]) for c in mock_log.call_args_list]
\ No newline at end of file
+    assert ("ERROR", "time_range.db_error") in [(c.args[1], c.args[2]) for c in mock_log.call_args_list]
+
+
+def test_cors_exposes_format_and_etag_headers(client, mocker):
+    mocker.patch('api.range.log_event')
+    mocker.patch('api.range.get_all_device_time_ranges_from_db', return_value=[])
+
+    response = client.get('/api/range', headers={"Origin": "http://localhost:3000"})
+
+    exposed = {h.strip() for h in response.headers["Access-Control-Expose-Headers"].split(",")}
+    assert {"X-Series", "X-Columns", "X-Layout", "ETag"} <= exposed
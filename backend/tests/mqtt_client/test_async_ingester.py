@@ -0,0 +1,159 @@
+import asyncio
+from datetime import timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from mqtt_client.async_ingester import AsyncIngester, write_batch, UPSERT_QUERY
+from mqtt_client.dedup import DedupCache
+
+TOPIC = "dhbw/ai/si2023/01/temperature/01"
+PAYLOAD = b'{"value": 22.5, "timestamp": "1722945600", "meta": {"device_id": 1}}'
+
+
+def make_pool():
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    acquire = MagicMock()
+    acquire.__aenter__ = AsyncMock(return_value=conn)
+    acquire.__aexit__ = AsyncMock(return_value=False)
+    pool = MagicMock()
+    pool.acquire.return_value = acquire
+    return pool, conn
+
+
+def test_valid_message_is_queued_as_utc_row(mocker):
+    mocker.patch("mqtt_client.async_ingester.log_event")
+
+    async def scenario():
+        ingester = AsyncIngester(make_pool()[0])
+        assert await ingester.handle_message(TOPIC, PAYLOAD) is True
+        return ingester.queue.get_nowait()
+
+    row = asyncio.run(scenario())
+    assert row[0] == 1
+    assert row[1].tzinfo == timezone.utc
+    assert int(row[1].timestamp()) == 1722945600
+    assert row[2:] == (22.5, None, None, None)
+
+
+def test_invalid_messages_are_rejected_with_shared_logging(mocker):
+    mocker.patch("mqtt_client.async_ingester.log_event")
+    mocker.patch("mqtt_client.main_ingester.log_event")
+    mock_handler_log = mocker.patch("mqtt_client.handler.log_event")
+
+    async def scenario():
+        ingester = AsyncIngester(make_pool()[0])
+        results = [
+            await ingester.handle_message("dhbw/ai/si2023/01/ikea/99", PAYLOAD),  # unknown mapping
+            await ingester.handle_message(TOPIC, b"not json"),
+            await ingester.handle_message(TOPIC, PAYLOAD.replace(b"22.5", b"1000")),  # out of range
+        ]
+        return results, ingester.queue.qsize()
+
+    results, queued = asyncio.run(scenario())
+    assert results == [False, False, False]
+    assert queued == 0
+    assert ("INFO", "value_out_of_range") in [(c.args[1], c.args[2]) for c in mock_handler_log.call_args_list]
+
+
+def test_write_batch_merges_rows_and_sends_column_arrays():
+    pool, conn = make_pool()
+    rows = [
+        (1, "t1", 21.0, None, None, None),
+        (1, "t1", None, 40.0, None, None),
+        (2, "t1", None, None, 5, None),
+    ]
+
+    written = asyncio.run(write_batch(pool, rows))
+
+    assert written == 2
+    query, *columns = conn.execute.call_args.args
+    assert query == UPSERT_QUERY
+    assert columns == [[1, 2], ["t1", "t1"], [21.0, None], [40.0, None], [None, 5], [None, None]]
+
+
+def test_writer_flushes_batches_and_drains_on_stop(mocker):
+    mocker.patch("mqtt_client.async_ingester.log_event")
+    pool, conn = make_pool()
+
+    async def scenario():
+        ingester = AsyncIngester(pool, batch_size=2, batch_max_age_ms=50, writers=1)
+        for i in range(3):
+            await ingester.queue.put((i, "t", 20.0, None, None, None))
+        await ingester.queue.put(None)
+        await ingester.writer()
+        return ingester
+
+    ingester = asyncio.run(scenario())
+    assert conn.execute.await_count == 2
+    assert ingester.stats["rows_written"] == 3
+
+
+def test_failed_batch_is_retried(mocker):
+    mocker.patch("mqtt_client.async_ingester.log_event")
+    mocker.patch("mqtt_client.async_ingester.asyncio.sleep", new=AsyncMock())
+    pool, conn = make_pool()
+    conn.execute.side_effect = [Exception("connection reset"), None]
+
+    async def scenario():
+        ingester = AsyncIngester(pool)
+        await ingester._write_with_retry([(1, "t", 20.0, None, None, None)])
+        return ingester
+
+    ingester = asyncio.run(scenario())
+    assert conn.execute.await_count == 2
+    assert ingester.stats["rows_written"] == 1
+    assert ingester.stats["rows_dropped"] == 0
+
+
+def test_duplicate_from_other_broker_is_not_queued(mocker):
+    mocker.patch("mqtt_client.async_ingester.log_event")
+
+    async def scenario():
+        ingester = AsyncIngester(make_pool()[0], dedup=DedupCache(ttl_s=60))
+        results = [await ingester.handle_message(TOPIC, PAYLOAD) for _ in range(2)]
+        return results, ingester
+
+    results, ingester = asyncio.run(scenario())
+    assert results == [True, False]
+    assert ingester.queue.qsize() == 1
+    assert ingester.dedup.stats["hits"] == 1
+
+
+def test_consumer_survives_a_message_that_raises(mocker):
+    log = mocker.patch("mqtt_client.async_ingester.log_event")
+
+    class Message:
+        def __init__(self, payload):
+            self.topic, self.payload = TOPIC, payload
+
+    async def messages():
+        yield Message(b"boom")
+        yield Message(PAYLOAD)
+        raise asyncio.CancelledError
+
+    client = MagicMock()
+    client.__aenter__ = AsyncMock(return_value=client)
+    client.__aexit__ = AsyncMock(return_value=False)
+    client.subscribe = AsyncMock()
+    client.messages = messages()
+    mocker.patch("mqtt_client.async_ingester.aiomqtt.Client", return_value=client)
+
+    async def scenario():
+        ingester = AsyncIngester(make_pool()[0])
+        handled = []
+
+        async def handle(topic, payload):
+            handled.append(payload)
+            if payload == b"boom":
+                raise TypeError("unhashable type: 'list'")
+            return True
+
+        ingester.handle_message = handle
+        try:
+            await ingester.consume("broker", 1883)
+        except asyncio.CancelledError:
+            pass
+        return handled
+
+    assert asyncio.run(scenario()) == [b"boom", PAYLOAD]
+    assert any(c.args[2] == "unhandled_exception" for c in log.call_args_list)
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from mqtt_client.batch_validation import validate_batch
+from mqtt_client.handler import validate_reading, _REJECT_REASONS
+
+
+def payload(value, timestamp="1722945600", device_id=1):
+    return {"value": value, "timestamp": timestamp, "meta": {"device_id": device_id}}
+
+
+CASES = [
+    ("temperature", payload(22.5)),
+    ("humidity", payload(55)),
+    ("pollen", payload(12.0)),
+    ("particulate_matter", payload(700, device_id=2)),
+    ("pollen", payload(12.3)),                       # non-integer
+    ("temperature", payload(41.0)),                  # out of range
+    ("temperature", payload(float("nan"))),          # out of range
+    ("humidity", payload("NaN")),                    # non-numeric
+    ("co2", payload(400)),                           # unknown metric
+    ("temperature", payload(22.5, timestamp="abc")),  # bad timestamp
+    ("temperature", {"value": 22.5, "timestamp": "1722945600"}),  # no device_id
+    ("temperature", {"timestamp": "1722945600", "meta": {"device_id": 1}}),  # no value
+    ("temperature", {"value": 22.5, "timestamp": "1722945600", "meta": None}),
+    ("humidity", payload(True)),                     # bool counts as int, like isinstance()
+]
+
+
+def _single(metric_name, payload_dict):
+    """(reason, row) from the per-message path."""
+    try:
+        reading = validate_reading(metric_name, payload_dict)
+    except Exception as e:
+        return _REJECT_REASONS[type(e)], None
+    return None, reading.row()
+
+
+def test_same_decisions_and_rows_as_validate_reading():
+    batch = validate_batch(CASES)
+    expected = [_single(m, p) for m, p in CASES]
+
+    assert batch.reasons == [reason for reason, _ in expected]
+    assert batch.rows() == [row for _, row in expected if row is not None]
+    assert batch.index.tolist() == [i for i, (reason, _) in enumerate(expected) if reason is None]
+
+
+def test_columns_are_typed_and_masked():
+    batch = validate_batch([
+        ("temperature", payload(21.5, device_id=1)),
+        ("pollen", payload(30, device_id=2)),
+        ("temperature", payload(99.0)),  # rejected
+    ])
+    cols = batch.columns()
+
+    assert cols["device_id"].dtype == np.int32 and cols["device_id"].tolist() == [1, 2]
+    assert cols["timestamp_s"].tolist() == [1722945600, 1722945600]
+    assert cols["temperature"].dtype == np.float64
+    assert cols["temperature"].tolist() == [21.5, None]
+    assert cols["pollen"].dtype == np.int32
+    assert cols["pollen"].tolist() == [None, 30]
+    assert cols["humidity"].mask.all()
+    assert batch.rejected() == [(2, "out_of_range")]
+
+
+@pytest.mark.parametrize("device_id", ["x", 2 ** 40, None])
+def test_device_id_must_fit_the_int_column(device_id):
+    batch = validate_batch([("temperature", payload(20.0, device_id=device_id))])
+    assert len(batch) == 0
+    assert batch.reasons == ["payload_invalid"]
+
+
+def test_empty_batch():
+    batch = validate_batch([])
+    assert len(batch) == 0 and batch.reasons == [] and batch.rows() == []
@@ -0,0 +1,199 @@
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from mqtt_client.buffered_writer import BufferedWriter
+from mqtt_client.reading import Reading, METRIC_CODES
+from common.exceptions import DatabaseError
+
+TS = datetime(2025, 8, 6, 13, 0, 0)
+
+
+def make_writer(mocker, **kwargs):
+    mocker.patch("mqtt_client.buffered_writer.log_event")
+    conn = MagicMock()
+    conn.closed = False
+    connect = MagicMock(return_value=conn)
+    writer = BufferedWriter(connect, conn=conn, **kwargs)
+    return writer, conn, connect
+
+
+def test_add_below_size_limit_does_not_write(mocker):
+    mock_batch = mocker.patch("mqtt_client.buffered_writer.insert_sensor_data_batch")
+    writer, _, _ = make_writer(mocker, max_rows=3)
+
+    writer.add(1, TS, temperature=21.0)
+    writer.add(1, TS, humidity=40.0)
+
+    mock_batch.assert_not_called()
+    assert writer.pending == 2
+
+
+def test_add_reading_queues_its_row(mocker):
+    mock_batch = mocker.patch("mqtt_client.buffered_writer.insert_sensor_data_batch", return_value=1)
+    writer, conn, _ = make_writer(mocker, max_rows=1)
+    reading = Reading(1, 1722945600, METRIC_CODES["pollen"], 12)
+
+    writer.add_reading(reading)
+    writer.flush_if_due()
+
+    mock_batch.assert_called_once_with(conn, [reading.row()])
+    assert reading.row()[2:] == (None, None, 12, None)
+
+
+def test_size_limit_flushes_one_batch_and_acks_after_commit(mocker):
+    calls = []
+    mocker.patch(
+        "mqtt_client.buffered_writer.insert_sensor_data_batch",
+        side_effect=lambda conn, rows: calls.append(("write", list(rows))) or len(rows),
+    )
+    writer, conn, _ = make_writer(mocker, max_rows=2)
+    ack1 = MagicMock(side_effect=lambda: calls.append(("ack", 1)))
+    ack2 = MagicMock(side_effect=lambda: calls.append(("ack", 2)))
+
+    writer.add(1, TS, ack=ack1, temperature=21.0)
+    writer.add(2, TS, ack=ack2, pollen=5)
+    assert calls == []  # add() never writes itself
+
+    assert writer.flush_if_due() == 2
+    assert calls[0] == ("write", [
+        (1, TS, 21.0, None, None, None),
+        (2, TS, None, None, 5, None),
+    ])
+    assert calls[1:] == [("ack", 1), ("ack", 2)]
+    assert writer.pending == 0
+    assert writer.stats["rows_flushed"] == 2
+
+
+def test_size_limit_is_flushed_by_the_flusher_thread(mocker):
+    flushed = threading.Event()
+    threads = []
+
+    def write(conn, rows):
+        threads.append(threading.current_thread())
+        flushed.set()
+        return len(rows)
+
+    mocker.patch("mqtt_client.buffered_writer.insert_sensor_data_batch", side_effect=write)
+    writer, _, _ = make_writer(mocker, max_rows=2, max_age_ms=60000)
+    writer.start()
+    try:
+        writer.add(1, TS, temperature=21.0)
+        writer.add(2, TS, temperature=22.0)
+        assert flushed.wait(2.0)
+    finally:
+        writer.close()
+
+    assert threads[0].name == "buffered-writer"
+    assert writer.stats["rows_flushed"] == 2
+
+
+def test_failed_size_flush_waits_one_interval_before_retrying(mocker):
+    mock_batch = mocker.patch(
+        "mqtt_client.buffered_writer.insert_sensor_data_batch",
+        side_effect=DatabaseError("db fail"),
+    )
+    writer, _, _ = make_writer(mocker, max_rows=1, max_age_ms=1000)
+    clock = mocker.patch("mqtt_client.buffered_writer.monotonic", return_value=100.0)
+    writer.add(1, TS, temperature=21.0)
+
+    assert writer.flush_if_due() == 0
+    assert writer.flush_if_due() == 0
+    assert mock_batch.call_count == 1
+
+    mock_batch.side_effect = None
+    mock_batch.return_value = 1
+    clock.return_value = 101.0
+    assert writer.flush_if_due() == 1
+
+
+def test_failed_flush_keeps_rows_and_does_not_ack(mocker):
+    mock_batch = mocker.patch(
+        "mqtt_client.buffered_writer.insert_sensor_data_batch",
+        side_effect=DatabaseError("db fail"),
+    )
+    writer, _, _ = make_writer(mocker, max_rows=10)
+    ack = MagicMock()
+    writer.add(1, TS, ack=ack, temperature=21.0)
+
+    assert writer.flush() == 0
+    ack.assert_not_called()
+    assert writer.pending == 1
+    assert writer.stats["flush_failures"] == 1
+
+    # retry succeeds → row written once and acked
+    mock_batch.side_effect = None
+    mock_batch.return_value = 1
+    assert writer.flush() == 1
+    ack.assert_called_once()
+    assert writer.pending == 0
+
+
+def test_requeue_drops_oldest_beyond_buffer_limit(mocker):
+    mocker.patch(
+        "mqtt_client.buffered_writer.insert_sensor_data_batch",
+        side_effect=DatabaseError("db fail"),
+    )
+    writer, _, _ = make_writer(mocker, max_rows=10, max_buffer_rows=10)
+    for i in range(12):
+        writer._pending.append(((i, TS, 20.0, None, None, None), None))
+
+    writer.flush()
+
+    assert writer.pending == 10
+    assert writer.stats["rows_dropped"] == 2
+    assert writer._pending[0][0][0] == 2
+
+
+def test_age_limit_triggers_flush(mocker):
+    mock_batch = mocker.patch("mqtt_client.buffered_writer.insert_sensor_data_batch", return_value=1)
+    writer, _, _ = make_writer(mocker, max_rows=100, max_age_ms=1000)
+    clock = mocker.patch("mqtt_client.buffered_writer.monotonic", return_value=100.0)
+
+    writer.add(1, TS, temperature=21.0)
+    assert writer.flush_if_due() == 0
+
+    clock.return_value = 101.5
+    assert writer.flush_if_due() == 1
+    mock_batch.assert_called_once()
+
+
+def test_reconnects_when_connection_closed(mocker):
+    mocker.patch("mqtt_client.buffered_writer.insert_sensor_data_batch", return_value=1)
+    writer, conn, connect = make_writer(mocker, max_rows=100)
+    conn.closed = True
+    fresh = MagicMock()
+    fresh.closed = False
+    connect.return_value = fresh
+
+    writer.add(1, TS, temperature=21.0)
+    writer.flush()
+
+    connect.assert_called_once()
+
+
+def test_unavailable_db_keeps_rows(mocker):
+    mock_batch = mocker.patch("mqtt_client.buffered_writer.insert_sensor_data_batch")
+    writer, conn, connect = make_writer(mocker, max_rows=100)
+    conn.closed = True
+    connect.return_value = None
+
+    writer.add(1, TS, temperature=21.0)
+
+    assert writer.flush() == 0
+    mock_batch.assert_not_called()
+    assert writer.pending == 1
+
+
+def test_close_flushes_remaining_rows(mocker):
+    mock_batch = mocker.patch("mqtt_client.buffered_writer.insert_sensor_data_batch", return_value=1)
+    writer, conn, _ = make_writer(mocker, max_rows=100, max_age_ms=60000)
+    writer.start()
+    ack = MagicMock()
+    writer.add(1, TS, ack=ack, temperature=21.0)
+
+    writer.close()
+
+    mock_batch.assert_called_once()
+    ack.assert_called_once()
+    conn.close.assert_called_once()
@@ -0,0 +1,103 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from mqtt_client.coalescer import ReadingCoalescer
+from mqtt_client.reading import Reading, METRIC_CODES
+
+TS = datetime(2025, 8, 6, 13, 0, 0)
+
+
+def make_coalescer(mocker, **kwargs):
+    mocker.patch("mqtt_client.coalescer.log_event")
+    clock = mocker.patch("mqtt_client.coalescer.monotonic", return_value=100.0)
+    downstream = MagicMock()
+    return ReadingCoalescer(downstream, **kwargs), downstream, clock
+
+
+def test_complete_row_is_emitted_once_with_all_metrics(mocker):
+    coalescer, downstream, _ = make_coalescer(mocker)
+
+    coalescer.add(1, TS, pollen=5)
+    coalescer.add(1, TS, particulate_matter=9)
+    coalescer.add(1, TS, temperature=21.5)
+    downstream.add.assert_not_called()
+    coalescer.add(1, TS, humidity=40.0)
+
+    downstream.add.assert_called_once()
+    args, kwargs = downstream.add.call_args
+    assert args == (1, TS)
+    assert kwargs == {"ack": None, "pollen": 5, "particulate_matter": 9, "temperature": 21.5, "humidity": 40.0}
+    assert coalescer.stats["upserts_saved"] == 3
+    assert coalescer.stats["rows_complete"] == 1
+    assert coalescer.pending == 0
+
+
+def test_partial_row_is_emitted_after_window(mocker):
+    coalescer, downstream, clock = make_coalescer(mocker, window_ms=2000)
+
+    coalescer.add(1, TS, temperature=21.5)
+    coalescer.add(1, TS, humidity=40.0)
+    coalescer.add(2, TS, temperature=19.0)
+
+    clock.return_value = 101.0
+    assert coalescer.flush_expired() == 0
+
+    clock.return_value = 102.0
+    assert coalescer.flush_expired() == 2
+    emitted = [(c.args, c.kwargs) for c in downstream.add.call_args_list]
+    assert emitted == [
+        ((1, TS), {"ack": None, "temperature": 21.5, "humidity": 40.0}),
+        ((2, TS), {"ack": None, "temperature": 19.0}),
+    ]
+    assert coalescer.stats["rows_expired"] == 2
+
+
+def test_acks_of_merged_readings_travel_with_the_row(mocker):
+    coalescer, downstream, _ = make_coalescer(mocker)
+    ack1, ack2 = MagicMock(), MagicMock()
+
+    coalescer.add(1, TS, ack=ack1, temperature=21.5)
+    coalescer.add(1, TS, ack=ack2, humidity=40.0)
+    coalescer.flush_all()
+
+    downstream.add.call_args.kwargs["ack"]()
+    ack1.assert_called_once()
+    ack2.assert_called_once()
+
+
+def test_oldest_key_is_evicted_beyond_max_keys(mocker):
+    coalescer, downstream, _ = make_coalescer(mocker, max_keys=2)
+
+    coalescer.add(1, TS, temperature=21.5)
+    coalescer.add(2, TS, temperature=22.5)
+    coalescer.add(3, TS, temperature=23.5)
+
+    downstream.add.assert_called_once()
+    assert downstream.add.call_args.args == (1, TS)
+    assert coalescer.stats["rows_evicted"] == 1
+    assert coalescer.pending == 2
+
+
+def test_close_hands_pending_rows_downstream(mocker):
+    coalescer, downstream, _ = make_coalescer(mocker, window_ms=60000)
+    coalescer.start()
+    coalescer.add(1, TS, temperature=21.5)
+
+    coalescer.close()
+
+    downstream.add.assert_called_once()
+    downstream.close.assert_not_called()
+
+
+def test_add_reading_merges_like_add(mocker):
+    coalescer, downstream, _ = make_coalescer(mocker)
+    ts_epoch = 1722945600
+
+    coalescer.add_reading(Reading(1, ts_epoch, METRIC_CODES["temperature"], 21.5))
+    coalescer.add(1, datetime.fromtimestamp(ts_epoch), humidity=40.0)
+    coalescer.flush_all()
+
+    downstream.add.assert_called_once()
+    args, kwargs = downstream.add.call_args
+    assert args == (1, datetime.fromtimestamp(ts_epoch))
+    assert kwargs == {"ack": None, "temperature": 21.5, "humidity": 40.0}
@@ -1,5 +1,5 @@
 import pytest
-from mqtt_client.db_writer import insert_sensor_data
+from mqtt_client.db_writer import insert_sensor_data, insert_sensor_data_batch, merge_sensor_rows
 from common.exceptions import DatabaseError, DatabaseTimeoutError, DatabaseConnectionError
 
 
@@ -27,19 +27,13 @@ def test_insert_sensor_data_complete_data(mocker):
     mock_cursor.close.assert_called_once()
 
     # Validate parameters (avoid brittle exact query string match)
-    _, params = mock_cursor.execute.call_args[0]
+    query, params = mock_cursor.execute.call_args[0]
     assert params == (device_id, timestamp, 21.3, 55, 123, 78)
+    assert query.count("%s") == 6
+    assert "INSERT INTO devices" in query
 
-    # Validate return payload
-    assert result["device_id"] == device_id
-    assert result["timestamp"] == timestamp
-    assert result["updated_fields"] == {
-        "temperature": 21.3,
-        "humidity": 55,
-        "pollen": 123,
-        "particulate_matter": 78,
-    }
-    assert result["rows_affected"] == 1
+    # No summary dict is built for the hot path
+    assert result is None
 
 
 def test_insert_sensor_data_allows_partial_data(mocker):
@@ -63,13 +57,7 @@ def test_insert_sensor_data_allows_partial_data(mocker):
 
     _, params = mock_cursor.execute.call_args[0]
     assert params == (device_id, timestamp, 21.3, None, None, None)
-
-    assert result["updated_fields"] == {
-        "temperature": 21.3,
-        "humidity": None,
-        "pollen": None,
-        "particulate_matter": None,
-    }
+    assert result is None
 
 
 def test_commit_failure_rolls_back_and_maps_timeout(mocker):
@@ -151,3 +139,68 @@ def test_rollback_failure_is_swallowed_and_original_error_mapped(mocker):
 
     mock_conn.commit.assert_not_called()
     mock_cursor.close.assert_called_once()
+
+
+def test_merge_sensor_rows_keeps_non_null_values():
+    rows = [
+        (1, "t1", 21.0, None, None, None),
+        (1, "t1", None, 40.0, None, None),
+        (2, "t1", None, None, 7, None),
+        (1, "t1", 22.0, None, None, None),
+    ]
+
+    merged = merge_sensor_rows(rows)
+
+    assert merged == [
+        (1, "t1", 22.0, 40.0, None, None),
+        (2, "t1", None, None, 7, None),
+    ]
+
+
+def test_insert_sensor_data_batch_single_statement_and_commit(mocker):
+    mock_execute_values = mocker.patch("mqtt_client.db_writer.execute_values")
+    mock_conn = mocker.MagicMock()
+    mock_cursor = mocker.MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+
+    rows = [
+        (1, "t1", 21.0, None, None, None),
+        (1, "t1", None, 40.0, None, None),
+        (1, "t2", None, None, 3, None),
+    ]
+    written = insert_sensor_data_batch(mock_conn, rows)
+
+    assert written == 2
+    mock_execute_values.assert_called_once()
+    cursor_arg, query, params = mock_execute_values.call_args[0]
+    assert cursor_arg is mock_cursor
+    assert "ON CONFLICT (device_id, timestamp)" in query
+    assert "'sensor_data_written'" in query and "pg_notify(" in query
+    assert "INSERT INTO devices" in query  # summary kept in the same statement
+    # new rows come from the INSERT itself, not from a pre-statement snapshot of sensor_data
+    assert "(xmax = 0) AS inserted" in query and "LEFT JOIN" not in query
+    assert params == [(1, "t1", 21.0, 40.0, None, None), (1, "t2", None, None, 3, None)]
+    mock_conn.commit.assert_called_once()
+    mock_cursor.close.assert_called_once()
+
+
+def test_insert_sensor_data_batch_empty_is_noop(mocker):
+    mock_conn = mocker.MagicMock()
+
+    assert insert_sensor_data_batch(mock_conn, []) == 0
+    mock_conn.cursor.assert_not_called()
+    mock_conn.commit.assert_not_called()
+
+
+def test_insert_sensor_data_batch_failure_rolls_back_and_maps(mocker):
+    mocker.patch("mqtt_client.db_writer.execute_values", side_effect=Exception("statement timed out"))
+    mock_conn = mocker.MagicMock()
+    mock_cursor = mocker.MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+
+    with pytest.raises(DatabaseTimeoutError):
+        insert_sensor_data_batch(mock_conn, [(1, "t1", 21.0, None, None, None)])
+
+    mock_conn.rollback.assert_called_once()
+    mock_conn.commit.assert_not_called()
+    mock_cursor.close.assert_called_once()
@@ -0,0 +1,117 @@
+import threading
+
+from mqtt_client.dedup import DedupCache, reading_key
+
+
+def test_reading_key_from_raw_payload():
+    payload = {"value": 6, "timestamp": "1722945600", "meta": {"device_id": 1}}
+    assert reading_key("pollen", payload) == (1, "pollen", 1722945600)
+    assert reading_key("pollen", {"value": 6, "timestamp": "x", "meta": {"device_id": 1}}) is None
+    assert reading_key("pollen", {"value": 6, "timestamp": 1722945600}) is None
+    assert reading_key("pollen", ["not", "a", "dict"]) is None
+
+
+def test_reading_key_ignores_unhashable_device_ids():
+    assert reading_key("pollen", {"value": 1, "timestamp": 1, "meta": {"device_id": [1]}}) is None
+    assert reading_key("pollen", {"value": 1, "timestamp": 1, "meta": {"device_id": {"a": 1}}}) is None
+    assert reading_key("pollen", {"value": 1, "timestamp": 1, "meta": {"device_id": True}}) is None
+
+
+def test_second_claim_is_a_hit(mocker):
+    mocker.patch("mqtt_client.dedup.monotonic", return_value=100.0)
+    cache = DedupCache(ttl_s=60)
+
+    assert cache.claim((1, "pollen", 1)) is True
+    # still in flight, no waiting configured: the owner writes it
+    assert cache.claim((1, "pollen", 1)) is False
+    cache.done((1, "pollen", 1))
+    assert cache.claim((1, "pollen", 1)) is False
+    assert cache.claim((1, "humidity", 1)) is True
+
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 2
+
+
+def test_released_claim_lets_the_next_copy_through():
+    cache = DedupCache(ttl_s=60)
+    assert cache.claim((1, "pollen", 1)) is True
+    cache.release((1, "pollen", 1))
+    assert cache.claim((1, "pollen", 1)) is True
+
+
+def test_try_claim_does_not_wait_for_a_copy_in_flight():
+    cache = DedupCache(ttl_s=60, wait_s=5)
+    assert cache.try_claim((1, "pollen", 1)) is True
+    assert cache.try_claim((1, "pollen", 1)) is None
+    cache.done((1, "pollen", 1))
+    assert cache.try_claim((1, "pollen", 1)) is False
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_concurrent_copies_only_one_claims():
+    cache = DedupCache(ttl_s=60)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def copy():
+        barrier.wait()
+        results.append(cache.claim((1, "pollen", 1)))
+
+    threads = [threading.Thread(target=copy) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+
+
+def test_waiting_copy_takes_over_when_the_first_write_fails():
+    cache = DedupCache(ttl_s=60, wait_s=5)
+    assert cache.claim((1, "pollen", 1)) is True
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(cache.claim((1, "pollen", 1))))
+    waiter.start()
+
+    cache.release((1, "pollen", 1))
+    waiter.join(2)
+
+    assert result == [True]
+
+
+def test_waiting_copy_is_a_duplicate_once_the_first_is_written():
+    cache = DedupCache(ttl_s=60, wait_s=5)
+    assert cache.claim((1, "pollen", 1)) is True
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(cache.claim((1, "pollen", 1))))
+    waiter.start()
+
+    cache.done((1, "pollen", 1))
+    waiter.join(2)
+
+    assert result == [False]
+
+
+def test_entries_expire_after_ttl(mocker):
+    clock = mocker.patch("mqtt_client.dedup.monotonic", return_value=100.0)
+    cache = DedupCache(ttl_s=60)
+    cache.claim((1, "pollen", 1))
+    cache.done((1, "pollen", 1))
+
+    clock.return_value = 160.0
+    assert cache.claim((1, "pollen", 1)) is True
+    assert cache.stats["expired"] == 1
+    assert len(cache) == 1
+
+
+def test_oldest_entry_is_evicted_beyond_max_entries(mocker):
+    mocker.patch("mqtt_client.dedup.monotonic", return_value=100.0)
+    cache = DedupCache(ttl_s=60, max_entries=2)
+    for ts in (1, 2, 3):
+        cache.claim((1, "pollen", ts))
+        cache.done((1, "pollen", ts))
+
+    assert cache.stats["evicted"] == 1
+    assert cache.claim((1, "pollen", 3)) is False
+    assert cache.claim((1, "pollen", 1)) is True
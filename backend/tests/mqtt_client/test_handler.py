@@ -13,7 +13,7 @@ def valid_payload():
     }
 
 def test_valid_metric_calls_insert(mocker):
-    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_data")
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row")
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -21,19 +21,19 @@ def test_valid_metric_calls_insert(mocker):
     handle_metric("temperature", "dhbw/ai/si2023/01/temperature/01", payload, mock_conn)
 
     mock_insert.assert_called_once()
-    args, kwargs = mock_insert.call_args
-    assert args[0] == mock_conn
-    assert args[1] == 1  # device_id
-    assert kwargs["temperature"] == 22.5
-    # timestamp (positional arg index 2) should be a datetime
-    assert isinstance(args[2], datetime)
+    conn, row = mock_insert.call_args.args
+    assert conn == mock_conn
+    # SENSOR_COLUMNS order: device_id, timestamp, temperature, humidity, pollen, particulate_matter
+    assert row[0] == 1
+    assert isinstance(row[1], datetime)
+    assert row[2:] == (22.5, None, None, None)
 
     # success log emitted
     levels_events = [(c.args[1], c.args[2]) for c in mock_log.call_args_list]
     assert ("INFO", "msg_processed") in levels_events
 
 def test_missing_device_id(mocker):
-    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_data")
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row")
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -47,7 +47,7 @@ def test_missing_device_id(mocker):
     assert ("WARNING", "value_out_of_range") in levels_events
 
 def test_unknown_metric(mocker):
-    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_data")
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row")
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -58,7 +58,7 @@ def test_unknown_metric(mocker):
     assert ("WARNING", "value_out_of_range") in levels_events
 
 def test_non_numeric_value(mocker):
-    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_data")
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row")
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -71,7 +71,7 @@ def test_non_numeric_value(mocker):
     assert ("WARNING", "value_out_of_range") in levels_events
 
 def test_value_out_of_range(mocker):
-    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_data")
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row")
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -91,7 +91,7 @@ def test_value_out_of_range(mocker):
 
 
 def test_integer_metric_accepts_float_int_value(mocker):
-    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_data")
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row")
     mock_conn = mocker.MagicMock()
 
     payload = valid_payload()
@@ -99,12 +99,12 @@ def test_integer_metric_accepts_float_int_value(mocker):
     handle_metric("pollen", "dhbw/ai/si2023/01/pollen/01", payload, mock_conn)
 
     mock_insert.assert_called_once()
-    _, kwargs = mock_insert.call_args
-    assert kwargs["pollen"] == 12
+    _, row = mock_insert.call_args.args
+    assert row[4] == 12 and isinstance(row[4], int)
 
 
 def test_integer_metric_rejects_non_integer_float(mocker):
-    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_data")
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row")
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -124,7 +124,7 @@ def test_integer_metric_rejects_non_integer_float(mocker):
 
 
 def test_db_timeout_error_is_logged(mocker):
-    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_data", side_effect=DatabaseTimeoutError("timeout"))
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row", side_effect=DatabaseTimeoutError("timeout"))
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -140,7 +140,7 @@ def test_db_timeout_error_is_logged(mocker):
 
 
 def test_db_generic_error_is_logged(mocker):
-    mocker.patch("mqtt_client.handler.insert_sensor_data", side_effect=DatabaseError("db fail"))
+    mocker.patch("mqtt_client.handler.insert_sensor_row", side_effect=DatabaseError("db fail"))
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -155,7 +155,7 @@ def test_db_generic_error_is_logged(mocker):
 
 
 def test_unexpected_error_is_logged(mocker):
-    mocker.patch("mqtt_client.handler.insert_sensor_data", side_effect=Exception("boom"))
+    mocker.patch("mqtt_client.handler.insert_sensor_row", side_effect=Exception("boom"))
     mock_log = mocker.patch("mqtt_client.handler.log_event")
     mock_conn = mocker.MagicMock()
 
@@ -166,4 +166,29 @@ def test_unexpected_error_is_logged(mocker):
         if c.args[1] == "ERROR" and c.args[2] == "unhandled_exception" and c.kwargs.get("reason") == "unexpected":
             found = True
             break
-    assert found
\ No newline at end of file
+    assert found
+
+def test_buffered_mode_queues_row_instead_of_writing(mocker):
+    mock_insert = mocker.patch("mqtt_client.handler.insert_sensor_row")
+    mocker.patch("mqtt_client.handler.log_event")
+    writer = mocker.MagicMock()
+    ack = mocker.MagicMock()
+
+    accepted = handle_metric("pollen", "topic", {**valid_payload(), "value": 12.0}, None, writer=writer, ack=ack)
+
+    assert accepted is True
+    mock_insert.assert_not_called()
+    writer.add_reading.assert_called_once()
+    (reading,), kwargs = writer.add_reading.call_args
+    assert (reading.device_id, reading.ts_epoch, reading.metric_name, reading.value) == (1, 1722945600, "pollen", 12)
+    assert kwargs == {"ack": ack}
+
+
+def test_rejected_reading_returns_false_and_is_not_queued(mocker):
+    mocker.patch("mqtt_client.handler.log_event")
+    writer = mocker.MagicMock()
+
+    accepted = handle_metric("temperature", "topic", {**valid_payload(), "value": 1000}, None, writer=writer)
+
+    assert accepted is False
+    writer.add_reading.assert_not_called()
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from prometheus_client import REGISTRY
+
+from mqtt_client.db_writer import insert_sensor_data_batch
+from mqtt_client.dedup import DedupCache
+from mqtt_client.handler import handle_metric
+from mqtt_client.main_ingester import resolve_metric
+
+TOPIC = "dhbw/ai/si2023/01/temperature/01"
+
+
+def value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def payload(value_, ts="1722945600"):
+    return {"value": value_, "timestamp": ts, "meta": {"device_id": 1}}
+
+
+def test_accepted_and_rejected_messages_are_counted(mocker):
+    mocker.patch("mqtt_client.handler.insert_sensor_row")
+    mocker.patch("mqtt_client.handler.log_event")
+    ok = value("ingester_messages_total", topic=TOPIC, result="ok")
+    rejected = value("ingester_messages_total", topic=TOPIC, result="rejected")
+    out_of_range = value("ingester_validation_rejects_total", reason="out_of_range")
+
+    assert handle_metric("temperature", TOPIC, payload(22.5), mocker.MagicMock())
+    assert not handle_metric("temperature", TOPIC, payload(99.0), mocker.MagicMock())
+
+    assert value("ingester_messages_total", topic=TOPIC, result="ok") == ok + 1
+    assert value("ingester_messages_total", topic=TOPIC, result="rejected") == rejected + 1
+    assert value("ingester_validation_rejects_total", reason="out_of_range") == out_of_range + 1
+
+
+def test_failed_write_is_not_a_validation_reject(mocker):
+    from common.exceptions import DatabaseError
+
+    mocker.patch("mqtt_client.handler.insert_sensor_row", side_effect=DatabaseError("database write failed"))
+    mocker.patch("mqtt_client.handler.log_event")
+    failed = value("ingester_messages_total", topic=TOPIC, result="failed")
+
+    assert not handle_metric("temperature", TOPIC, payload(22.5), mocker.MagicMock())
+
+    assert value("ingester_messages_total", topic=TOPIC, result="failed") == failed + 1
+
+
+def test_unknown_topic_is_rejected_with_reason(mocker):
+    mocker.patch("mqtt_client.main_ingester.log_event")
+    before = value("ingester_validation_rejects_total", reason="unknown_topic")
+
+    unmatched = value("ingester_messages_total", topic="unmatched", result="rejected")
+
+    assert resolve_metric("dhbw/ai/si2023/01/unknown/07") is None
+    assert resolve_metric("dhbw/ai/si2023/01/anything/else") is None
+
+    assert value("ingester_validation_rejects_total", reason="unknown_topic") == before + 2
+    # arbitrary topics share one label value instead of adding series
+    assert value("ingester_messages_total", topic="unmatched", result="rejected") == unmatched + 2
+    assert value("ingester_messages_total", topic="dhbw/ai/si2023/01/unknown/07", result="rejected") == 0
+
+
+def test_batch_write_records_duration_and_end_to_end_latency(mocker):
+    conn = mocker.MagicMock()
+    mocker.patch("mqtt_client.db_writer.execute_values")
+    writes = value("ingester_db_write_duration_seconds_count", mode="batch", outcome="ok")
+    e2e = value("ingester_end_to_end_latency_seconds_count")
+    e2e_sum = value("ingester_end_to_end_latency_seconds_sum")
+
+    ts = datetime.now() - timedelta(seconds=3)
+    insert_sensor_data_batch(conn, [(1, ts, 21.0, None, None, None), (2, ts, 22.0, None, None, None)])
+
+    assert value("ingester_db_write_duration_seconds_count", mode="batch", outcome="ok") == writes + 1
+    assert value("ingester_end_to_end_latency_seconds_count") == e2e + 2
+    assert value("ingester_end_to_end_latency_seconds_sum") - e2e_sum >= 6
+
+
+def test_dedup_lookups_are_counted():
+    hits = value("ingester_dedup_lookups_total", result="hit")
+    misses = value("ingester_dedup_lookups_total", result="miss")
+    cache = DedupCache(ttl_s=60)
+
+    cache.claim((1, "temperature", 1722945600))
+    cache.done((1, "temperature", 1722945600))
+    cache.claim((1, "temperature", 1722945600))
+
+    assert value("ingester_dedup_lookups_total", result="hit") == hits + 1
+    assert value("ingester_dedup_lookups_total", result="miss") == misses + 1
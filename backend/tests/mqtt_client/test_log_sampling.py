@@ -0,0 +1,76 @@
+from common.log_sampling import SampledEvent, _percentile
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _summaries(mock_log):
+    return [c.kwargs for c in mock_log.call_args_list if c.args[2].endswith("_summary")]
+
+
+def test_every_n_is_per_key():
+    sampler = SampledEvent(None, "msg_processed", every_n=3, summary_interval_s=0)
+    a = [sampler.record("a") for _ in range(6)]
+    b = [sampler.record("b") for _ in range(2)]
+    assert a == [True, False, False, True, False, False]
+    assert b == [True, False]
+
+
+def test_token_bucket_limits_and_refills(mocker):
+    clock = Clock()
+    mocker.patch("common.log_sampling.monotonic", clock)
+    sampler = SampledEvent(None, "msg_processed", every_n=1, rate_per_s=1, burst=2, summary_interval_s=0)
+
+    assert [sampler.record("k") for _ in range(4)] == [True, True, False, False]
+    assert sampler.record("other") is True  # own bucket per key
+    clock.now += 1.0
+    assert [sampler.record("k") for _ in range(2)] == [True, False]
+
+
+def test_summary_per_key_with_percentiles(mocker):
+    clock = Clock()
+    mocker.patch("common.log_sampling.monotonic", clock)
+    mock_log = mocker.patch("common.log_sampling.log_event")
+    sampler = SampledEvent(None, "msg_processed", every_n=10, summary_interval_s=60, summary_key_name="metric")
+
+    for ms in range(1, 101):
+        sampler.record((1, "temperature"), "temperature", duration_ms=ms)
+    sampler.record((1, "humidity"), "humidity", duration_ms=5)
+    assert _summaries(mock_log) == []  # window still open
+
+    clock.now += 60
+    sampler.record((1, "humidity"), "humidity", duration_ms=7)  # closes the window
+    by_metric = {s["metric"]: s for s in _summaries(mock_log)}
+    assert by_metric["temperature"]["count"] == 100
+    assert by_metric["temperature"]["logged"] == 10
+    assert (by_metric["temperature"]["p50_ms"], by_metric["temperature"]["p99_ms"]) == (50, 99)
+    assert by_metric["temperature"]["max_ms"] == 100
+    assert by_metric["humidity"]["count"] == 2
+    assert by_metric["humidity"]["interval_s"] == 60.0
+
+    mock_log.reset_mock()
+    sampler.flush()  # nothing recorded since the window closed
+    assert _summaries(mock_log) == []
+
+
+def test_flush_emits_open_window(mocker):
+    mock_log = mocker.patch("common.log_sampling.log_event")
+    sampler = SampledEvent(None, "sensor_data_received", every_n=1, summary_interval_s=60, summary_key_name="sensor_type")
+    sampler.record(("1", "pollen"), "pollen")
+    sampler.flush()
+    (summary,) = _summaries(mock_log)
+    assert summary["sensor_type"] == "pollen"
+    assert summary["count"] == 1 and summary["logged"] == 1
+    assert "p50_ms" not in summary  # no durations recorded
+
+
+def test_percentile_nearest_rank():
+    counts = {1: 98, 50: 1, 200: 1}
+    assert _percentile(counts, 100, 0.50) == 1
+    assert _percentile(counts, 100, 0.99) == 50
+    assert _percentile(counts, 100, 1.0) == 200
@@ -0,0 +1,76 @@
+import io
+import json
+import os
+import threading
+
+import pytest
+
+from common import logging_setup
+from common.logging_setup import QueuedJsonSink
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_queued_sink_writes_batches_in_order():
+    stream = io.StringIO()
+    sink = QueuedJsonSink(stream, batch_size=10, flush_interval_s=0.01)
+    for i in range(25):
+        sink.put({"message": "e", "i": i})
+    sink.close()
+
+    assert [line["i"] for line in lines(stream)] == list(range(25))
+
+
+def test_drop_newest_keeps_queued_lines_and_reports_drops():
+    stream = io.StringIO()
+    sink = QueuedJsonSink(stream, max_size=3, drop_policy="drop_newest", flush_interval_s=60)
+    sink._pid = os.getpid()  # no writer thread: the queue fills up
+    for i in range(5):
+        sink.put({"i": i})
+    sink.flush()
+
+    out = lines(stream)
+    assert [line["i"] for line in out[:-1]] == [0, 1, 2]
+    assert out[-1]["message"] == "log.dropped" and out[-1]["dropped"] == 2
+
+
+def test_drop_oldest_keeps_newest_lines():
+    stream = io.StringIO()
+    sink = QueuedJsonSink(stream, max_size=3, drop_policy="drop_oldest", flush_interval_s=60)
+    sink._pid = os.getpid()
+    for i in range(5):
+        sink.put({"i": i})
+    sink.flush()
+
+    assert [line["i"] for line in lines(stream)[:-1]] == [2, 3, 4]
+
+
+def test_block_policy_waits_for_the_writer():
+    stream = io.StringIO()
+    sink = QueuedJsonSink(stream, max_size=2, drop_policy="block", batch_size=2, flush_interval_s=0.01)
+    producer = threading.Thread(target=lambda: [sink.put({"i": i}) for i in range(50)])
+    producer.start()
+    producer.join(timeout=5)
+    sink.close()
+
+    assert not producer.is_alive()
+    assert sink.dropped == 0
+    assert [line["i"] for line in lines(stream)] == list(range(50))
+
+
+def test_unknown_drop_policy_is_rejected():
+    with pytest.raises(ValueError):
+        QueuedJsonSink(drop_policy="sometimes")
+
+
+def test_log_event_below_level_skips_bind(mocker):
+    mocker.patch.object(logging_setup, "_min_level_no", 20)
+    logger = mocker.MagicMock()
+
+    logging_setup.log_event(logger, "DEBUG", "noisy.event", a=1)
+    logger.bind.assert_not_called()
+
+    logging_setup.log_event(logger, "INFO", "useful.event", a=1)
+    logger.bind.assert_called_once()
@@ -1,5 +1,6 @@
 from unittest.mock import MagicMock
-from mqtt_client.main_ingester import on_connect, on_message, connect_db
+from mqtt_client.main_ingester import on_connect, on_message, connect_db, dispatch_message, dispatch_batch
+from mqtt_client.dedup import DedupCache
 
 
 def test_on_connect_success_subscribes(mocker):
@@ -93,4 +94,223 @@ def test_connect_db_failure(mocker):
 
     conn = connect_db()
 
-    assert conn is None
\ No newline at end of file
+    assert conn is None
+
+def test_on_message_buffered_mode_passes_writer_and_defers_ack(mocker):
+    mock_msg = MagicMock()
+    mock_msg.topic = "dhbw/ai/si2023/01/temperature/01"
+    mock_msg.payload = b'{"value": 21.5, "timestamp": "1722945600", "meta": {"device_id": 1}}'
+    mock_msg.mid, mock_msg.qos = 7, 1
+
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric", return_value=True)
+    client = MagicMock()
+    writer = MagicMock()
+
+    on_message(client, {"db_connection": None, "writer": writer}, mock_msg)
+
+    mock_handle.assert_called_once()
+    assert mock_handle.call_args.kwargs["writer"] is writer
+    # ack is handed to the writer, not sent yet
+    client.ack.assert_not_called()
+    mock_handle.call_args.kwargs["ack"]()
+    client.ack.assert_called_once_with(7, 1)
+
+
+def test_on_message_buffered_mode_acks_rejected_message(mocker):
+    mock_msg = MagicMock()
+    mock_msg.topic = "dhbw/ai/si2023/01/ikea/99"  # unknown mapping
+    mock_msg.payload = b'{}'
+    mock_msg.mid, mock_msg.qos = 8, 1
+    mocker.patch("mqtt_client.main_ingester.log_event")
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric")
+    client = MagicMock()
+
+    on_message(client, {"db_connection": None, "writer": MagicMock()}, mock_msg)
+
+    mock_handle.assert_not_called()
+    client.ack.assert_called_once_with(8, 1)
+
+
+def test_on_message_pipeline_mode_only_enqueues(mocker):
+    mock_msg = MagicMock()
+    mock_msg.topic = "dhbw/ai/si2023/01/temperature/01"
+    mock_msg.mid, mock_msg.qos = 9, 1
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric")
+    client = MagicMock()
+    pipeline = MagicMock()
+
+    on_message(client, {"db_connection": None, "writer": None, "pipeline": pipeline}, mock_msg)
+
+    mock_handle.assert_not_called()
+    pipeline.submit.assert_called_once()
+    queued_msg, ack = pipeline.submit.call_args.args
+    assert queued_msg is mock_msg
+    ack()
+    client.ack.assert_called_once_with(9, 1)
+
+
+def test_dispatch_message_direct_mode_acks_after_write(mocker):
+    mock_msg = MagicMock()
+    mock_msg.topic = "dhbw/ai/si2023/01/temperature/01"
+    mock_msg.payload = b'{"value": 21.5, "timestamp": "1722945600", "meta": {"device_id": 1}}'
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric", return_value=True)
+    db_conn = MagicMock()
+    db_conn.closed = False
+    ack = MagicMock()
+
+    dispatch_message({"db_connection": db_conn, "writer": None}, mock_msg, ack)
+
+    mock_handle.assert_called_once()
+    assert mock_handle.call_args.args[3] is db_conn
+    ack.assert_called_once()
+
+
+def test_duplicate_from_second_broker_is_acked_and_skipped(mocker):
+    mock_msg = MagicMock()
+    mock_msg.topic = "dhbw/ai/si2023/01/temperature/01"
+    mock_msg.payload = b'{"value": 21.5, "timestamp": "1722945600", "meta": {"device_id": 1}}'
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric", return_value=True)
+    db_conn = MagicMock()
+    db_conn.closed = False
+    dedup = DedupCache(ttl_s=60)
+    primary, backup = MagicMock(), MagicMock()
+
+    on_message(primary, {"db_connection": db_conn, "dedup": dedup, "broker": "a:1883"}, mock_msg)
+    on_message(backup, {"db_connection": db_conn, "dedup": dedup, "broker": "b:1883"}, mock_msg)
+
+    mock_handle.assert_called_once()
+    backup.ack.assert_called_once()
+    assert dedup.stats == {"hits": 1, "misses": 1, "expired": 0, "evicted": 0}
+
+
+def test_failed_first_copy_does_not_block_the_second(mocker):
+    mock_msg = MagicMock()
+    mock_msg.topic = "dhbw/ai/si2023/01/temperature/01"
+    mock_msg.payload = b'{"value": 21.5, "timestamp": "1722945600", "meta": {"device_id": 1}}'
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric", side_effect=[False, True])
+    db_conn = MagicMock()
+    db_conn.closed = False
+    userdata = {"db_connection": db_conn, "dedup": DedupCache(ttl_s=60)}
+
+    dispatch_message(userdata, mock_msg)
+    dispatch_message(userdata, mock_msg)
+
+    assert mock_handle.call_count == 2
+
+
+def test_failed_write_is_not_remembered(mocker):
+    mock_msg = MagicMock()
+    mock_msg.topic = "dhbw/ai/si2023/01/temperature/01"
+    mock_msg.payload = b'{"value": 21.5, "timestamp": "1722945600", "meta": {"device_id": 1}}'
+    mocker.patch("mqtt_client.main_ingester.handle_metric", return_value=False)
+    db_conn = MagicMock()
+    db_conn.closed = False
+    dedup = DedupCache(ttl_s=60)
+
+    dispatch_message({"db_connection": db_conn, "dedup": dedup}, mock_msg)
+
+    assert len(dedup) == 0
+
+
+def test_unhashable_device_id_is_rejected_not_raised(mocker):
+    mock_msg = MagicMock()
+    mock_msg.topic = "dhbw/ai/si2023/01/temperature/01"
+    mock_msg.payload = b'{"value": 1, "timestamp": 1, "meta": {"device_id": [1]}}'
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric", return_value=False)
+    db_conn = MagicMock()
+    db_conn.closed = False
+    client = MagicMock()
+
+    on_message(client, {"db_connection": db_conn, "dedup": DedupCache(ttl_s=60)}, mock_msg)
+
+    mock_handle.assert_called_once()
+    client.ack.assert_called_once()
+
+
+def make_batch(*payloads, topic="dhbw/ai/si2023/01/temperature/01"):
+    items = []
+    for payload in payloads:
+        msg = MagicMock()
+        msg.topic = topic
+        msg.payload = payload
+        items.append((msg, MagicMock()))
+    return items
+
+
+def test_dispatch_batch_writes_accepted_rows_in_one_upsert(mocker):
+    insert = mocker.patch("mqtt_client.main_ingester.insert_sensor_data_batch")
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric")
+    db_conn = MagicMock()
+    db_conn.closed = False
+    items = make_batch(
+        b'{"value": 21.5, "timestamp": "1722945600", "meta": {"device_id": 1}}',
+        b'{"value": 99, "timestamp": "1722945600", "meta": {"device_id": 2}}',  # out of range
+        b'not json',
+        b'{"value": 22.0, "timestamp": "1722945601", "meta": {"device_id": 1}}',
+    )
+    dedup = DedupCache(ttl_s=60)
+
+    dispatch_batch({"db_connection": db_conn, "writer": None, "dedup": dedup}, items)
+
+    insert.assert_called_once()
+    conn, rows = insert.call_args.args
+    assert conn is db_conn
+    assert [(r[0], r[2]) for r in rows] == [(1, 21.5), (1, 22.0)]
+    mock_handle.assert_not_called()
+    for _, ack in items:
+        ack.assert_called_once()
+    # the rejected reading may come again from the other broker
+    assert len(dedup) == 2
+
+
+def test_dispatch_batch_failed_write_releases_claims(mocker):
+    mocker.patch("mqtt_client.main_ingester.insert_sensor_data_batch", side_effect=RuntimeError("boom"))
+    log_failure = mocker.patch("mqtt_client.main_ingester.log_failure")
+    db_conn = MagicMock()
+    db_conn.closed = False
+    items = make_batch(b'{"value": 21.5, "timestamp": "1722945600", "meta": {"device_id": 1}}')
+    dedup = DedupCache(ttl_s=60)
+
+    dispatch_batch({"db_connection": db_conn, "writer": None, "dedup": dedup}, items)
+
+    log_failure.assert_called_once()
+    items[0][1].assert_called_once()
+    assert len(dedup) == 0
+
+
+def test_dispatch_batch_copy_in_same_batch_is_a_duplicate_after_the_write(mocker):
+    insert = mocker.patch("mqtt_client.main_ingester.insert_sensor_data_batch")
+    mock_handle = mocker.patch("mqtt_client.main_ingester.handle_metric")
+    db_conn = MagicMock()
+    db_conn.closed = False
+    payload = b'{"value": 21.5, "timestamp": "1722945600", "meta": {"device_id": 1}}'
+    items = make_batch(payload, payload)
+    dedup = DedupCache(ttl_s=60, wait_s=5)
+
+    dispatch_batch({"db_connection": db_conn, "writer": None, "dedup": dedup}, items)
+
+    assert len(insert.call_args.args[1]) == 1
+    mock_handle.assert_not_called()
+    for _, ack in items:
+        ack.assert_called_once()
+    assert dedup.stats["hits"] == 1
+
+
+def test_dispatch_batch_writer_mode_hands_over_acks(mocker):
+    insert = mocker.patch("mqtt_client.main_ingester.insert_sensor_data_batch")
+    writer = MagicMock()
+    items = make_batch(
+        b'{"value": 12.0, "timestamp": "1722945600", "meta": {"device_id": 1}}',
+        b'{"value": "x", "timestamp": "1722945600", "meta": {"device_id": 1}}',
+        topic="dhbw/ai/si2023/01/ikea/01",
+    )
+
+    dispatch_batch({"db_connection": None, "writer": writer}, items)
+
+    insert.assert_not_called()
+    writer.add_reading.assert_called_once()
+    reading = writer.add_reading.call_args.args[0]
+    assert (reading.device_id, reading.metric_name, reading.value) == (1, "pollen", 12)
+    assert writer.add_reading.call_args.kwargs["ack"] is items[0][1]
+    items[0][1].assert_not_called()
+    items[1][1].assert_called_once()
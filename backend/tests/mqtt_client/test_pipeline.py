@@ -0,0 +1,141 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from mqtt_client.pipeline import IngestPipeline
+
+
+def make_msg(topic="dhbw/ai/si2023/01/temperature/01"):
+    msg = MagicMock()
+    msg.topic = topic
+    return msg
+
+
+def test_workers_process_messages_with_own_connections(mocker):
+    mocker.patch("mqtt_client.pipeline.log_event")
+    connections = []
+
+    def connect():
+        conn = MagicMock()
+        connections.append(conn)
+        return conn
+
+    seen = []
+    done = threading.Event()
+
+    def process(userdata, msg, ack):
+        seen.append((userdata["db_connection"], msg, ack))
+        if len(seen) == 3:
+            done.set()
+
+    pipeline = IngestPipeline(process, connect, workers=2, stats_interval_s=0).start()
+    msgs = [make_msg() for _ in range(3)]
+    for m in msgs:
+        assert pipeline.submit(m, ack=None)
+    assert done.wait(2)
+    pipeline.close(timeout_s=2)
+
+    assert len(connections) == 2
+    assert sorted(id(m) for _, m, _ in seen) == sorted(id(m) for m in msgs)
+    assert {id(c) for c, _, _ in seen} <= {id(c) for c in connections}
+    assert pipeline.stats["processed"] == 3
+    for conn in connections:
+        conn.close.assert_called_once()
+
+
+def test_buffered_writer_is_shared_and_no_worker_connection(mocker):
+    mocker.patch("mqtt_client.pipeline.log_event")
+    connect = MagicMock()
+    writer = MagicMock()
+    seen = []
+
+    dedup = MagicMock()
+    seen = []
+
+    pipeline = IngestPipeline(
+        lambda u, m, a: seen.append(u), connect,
+        writer=writer, context={"dedup": dedup}, workers=1, stats_interval_s=0,
+    ).start()
+    pipeline.submit(make_msg())
+    pipeline.close(timeout_s=2)
+
+    connect.assert_not_called()
+    assert seen == [{"dedup": dedup, "db_connection": None, "writer": writer}]
+
+
+def test_drop_newest_acks_and_counts_dropped(mocker):
+    mocker.patch("mqtt_client.pipeline.log_event")
+    pipeline = IngestPipeline(MagicMock(), MagicMock(), queue_size=1, backpressure="drop_newest")
+    ack1, ack2 = MagicMock(), MagicMock()
+
+    assert pipeline.submit(make_msg(), ack1) is True
+    assert pipeline.submit(make_msg(), ack2) is False
+
+    ack1.assert_not_called()
+    ack2.assert_called_once()
+    assert pipeline.stats["dropped"] == 1
+    assert pipeline.depth == 1
+
+
+def test_drop_oldest_makes_room_for_new_message(mocker):
+    mocker.patch("mqtt_client.pipeline.log_event")
+    pipeline = IngestPipeline(MagicMock(), MagicMock(), queue_size=1, backpressure="drop_oldest")
+    old, new = make_msg("old"), make_msg("new")
+    ack_old = MagicMock()
+
+    pipeline.submit(old, ack_old)
+    assert pipeline.submit(new) is True
+
+    ack_old.assert_called_once()
+    assert pipeline._queue.get_nowait()[0] is new
+
+
+def test_block_times_out_and_drops(mocker):
+    mocker.patch("mqtt_client.pipeline.log_event")
+    pipeline = IngestPipeline(MagicMock(), MagicMock(), queue_size=1, backpressure="block", put_timeout_ms=10)
+
+    pipeline.submit(make_msg())
+    assert pipeline.submit(make_msg()) is False
+    assert pipeline.stats["dropped"] == 1
+
+
+def test_lag_and_depth_are_tracked(mocker):
+    mocker.patch("mqtt_client.pipeline.log_event")
+    clock = mocker.patch("mqtt_client.pipeline.monotonic", return_value=10.0)
+    pipeline = IngestPipeline(MagicMock(), MagicMock(return_value=MagicMock()), workers=1, stats_interval_s=0)
+
+    pipeline.submit(make_msg())
+    pipeline.submit(make_msg())
+    assert pipeline.stats["queue_depth_max"] == 2
+
+    clock.return_value = 10.25
+    pipeline.start()
+    pipeline.close(timeout_s=2)
+
+    assert pipeline.stats["lag_ms_last"] == 250
+
+
+def test_batch_worker_takes_what_is_queued(mocker):
+    mocker.patch("mqtt_client.pipeline.log_event")
+    batches = []
+    pipeline = IngestPipeline(
+        MagicMock(), MagicMock(return_value=MagicMock()), workers=1, stats_interval_s=0,
+        process_batch=lambda userdata, items: batches.append(items), batch_size=3,
+    )
+    msgs = [make_msg() for _ in range(5)]
+    acks = [MagicMock() for _ in msgs]
+    for m, a in zip(msgs, acks):
+        pipeline.submit(m, a)
+
+    pipeline.start()
+    pipeline.close(timeout_s=2)
+
+    assert [len(b) for b in batches] == [3, 2]
+    assert [pair for b in batches for pair in b] == list(zip(msgs, acks))
+    assert pipeline.stats["processed"] == 5
+
+
+def test_invalid_backpressure_policy_rejected():
+    with pytest.raises(ValueError):
+        IngestPipeline(MagicMock(), MagicMock(), backpressure="spill")
@@ -0,0 +1,60 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from common.schema import ensure_schema, DEVICES_DDL
+from mqtt_client import main_ingester
+
+
+def make_conn(*exists):
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchone.side_effect = [(e,) for e in exists]
+    return conn, cur
+
+
+def test_existing_table_is_left_alone():
+    conn, cur = make_conn(True)
+
+    assert ensure_schema(conn) is False
+    assert cur.execute.call_count == 1
+    conn.commit.assert_not_called()
+
+
+def test_missing_table_is_created_under_the_lock_and_backfilled():
+    conn, cur = make_conn(False, False)
+
+    assert ensure_schema(conn) is True
+    statements = [c.args[0] for c in cur.execute.call_args_list]
+    assert "pg_advisory_xact_lock" in statements[1]
+    assert statements[-1] == DEVICES_DDL
+    assert "SELECT refresh_devices()" in DEVICES_DDL
+    conn.commit.assert_called_once()
+
+
+def test_table_created_while_waiting_for_the_lock():
+    conn, cur = make_conn(False, True)
+
+    assert ensure_schema(conn) is False
+    assert DEVICES_DDL not in [c.args[0] for c in cur.execute.call_args_list]
+
+
+def test_failure_rolls_back_and_raises():
+    conn, cur = make_conn(False, False)
+    cur.execute.side_effect = [None, None, None, Exception("permission denied")]
+
+    with pytest.raises(Exception):
+        ensure_schema(conn)
+    conn.rollback.assert_called_once()
+    conn.commit.assert_not_called()
+
+
+def test_connect_db_treats_failed_migration_as_no_connection(mocker):
+    conn = MagicMock()
+    mocker.patch("mqtt_client.main_ingester.psycopg2.connect", return_value=conn)
+    mocker.patch("mqtt_client.main_ingester.ensure_schema", side_effect=Exception("denied"))
+    mocker.patch("mqtt_client.main_ingester._schema_ready", False)
+
+    assert main_ingester.connect_db() is None
+    conn.close.assert_called_once()
+    assert main_ingester._schema_ready is False
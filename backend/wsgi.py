@@ -0,0 +1,10 @@
+"""
+WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+`run.py` keeps the Flask development server for local work.
+"""
+from api import create_app
+
+app = create_app()
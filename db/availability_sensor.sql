@@ -7,19 +7,18 @@ CREATE OR REPLACE VIEW v_devices AS
 SELECT * FROM (VALUES (1),(2)) AS t(device_id);
 
 -- ===== First/Last Seen & Global Start =====
+-- Read from the devices summary (db/devices.sql) instead of aggregating sensor_data.
 CREATE OR REPLACE VIEW v_first_seen AS
-SELECT device_id, MIN(timestamp) AS first_seen
-FROM sensor_data
-GROUP BY device_id;
+SELECT device_id, first_seen
+FROM devices;
 
 CREATE OR REPLACE VIEW v_last_seen AS
-SELECT device_id, MAX(timestamp) AS last_seen
-FROM sensor_data
-GROUP BY device_id;
+SELECT device_id, last_seen
+FROM devices;
 
 -- Global monitoring start (or fallback: today at 00:00 if no data exists yet)
 CREATE OR REPLACE VIEW v_global_start AS
-SELECT COALESCE((SELECT MIN(timestamp) FROM sensor_data), date_trunc('day', now())) AS start_ts;
+SELECT COALESCE((SELECT MIN(first_seen) FROM devices), date_trunc('day', now())) AS start_ts;
 
 -- ===== Since start: expected/actual/availability per device =====
 CREATE OR REPLACE VIEW v_totals_since_start_by_device AS
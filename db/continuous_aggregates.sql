@@ -0,0 +1,94 @@
+-- ===== Continuous aggregates for chart resolutions =====
+-- Pre-aggregated sensor_data at 1-minute, 15-minute and 1-hour grains.
+-- The API picks the coarsest grain that divides the requested bucket
+-- (backend/api/db/aggregates.py) and re-aggregates it; only the partial grains at
+-- the edges of the range are read from raw chunks. Sums and counts (not averages) are stored so coarser buckets get
+-- exact averages; row_count is the number of raw rows behind each grain.
+-- Real-time aggregation (materialized_only = false) appends the not yet
+-- materialized tail from raw data, so the newest readings still show up.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_data_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    device_id,
+    time_bucket(INTERVAL '1 minute', timestamp) AS bucket,
+    COUNT(*) AS row_count,
+    SUM(temperature) AS temperature_sum, COUNT(temperature) AS temperature_count,
+    MIN(temperature) AS temperature_min, MAX(temperature) AS temperature_max,
+    last(temperature, timestamp) AS temperature_last,
+    SUM(humidity) AS humidity_sum, COUNT(humidity) AS humidity_count,
+    MIN(humidity) AS humidity_min, MAX(humidity) AS humidity_max,
+    last(humidity, timestamp) AS humidity_last,
+    SUM(pollen) AS pollen_sum, COUNT(pollen) AS pollen_count,
+    MIN(pollen) AS pollen_min, MAX(pollen) AS pollen_max,
+    last(pollen, timestamp) AS pollen_last,
+    SUM(particulate_matter) AS particulate_matter_sum, COUNT(particulate_matter) AS particulate_matter_count,
+    MIN(particulate_matter) AS particulate_matter_min, MAX(particulate_matter) AS particulate_matter_max,
+    last(particulate_matter, timestamp) AS particulate_matter_last
+FROM sensor_data
+GROUP BY device_id, bucket
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_data_15m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    device_id,
+    time_bucket(INTERVAL '15 minutes', timestamp) AS bucket,
+    COUNT(*) AS row_count,
+    SUM(temperature) AS temperature_sum, COUNT(temperature) AS temperature_count,
+    MIN(temperature) AS temperature_min, MAX(temperature) AS temperature_max,
+    last(temperature, timestamp) AS temperature_last,
+    SUM(humidity) AS humidity_sum, COUNT(humidity) AS humidity_count,
+    MIN(humidity) AS humidity_min, MAX(humidity) AS humidity_max,
+    last(humidity, timestamp) AS humidity_last,
+    SUM(pollen) AS pollen_sum, COUNT(pollen) AS pollen_count,
+    MIN(pollen) AS pollen_min, MAX(pollen) AS pollen_max,
+    last(pollen, timestamp) AS pollen_last,
+    SUM(particulate_matter) AS particulate_matter_sum, COUNT(particulate_matter) AS particulate_matter_count,
+    MIN(particulate_matter) AS particulate_matter_min, MAX(particulate_matter) AS particulate_matter_max,
+    last(particulate_matter, timestamp) AS particulate_matter_last
+FROM sensor_data
+GROUP BY device_id, bucket
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_data_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    device_id,
+    time_bucket(INTERVAL '1 hour', timestamp) AS bucket,
+    COUNT(*) AS row_count,
+    SUM(temperature) AS temperature_sum, COUNT(temperature) AS temperature_count,
+    MIN(temperature) AS temperature_min, MAX(temperature) AS temperature_max,
+    last(temperature, timestamp) AS temperature_last,
+    SUM(humidity) AS humidity_sum, COUNT(humidity) AS humidity_count,
+    MIN(humidity) AS humidity_min, MAX(humidity) AS humidity_max,
+    last(humidity, timestamp) AS humidity_last,
+    SUM(pollen) AS pollen_sum, COUNT(pollen) AS pollen_count,
+    MIN(pollen) AS pollen_min, MAX(pollen) AS pollen_max,
+    last(pollen, timestamp) AS pollen_last,
+    SUM(particulate_matter) AS particulate_matter_sum, COUNT(particulate_matter) AS particulate_matter_count,
+    MIN(particulate_matter) AS particulate_matter_min, MAX(particulate_matter) AS particulate_matter_max,
+    last(particulate_matter, timestamp) AS particulate_matter_last
+FROM sensor_data
+GROUP BY device_id, bucket
+WITH NO DATA;
+
+-- ===== Refresh policies =====
+-- start_offset covers late rows (buffered ingester, broker redelivery);
+-- end_offset leaves the still-open grain to real-time aggregation.
+SELECT add_continuous_aggregate_policy('sensor_data_1m',
+    start_offset => INTERVAL '2 hours', end_offset => INTERVAL '1 minute',
+    schedule_interval => INTERVAL '1 minute', if_not_exists => TRUE);
+
+SELECT add_continuous_aggregate_policy('sensor_data_15m',
+    start_offset => INTERVAL '1 day', end_offset => INTERVAL '15 minutes',
+    schedule_interval => INTERVAL '15 minutes', if_not_exists => TRUE);
+
+SELECT add_continuous_aggregate_policy('sensor_data_1h',
+    start_offset => INTERVAL '3 days', end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '1 hour', if_not_exists => TRUE);
+
+-- Materialize existing history once (policies only cover their start_offset window).
+CALL refresh_continuous_aggregate('sensor_data_1m', NULL, NULL);
+CALL refresh_continuous_aggregate('sensor_data_15m', NULL, NULL);
+CALL refresh_continuous_aggregate('sensor_data_1h', NULL, NULL);
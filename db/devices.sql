@@ -0,0 +1,39 @@
+-- ===== Device summary =====
+-- One row per device with its first/last reading and number of rows.
+-- The ingester updates it in the same statement as its sensor_data upsert
+-- (backend/mqtt_client/db_writer.py); the API range/existence checks and the
+-- availability views read it instead of aggregating sensor_data.
+-- Writes that bypass the ingester (manual inserts, deletes, retention) are
+-- not tracked: run SELECT refresh_devices(); afterwards.
+-- Existing databases get the same objects from backend/common/schema.py at
+-- ingester/API startup; keep both definitions in sync.
+
+CREATE TABLE IF NOT EXISTS devices (
+    device_id INT PRIMARY KEY,
+    first_seen TIMESTAMPTZ NOT NULL,
+    last_seen TIMESTAMPTZ NOT NULL,
+    row_count BIGINT NOT NULL DEFAULT 0
+);
+
+-- Rebuild the summary from sensor_data (backfill / repair). Scans the whole hypertable.
+CREATE OR REPLACE FUNCTION refresh_devices() RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO devices (device_id, first_seen, last_seen, row_count)
+    SELECT device_id, MIN(timestamp), MAX(timestamp), COUNT(*)
+    FROM sensor_data
+    GROUP BY device_id
+    ORDER BY device_id
+    ON CONFLICT (device_id)
+    DO UPDATE SET
+        first_seen = EXCLUDED.first_seen,
+        last_seen = EXCLUDED.last_seen,
+        row_count = EXCLUDED.row_count;
+
+    DELETE FROM devices d
+    WHERE NOT EXISTS (SELECT 1 FROM sensor_data s WHERE s.device_id = d.device_id);
+END;
+$$;
+
+-- Backfill (no-op on an empty database)
+SELECT refresh_devices();
@@ -10,6 +10,10 @@ set -a; [ -f .env ] && . ./.env; set +a
 FRONTCONT="${FRONTCONT:-altbau_vs_neubau_frontend}"  
 USERS="${USERS:-15}"
 RAMP="${RAMP:-15}"
+# API throughput group (server benchmark): off unless API_USERS > 0
+API_USERS="${API_USERS:-0}"
+API_TOKEN="${API_TOKEN:-}"
+DEVICE_ID="${DEVICE_ID:-1}"
 
 RESULTS_DIR="${RESULTS_DIR:-results}"
 REPORT_DIR="${RESULTS_DIR}/report"       
@@ -48,7 +52,7 @@ if [[ ${#NET_ARGS[@]} -eq 0 ]]; then
   [[ "$(uname -s)" == "Linux" ]] && EXTRA_ARGS+=(--add-host=host.docker.internal:host-gateway)
 fi
 
-echo "USERS=${USERS}  RAMP=${RAMP}"
+echo "USERS=${USERS}  RAMP=${RAMP}  API_USERS=${API_USERS}"
 echo "TARGET_URL=${TARGET_URL}"
 echo "API_BASE=${API_BASE}"
 
@@ -63,6 +67,7 @@ docker run --rm \
   -Jtarget_url="${TARGET_URL}" \
   -Japi_base="${API_BASE}" \
   -Jusers="${USERS}" -Jramp="${RAMP}" \
+  -Japi_users="${API_USERS}" -Japi_token="${API_TOKEN}" -Jdevice_id="${DEVICE_ID}" \
   -l /results/results.jtl \
   -e -o /results/report \
   -j /results/jmeter.log \
@@ -1,5 +1,6 @@
 from prometheus_client import Gauge, start_http_server
 from backend.common.logging_setup import setup_logger, log_event, DurationTimer
+from backend.common.log_sampling import SampledEvent
 from backend.common.exceptions import (
     MQTTConnectionError, PayloadValidationError, to_log_fields
 )
@@ -34,6 +35,12 @@ MQTT_BASE_TOPIC = os.getenv('MQTT_BASE_TOPIC', 'dhbw/ai/si2023/01')
 
 last_seen = {}
 
+# Success lines are sampled per (device_id, sensor_type) and summarised per sensor_type
+# (LOG_SAMPLE_* / LOG_SUMMARY_INTERVAL_S); parse failures are always logged.
+DATA_RECEIVED = SampledEvent(logger, "sensor_data_received", summary_key_name="sensor_type")
+# Summary percentiles of this one are over the delay itself (in ms).
+DELAY_UPDATED = SampledEvent(logger, "sensor_delay_updated", summary_key_name="sensor_type")
+
 def on_connect(client, _userdata, _flags, rc):
     try:
         if rc != 0:
@@ -71,15 +78,17 @@ def on_message(_client, _userdata, msg):
             ts = datetime.now(timezone.utc)
 
         last_seen[(device_id, sensor_type_mapped)] = ts
-        log_event(
-            logger, "INFO", "sensor_data_received",
-            duration_ms=t.stop_ms(),
-            device_id=device_id,
-            sensor_type=sensor_type_mapped,
-            topic=msg.topic,
-            value=value,
-            msg_ts=ts.isoformat(),
-        )
+        duration_ms = t.stop_ms()
+        if DATA_RECEIVED.record((device_id, sensor_type_mapped), sensor_type_mapped, duration_ms=duration_ms):
+            log_event(
+                logger, "INFO", "sensor_data_received",
+                duration_ms=duration_ms,
+                device_id=device_id,
+                sensor_type=sensor_type_mapped,
+                topic=msg.topic,
+                value=value,
+                msg_ts=ts.isoformat(),
+            )
     except PayloadValidationError as e:
         log_event(
             logger, "ERROR", "sensor_data_parse_failed",
@@ -114,7 +123,7 @@ if __name__ == '__main__':
 
     while True:
         now = datetime.now(timezone.utc)
-        for (device_id, sensor_type), ts in last_seen.items():
+        for (device_id, sensor_type), ts in list(last_seen.items()):
             delay = (now - ts).total_seconds()
             if delay < 0:
                 log_event(
@@ -126,11 +135,12 @@ if __name__ == '__main__':
                 )
                 delay = 0
             sensor_delay.labels(device_id=device_id, sensor_type=sensor_type).set(delay)
-            log_event(
-                logger, "INFO", "sensor_delay_updated",
-                device_id=device_id,
-                sensor_type=sensor_type,
-                delay=delay,
-                msg_ts=ts.isoformat()
-            )
+            if DELAY_UPDATED.record((device_id, sensor_type), sensor_type, duration_ms=int(delay * 1000)):
+                log_event(
+                    logger, "INFO", "sensor_delay_updated",
+                    device_id=device_id,
+                    sensor_type=sensor_type,
+                    delay=delay,
+                    msg_ts=ts.isoformat()
+                )
         time.sleep(15)
\ No newline at end of file